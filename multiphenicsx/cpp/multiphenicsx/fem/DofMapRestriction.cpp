@@ -4,19 +4,471 @@
 //
 // SPDX-License-Identifier: LGPL-3.0-or-later
 
+#include <algorithm>
+#include <array>
 #include <dolfinx/common/IndexMap.h>
+#include <dolfinx/common/MPI.h>
 #include <dolfinx/fem/DofMap.h>
+#include <dolfinx/fem/utils.h>
+#include <dolfinx/graph/AdjacencyList.h>
+#include <dolfinx/mesh/MeshTags.h>
+#include <dolfinx/mesh/Topology.h>
 #include <multiphenicsx/fem/DofMapRestriction.h>
+#include <iterator>
+#include <numeric>
+#include <stdexcept>
+#include <string>
+#include <thread>
 
 using namespace dolfinx;
 using dolfinx::fem::DofMap;
 using multiphenicsx::fem::DofMapRestriction;
 
+namespace
+{
+/// Compute the sorted list of dofs in the closure of the provided entities
+std::vector<std::int32_t>
+locate_closure_dofs(const DofMap& dofmap, mesh::Topology& topology,
+                    int dim, std::span<const std::int32_t> entities)
+{
+  topology.create_connectivity(dim, topology.dim());
+  return dolfinx::fem::locate_dofs_topological(topology, dofmap, dim, entities,
+                                               true);
+}
+
+/// Extract entities marked by mesh tags with any of the provided values
+std::vector<std::int32_t>
+tagged_entities(const mesh::MeshTags<std::int32_t>& meshtags,
+                std::span<const std::int32_t> values)
+{
+  std::vector<std::int32_t> sorted_values(values.begin(), values.end());
+  std::ranges::sort(sorted_values);
+  std::span<const std::int32_t> indices = meshtags.indices();
+  std::span<const std::int32_t> tags = meshtags.values();
+  std::vector<std::int32_t> entities;
+  for (std::size_t i = 0; i < indices.size(); ++i)
+  {
+    if (std::ranges::binary_search(sorted_values, tags[i]))
+      entities.push_back(indices[i]);
+  }
+  return entities;
+}
+
+/// Call f(begin, end) on contiguous chunks of the range [0, n), using one
+/// thread per chunk if more than one thread is requested
+template <typename Function>
+void for_each_chunk(std::size_t n, int num_threads, const Function& f)
+{
+  if (num_threads <= 1 or n <= 1)
+  {
+    f(std::size_t(0), n);
+    return;
+  }
+
+  num_threads = static_cast<int>(std::min<std::size_t>(num_threads, n));
+  std::vector<std::jthread> threads;
+  threads.reserve(num_threads);
+  for (int t = 0; t < num_threads; ++t)
+  {
+    threads.emplace_back(
+        [&f, t, n, num_threads]()
+        {
+          auto [begin, end] = dolfinx::MPI::local_range(t, n, num_threads);
+          f(static_cast<std::size_t>(begin), static_cast<std::size_t>(end));
+        });
+  }
+}
+
+/// Compute the restricted cell dofs of several restrictions of the same
+/// DofMap, given the map from unrestricted dofs to restricted dofs of each
+/// restriction, with a single traversal of the unrestricted cell dofs
+std::vector<multiphenicsx::fem::RestrictedCellDofs> compute_cell_dofs(
+    const DofMap& dofmap,
+    std::span<const std::span<const std::int32_t>> unrestricted_to_restricted,
+    bool compact, int num_threads)
+{
+  auto unrestricted_cell_dofs = dofmap.map();
+  const std::size_t num_cells = unrestricted_cell_dofs.extent(0);
+  const std::size_t num_cell_dofs = unrestricted_cell_dofs.extent(1);
+  const std::size_t num_restrictions = unrestricted_to_restricted.size();
+  std::vector<multiphenicsx::fem::RestrictedCellDofs> cell_dofs(
+      num_restrictions);
+
+  // First pass: count the number of restricted dofs on each cell. Counts of
+  // cell c are stored in cell_bounds[c + 1], so that each thread writes to
+  // its own chunk of cell_bounds
+  for (auto& cell_dofs_r : cell_dofs)
+  {
+    cell_dofs_r.cell_bounds.resize(num_cells + 1);
+    cell_dofs_r.cell_bounds[0] = 0;
+  }
+  for_each_chunk(
+      num_cells, num_threads,
+      [&](std::size_t begin, std::size_t end)
+      {
+        for (std::size_t c = begin; c < end; ++c)
+        {
+          for (std::size_t r = 0; r < num_restrictions; ++r)
+          {
+            std::size_t num_restricted_cell_dofs_c = 0;
+            for (std::size_t d = 0; d < num_cell_dofs; ++d)
+            {
+              if (unrestricted_to_restricted[r][unrestricted_cell_dofs(c, d)]
+                  >= 0)
+                ++num_restricted_cell_dofs_c;
+            }
+            cell_dofs[r].cell_bounds[c + 1] = num_restricted_cell_dofs_c;
+          }
+        }
+      });
+
+  // Accumulate counts into cell_bounds. In compact mode, cells without any
+  // restricted dof are skipped, and the remaining ones are stored in
+  // active_cells: since the position of a cell is never larger than its
+  // index, cell_bounds can be compacted in place
+  for (auto& [dof_array, cell_bounds, active_cells] : cell_dofs)
+  {
+    if (!compact)
+      std::partial_sum(cell_bounds.begin(), cell_bounds.end(),
+                       cell_bounds.begin());
+    else
+    {
+      for (std::size_t c = 0; c < num_cells; ++c)
+      {
+        if (const std::size_t num_restricted_cell_dofs_c = cell_bounds[c + 1];
+            num_restricted_cell_dofs_c > 0)
+        {
+          active_cells.push_back(c);
+          cell_bounds[active_cells.size()]
+              = cell_bounds[active_cells.size() - 1]
+                + num_restricted_cell_dofs_c;
+        }
+      }
+      cell_bounds.resize(active_cells.size() + 1);
+      cell_bounds.shrink_to_fit();
+    }
+    dof_array.resize(cell_bounds.back());
+  }
+
+  // Second pass: fill in restricted cell dofs directly into dof_array. Cell
+  // bounds computed in the first pass determine where each cell is written,
+  // hence cells can be filled concurrently
+  for_each_chunk(
+      num_cells, num_threads,
+      [&](std::size_t begin, std::size_t end)
+      {
+        // Position of the first cell of the chunk in the cell bounds of each
+        // restriction
+        std::vector<std::size_t> positions(num_restrictions, begin);
+        if (compact)
+        {
+          for (std::size_t r = 0; r < num_restrictions; ++r)
+          {
+            const std::vector<std::int32_t>& active_cells
+                = cell_dofs[r].active_cells;
+            positions[r] = std::distance(
+                active_cells.begin(),
+                std::ranges::lower_bound(active_cells,
+                                         static_cast<std::int32_t>(begin)));
+          }
+        }
+        for (std::size_t c = begin; c < end; ++c)
+        {
+          for (std::size_t r = 0; r < num_restrictions; ++r)
+          {
+            auto& [dof_array, cell_bounds, active_cells] = cell_dofs[r];
+            std::size_t& p = positions[r];
+            if (compact
+                and (p == active_cells.size()
+                     or static_cast<std::size_t>(active_cells[p]) != c))
+              continue;
+            std::size_t current_cell_bound = cell_bounds[p];
+            for (std::size_t d = 0; d < num_cell_dofs; ++d)
+            {
+              const auto restricted_dof
+                  = unrestricted_to_restricted[r]
+                                              [unrestricted_cell_dofs(c, d)];
+              if (restricted_dof >= 0)
+                dof_array[current_cell_bound++] = restricted_dof;
+            }
+            assert(current_cell_bound == cell_bounds[p + 1]);
+            ++p;
+          }
+        }
+      });
+
+  return cell_dofs;
+}
+} // namespace
+
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(
+    std::shared_ptr<const DofMap> dofmap,
+    const std::vector<std::int32_t>& restriction, bool compact,
+    int num_threads)
+    : _dofmap(dofmap), _compact(compact)
+{
+  // Compute index map and maps between unrestricted and restricted dofs
+  _compute_index_map(dofmap, restriction);
+
+  // Compute cell dofs arrays
+  _compute_cell_dofs(dofmap, num_threads);
+}
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(std::shared_ptr<const DofMap> dofmap,
+                                     mesh::Topology& topology, int dim,
+                                     std::span<const std::int32_t> entities,
+                                     bool compact)
+    : DofMapRestriction(
+          dofmap, locate_closure_dofs(*dofmap, topology, dim, entities),
+          compact)
+{
+  // Do nothing
+}
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(
+    std::shared_ptr<const DofMap> dofmap, mesh::Topology& topology,
+    const mesh::MeshTags<std::int32_t>& meshtags,
+    std::span<const std::int32_t> values, bool compact)
+    : DofMapRestriction(dofmap, topology, meshtags.dim(),
+                        tagged_entities(meshtags, values), compact)
+{
+  // Do nothing
+}
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(const DofMapRestriction& previous,
+                                     std::span<const std::int32_t> added,
+                                     std::span<const std::int32_t> removed)
+    : _dofmap(previous._dofmap), _compact(previous._compact)
+{
+  // Validate the provided dofs, and sort them
+  const std::size_t num_unrestricted_dofs
+      = previous._unrestricted_to_restricted.size();
+  auto sorted_dofs = [num_unrestricted_dofs](std::span<const std::int32_t> dofs,
+                                             const std::string& name)
+  {
+    std::vector<std::int32_t> sorted(dofs.begin(), dofs.end());
+    for (auto d : sorted)
+    {
+      if (d < 0 or static_cast<std::size_t>(d) >= num_unrestricted_dofs)
+      {
+        throw std::out_of_range("Invalid " + name + " dof " + std::to_string(d)
+                                + ": the number of unrestricted dofs is "
+                                + std::to_string(num_unrestricted_dofs));
+      }
+    }
+    std::ranges::sort(sorted);
+    auto [first, last] = std::ranges::unique(sorted);
+    sorted.erase(first, last);
+    return sorted;
+  };
+  std::vector<std::int32_t> sorted_removed = sorted_dofs(removed, "removed");
+  std::vector<std::int32_t> sorted_added;
+  for (auto d : sorted_dofs(added, "added"))
+  {
+    // Dofs which are already active, or which are also removed, are skipped
+    if (previous._unrestricted_to_restricted[d] < 0
+        and !std::ranges::binary_search(sorted_removed, d))
+      sorted_added.push_back(d);
+  }
+
+  // Compute the updated sorted list of active dofs by merging the previous
+  // one with the provided dofs, without traversing all unrestricted dofs
+  std::vector<std::int32_t> previous_restriction(
+      previous._restricted_to_unrestricted);
+  if (!std::ranges::is_sorted(previous_restriction))
+    std::ranges::sort(previous_restriction);
+  std::vector<std::int32_t> kept;
+  kept.reserve(previous_restriction.size());
+  std::ranges::set_difference(previous_restriction, sorted_removed,
+                              std::back_inserter(kept));
+  std::vector<std::int32_t> restriction;
+  restriction.reserve(kept.size() + sorted_added.size());
+  std::ranges::merge(kept, sorted_added, std::back_inserter(restriction));
+
+  // Compute the map from unrestricted dofs to restricted dofs by patching the
+  // previous one: only removed dofs and restricted dofs need to be updated
+  _unrestricted_to_restricted = previous._unrestricted_to_restricted;
+  for (auto d : sorted_removed)
+    _unrestricted_to_restricted[d] = -1;
+  for (std::size_t r = 0; r < restriction.size(); ++r)
+    _unrestricted_to_restricted[restriction[r]] = r;
+
+  // Compute index map. The global restricted numbering changes on every
+  // process as soon as the number of active dofs changes on any process,
+  // hence the index map is always recreated. However, the owned positions are
+  // read from the updated map from unrestricted dofs to restricted dofs, and
+  // all communication is carried out by a single prefix sum and a single
+  // neighbourhood exchange
+  const std::size_t dofmap_owned_size = _dofmap->index_map->size_local();
+  auto restricted_index_maps = multiphenicsx::fem::create_restricted_index_maps(
+      {*_dofmap->index_map}, {restriction},
+      {std::span<const std::int32_t>(_unrestricted_to_restricted)
+           .first(dofmap_owned_size)});
+  index_map = std::move(restricted_index_maps.front().first);
+  _restricted_to_unrestricted = std::move(restricted_index_maps.front().second);
+  if (_restricted_to_unrestricted.size() != restriction.size())
+  {
+    // Some ghosts are not active on their owner, and have been dropped
+    for (auto d : restriction)
+      _unrestricted_to_restricted[d] = -1;
+    for (std::size_t r = 0; r < _restricted_to_unrestricted.size(); ++r)
+      _unrestricted_to_restricted[_restricted_to_unrestricted[r]] = r;
+  }
+
+  // Compute cell dofs arrays by renumbering the ones of the previous
+  // restriction. Only cells which contain an added dof need to be recomputed
+  // from the unrestricted dofmap: they are located through the (cached) map
+  // from unrestricted dofs to cells, rather than by traversing the whole
+  // unrestricted dofmap
+  _dof_to_cells = previous._compute_dof_to_cells();
+  std::vector<std::int32_t> recomputed_cells;
+  for (auto d : sorted_added)
+  {
+    auto cells = _dof_to_cells->links(d);
+    recomputed_cells.insert(recomputed_cells.end(), cells.begin(),
+                            cells.end());
+  }
+  std::ranges::sort(recomputed_cells);
+  auto [first, last] = std::ranges::unique(recomputed_cells);
+  recomputed_cells.erase(first, last);
+  _compute_cell_dofs(previous, recomputed_cells);
+}
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(const DofMapRestriction& parent,
+                                     std::span<const std::int32_t> subset)
+    : _dofmap(parent._dofmap), _compact(parent._compact)
+{
+  // Compute index map as a sub index map of the restricted index map of
+  // parent, rather than of the (typically larger) unrestricted index map
+  auto [index_submap, submap_to_parent_map]
+      = dolfinx::common::create_sub_index_map(
+          *parent.index_map, subset, dolfinx::common::IndexMapOrder::preserve,
+          false);
+  assert(submap_to_parent_map.size() == subset.size());
+
+  // Compute maps between unrestricted and restricted dofs by composition
+  _restricted_to_unrestricted.resize(submap_to_parent_map.size());
+  for (std::size_t d = 0; d < submap_to_parent_map.size(); ++d)
+  {
+    _restricted_to_unrestricted[d]
+        = parent._restricted_to_unrestricted[submap_to_parent_map[d]];
+  }
+  _compute_unrestricted_to_restricted(_dofmap);
+
+  // Assign index map to public member
+  index_map
+      = std::make_shared<dolfinx::common::IndexMap>(std::move(index_submap));
+
+  // Compute cell dofs arrays by traversing the cell dofs of parent
+  _compute_cell_dofs(parent);
+  _dof_to_cells = parent._dof_to_cells;
+}
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(
+    std::shared_ptr<const DofMap> dofmap,
+    std::shared_ptr<const common::IndexMap> index_map,
+    std::vector<std::int32_t>&& restricted_to_unrestricted,
+    std::vector<std::int32_t>&& dof_array,
+    std::vector<std::size_t>&& cell_bounds,
+    std::vector<std::int32_t>&& active_cells, bool compact)
+    : index_map(index_map), _dofmap(dofmap),
+      _restricted_to_unrestricted(std::move(restricted_to_unrestricted)),
+      _dof_array(std::move(dof_array)), _cell_bounds(std::move(cell_bounds)),
+      _compact(compact), _active_cells(std::move(active_cells))
+{
+  assert(index_map->size_local() + index_map->num_ghosts()
+         == static_cast<std::int32_t>(_restricted_to_unrestricted.size()));
+  assert(compact or _active_cells.empty());
+  assert(!compact or _cell_bounds.size() == _active_cells.size() + 1);
+
+  // Compute map from unrestricted dofs to restricted dofs
+  _compute_unrestricted_to_restricted(dofmap);
+}
+//-----------------------------------------------------------------------------
+DofMapRestriction::DofMapRestriction(
+    std::shared_ptr<const DofMap> dofmap,
+    std::shared_ptr<const common::IndexMap> index_map,
+    std::vector<std::int32_t>&& restricted_to_unrestricted,
+    multiphenicsx::fem::RestrictedCellDofs&& cell_dofs, bool compact)
+    : DofMapRestriction(dofmap, index_map,
+                        std::move(restricted_to_unrestricted),
+                        std::move(cell_dofs.dof_array),
+                        std::move(cell_dofs.cell_bounds),
+                        std::move(cell_dofs.active_cells), compact)
+{
+  // Do nothing
+}
 //-----------------------------------------------------------------------------
 DofMapRestriction::DofMapRestriction(
     std::shared_ptr<const DofMap> dofmap,
-    const std::vector<std::int32_t>& restriction)
-    : _dofmap(dofmap)
+    std::shared_ptr<const common::IndexMap> index_map,
+    std::vector<std::int32_t>&& restricted_to_unrestricted, bool compact)
+    : index_map(index_map), _dofmap(dofmap),
+      _restricted_to_unrestricted(std::move(restricted_to_unrestricted)),
+      _compact(compact)
+{
+  assert(index_map->size_local() + index_map->num_ghosts()
+         == static_cast<std::int32_t>(_restricted_to_unrestricted.size()));
+
+  // Compute map from unrestricted dofs to restricted dofs
+  _compute_unrestricted_to_restricted(dofmap);
+
+  // Compute cell dofs arrays
+  _compute_cell_dofs(dofmap);
+}
+//-----------------------------------------------------------------------------
+std::span<const std::int32_t> DofMapRestriction::active_cell_index() const
+{
+  if (_compact)
+    return _active_cells;
+  else
+  {
+    if (!_active_cell_index)
+    {
+      std::vector<std::int32_t> cells;
+      for (std::size_t c = 0; c + 1 < _cell_bounds.size(); ++c)
+      {
+        if (_cell_bounds[c + 1] > _cell_bounds[c])
+          cells.push_back(c);
+      }
+      _active_cell_index = std::move(cells);
+    }
+    return *_active_cell_index;
+  }
+}
+//-----------------------------------------------------------------------------
+std::span<const std::int32_t> DofMapRestriction::active_facet_index(
+    std::shared_ptr<const mesh::Topology> topology) const
+{
+  assert(topology);
+  if (_active_facet_topology.lock() != topology)
+  {
+    const int tdim = topology->dim();
+    auto c_to_f = topology->connectivity(tdim, tdim - 1);
+    if (!c_to_f)
+    {
+      throw std::runtime_error(
+          "Cell-to-facet connectivity has not been computed.");
+    }
+    std::vector<std::int32_t> facets;
+    for (auto c : active_cell_index())
+    {
+      auto cell_facets = c_to_f->links(c);
+      facets.insert(facets.end(), cell_facets.begin(), cell_facets.end());
+    }
+    std::ranges::sort(facets);
+    auto [first, last] = std::ranges::unique(facets);
+    facets.erase(first, last);
+    _active_facet_index = std::move(facets);
+    _active_facet_topology = topology;
+  }
+  return _active_facet_index;
+}
+//-----------------------------------------------------------------------------
+void DofMapRestriction::_compute_index_map(
+    std::shared_ptr<const DofMap> dofmap,
+    std::span<const std::int32_t> restriction)
 {
   // Determine owned size
   auto dofmap_owned_size = dofmap->index_map->size_local();
@@ -33,73 +485,327 @@ DofMapRestriction::DofMapRestriction(
          == restriction_end_owned - restriction.begin());
   assert(static_cast<int>(submap_to_map.size())
          == restriction.end() - restriction.begin());
-  for (std::size_t d = 0; d < submap_to_map.size(); ++d)
-  {
-    assert(_unrestricted_to_restricted.count(submap_to_map[d]) == 0);
-    _unrestricted_to_restricted[submap_to_map[d]] = d;
-    assert(_restricted_to_unrestricted.count(d) == 0);
-    _restricted_to_unrestricted[d] = submap_to_map[d];
-  }
+
+  // Compute maps between unrestricted and restricted dofs
+  _restricted_to_unrestricted = std::move(submap_to_map);
+  _compute_unrestricted_to_restricted(dofmap);
+
   // Assign index map to public member
   index_map
       = std::make_shared<dolfinx::common::IndexMap>(std::move(index_submap));
-
-  // Compute cell dofs arrays
-  _compute_cell_dofs(dofmap);
 }
 //-----------------------------------------------------------------------------
-void DofMapRestriction::_compute_cell_dofs(std::shared_ptr<const DofMap> dofmap)
+void DofMapRestriction::_compute_unrestricted_to_restricted(
+    std::shared_ptr<const DofMap> dofmap)
 {
-  // Fill in cell dofs first into a temporary std::unordered_map
-  std::unordered_map<int, std::vector<std::int32_t>> restricted_cell_dofs;
-  std::size_t restricted_cell_dofs_total_size = 0;
-  auto unrestricted_cell_dofs = dofmap->map();
-  const int num_cells = unrestricted_cell_dofs.extent(0);
-  for (int c = 0; c < num_cells; ++c)
+  _unrestricted_to_restricted.resize(
+      dofmap->index_map->size_local() + dofmap->index_map->num_ghosts(), -1);
+  for (std::size_t d = 0; d < _restricted_to_unrestricted.size(); ++d)
   {
-    const auto unrestricted_cell_dofs_c
-        = MDSPAN_IMPL_STANDARD_NAMESPACE::submdspan(
-            unrestricted_cell_dofs, c,
-            MDSPAN_IMPL_STANDARD_NAMESPACE::full_extent);
-    std::vector<std::int32_t> restricted_cell_dofs_c;
-    restricted_cell_dofs_c.reserve(
-        unrestricted_cell_dofs_c.size()); // conservative allocation
-    for (std::uint32_t d = 0; d < unrestricted_cell_dofs_c.size(); ++d)
+    assert(_unrestricted_to_restricted[_restricted_to_unrestricted[d]] == -1);
+    _unrestricted_to_restricted[_restricted_to_unrestricted[d]] = d;
+  }
+}
+//-----------------------------------------------------------------------------
+void DofMapRestriction::_compute_cell_dofs(
+    std::shared_ptr<const DofMap> dofmap, int num_threads)
+{
+  const std::array unrestricted_to_restricted{
+      std::span<const std::int32_t>(_unrestricted_to_restricted)};
+  std::vector<multiphenicsx::fem::RestrictedCellDofs> cell_dofs
+      = compute_cell_dofs(*dofmap, unrestricted_to_restricted, _compact,
+                          num_threads);
+  _dof_array = std::move(cell_dofs.front().dof_array);
+  _cell_bounds = std::move(cell_dofs.front().cell_bounds);
+  _active_cells = std::move(cell_dofs.front().active_cells);
+}
+//-----------------------------------------------------------------------------
+void DofMapRestriction::_compute_cell_dofs(
+    const DofMapRestriction& other,
+    std::span<const std::int32_t> recomputed_cells)
+{
+  // Traverse the restricted cell dofs of other, and renumber them according
+  // to the restricted numbering of this object. Dofs which do not belong to
+  // this restriction are skipped. Cells to be recomputed are merged into the
+  // traversal, and their dofs are read from the unrestricted dofmap.
+  assert(_compact == other._compact);
+  assert(std::ranges::is_sorted(recomputed_cells));
+  auto unrestricted_cell_dofs = _dofmap->map();
+  const std::size_t num_other_positions = other._cell_bounds.size() - 1;
+  auto other_cell = [&other](std::size_t p) -> std::int32_t
+  { return other._compact ? other._active_cells[p] : p; };
+  _cell_bounds.reserve(num_other_positions + recomputed_cells.size() + 1);
+  _cell_bounds.push_back(0);
+  _dof_array.reserve(other._dof_array.size());
+  std::size_t p = 0;
+  auto r = recomputed_cells.begin();
+  while (p < num_other_positions or r != recomputed_cells.end())
+  {
+    std::int32_t c;
+    if (r != recomputed_cells.end()
+        and (p == num_other_positions or *r <= other_cell(p)))
     {
-      const auto unrestricted_dof = unrestricted_cell_dofs_c[d];
-      if (_unrestricted_to_restricted.count(unrestricted_dof) > 0)
+      c = *r++;
+      if (p < num_other_positions and other_cell(p) == c)
+        ++p;
+      for (std::size_t d = 0; d < unrestricted_cell_dofs.extent(1); ++d)
       {
-        restricted_cell_dofs_c.push_back(
-            _unrestricted_to_restricted[unrestricted_dof]);
+        const auto restricted_dof
+            = _unrestricted_to_restricted[unrestricted_cell_dofs(c, d)];
+        if (restricted_dof >= 0)
+          _dof_array.push_back(restricted_dof);
       }
     }
-    if (restricted_cell_dofs_c.size() > 0)
+    else
     {
-      restricted_cell_dofs[c].insert(restricted_cell_dofs[c].end(),
-                                     restricted_cell_dofs_c.begin(),
-                                     restricted_cell_dofs_c.end());
-      restricted_cell_dofs_total_size += restricted_cell_dofs_c.size();
+      c = other_cell(p);
+      for (std::size_t i = other._cell_bounds[p];
+           i < other._cell_bounds[p + 1]; ++i)
+      {
+        const auto restricted_dof
+            = _unrestricted_to_restricted
+                [other._restricted_to_unrestricted[other._dof_array[i]]];
+        if (restricted_dof >= 0)
+          _dof_array.push_back(restricted_dof);
+      }
+      ++p;
     }
+    if (!_compact)
+      _cell_bounds.push_back(_dof_array.size());
+    else if (_dof_array.size() > _cell_bounds.back())
+    {
+      _active_cells.push_back(c);
+      _cell_bounds.push_back(_dof_array.size());
+    }
+  }
+}
+//-----------------------------------------------------------------------------
+std::shared_ptr<const graph::AdjacencyList<std::int32_t>>
+DofMapRestriction::_compute_dof_to_cells() const
+{
+  if (!_dof_to_cells)
+  {
+    auto unrestricted_cell_dofs = _dofmap->map();
+    const std::size_t num_cells = unrestricted_cell_dofs.extent(0);
+    const std::size_t num_cell_dofs = unrestricted_cell_dofs.extent(1);
+    std::vector<std::int32_t> offsets(_unrestricted_to_restricted.size() + 1,
+                                      0);
+    for (std::size_t c = 0; c < num_cells; ++c)
+    {
+      for (std::size_t d = 0; d < num_cell_dofs; ++d)
+        ++offsets[unrestricted_cell_dofs(c, d) + 1];
+    }
+    std::partial_sum(offsets.begin(), offsets.end(), offsets.begin());
+    std::vector<std::int32_t> cells(offsets.back());
+    std::vector<std::int32_t> positions(offsets.begin(),
+                                        std::prev(offsets.end()));
+    for (std::size_t c = 0; c < num_cells; ++c)
+    {
+      for (std::size_t d = 0; d < num_cell_dofs; ++d)
+        cells[positions[unrestricted_cell_dofs(c, d)]++] = c;
+    }
+    _dof_to_cells = std::make_shared<const graph::AdjacencyList<std::int32_t>>(
+        std::move(cells), std::move(offsets));
   }
+  return _dof_to_cells;
+}
+//-----------------------------------------------------------------------------
+std::vector<std::pair<std::shared_ptr<const common::IndexMap>,
+                      std::vector<std::int32_t>>>
+multiphenicsx::fem::create_restricted_index_maps(
+    std::vector<std::reference_wrapper<const common::IndexMap>> index_maps,
+    std::vector<std::span<const std::int32_t>> restrictions,
+    std::vector<std::span<const std::int32_t>> owned_positions)
+{
+  assert(index_maps.size() == restrictions.size());
+  assert(owned_positions.empty()
+         or owned_positions.size() == restrictions.size());
+  const std::size_t num_maps = index_maps.size();
+  if (num_maps == 0)
+    return {};
+  MPI_Comm comm = index_maps[0].get().comm();
+
+  // Split each restriction into owned and ghost indices, and compute the
+  // offsets of the owned restricted indices with a single prefix sum
+  std::vector<std::int64_t> restricted_sizes_local(num_maps);
+  for (std::size_t i = 0; i < num_maps; ++i)
+  {
+    const std::int32_t size_local = index_maps[i].get().size_local();
+    restricted_sizes_local[i] = std::ranges::lower_bound(restrictions[i],
+                                                         size_local)
+                                - restrictions[i].begin();
+  }
+  std::vector<std::int64_t> restricted_offsets(num_maps, 0);
+  MPI_Exscan(restricted_sizes_local.data(), restricted_offsets.data(),
+             num_maps, MPI_INT64_T, MPI_SUM, comm);
+  if (dolfinx::MPI::rank(comm) == 0)
+    std::ranges::fill(restricted_offsets, 0);
 
-  // Flatten std::unordered_map into the std::vector dof_array, and store
-  // start/end indices associated to each cell in cell_bounds
-  _dof_array.reserve(restricted_cell_dofs_total_size);
-  _cell_bounds.reserve(num_cells + 1);
-  std::size_t current_cell_bound = 0;
-  _cell_bounds.push_back(current_cell_bound);
-  for (int c = 0; c < num_cells; ++c)
+  // Collect neighbourhood ranks of all index maps, and create a single
+  // (symmetric) neighbourhood communicator
+  std::vector<int> neighbors;
+  for (std::size_t i = 0; i < num_maps; ++i)
   {
-    if (restricted_cell_dofs.count(c) > 0)
+    const common::IndexMap& map = index_maps[i].get();
+    neighbors.insert(neighbors.end(), map.src().begin(), map.src().end());
+    neighbors.insert(neighbors.end(), map.dest().begin(), map.dest().end());
+  }
+  std::ranges::sort(neighbors);
+  auto [unique_end, range_end] = std::ranges::unique(neighbors);
+  neighbors.erase(unique_end, range_end);
+  MPI_Comm neighbor_comm;
+  MPI_Dist_graph_create_adjacent(
+      comm, neighbors.size(), neighbors.data(), MPI_UNWEIGHTED,
+      neighbors.size(), neighbors.data(), MPI_UNWEIGHTED, MPI_INFO_NULL, false,
+      &neighbor_comm);
+
+  // Pack requests to owners of ghost indices as (map, global index) pairs
+  std::vector<std::vector<std::int64_t>> requests(neighbors.size());
+  for (std::size_t i = 0; i < num_maps; ++i)
+  {
+    const common::IndexMap& map = index_maps[i].get();
+    const std::int32_t size_local = map.size_local();
+    std::span<const std::int64_t> ghosts = map.ghosts();
+    std::span<const int> owners = map.owners();
+    for (auto d : restrictions[i].subspan(restricted_sizes_local[i]))
     {
-      const auto restricted_cell_dofs_c = restricted_cell_dofs.at(c);
-      assert(current_cell_bound + restricted_cell_dofs_c.size()
-             <= restricted_cell_dofs_total_size);
-      _dof_array.insert(_dof_array.end(), restricted_cell_dofs_c.begin(),
-                        restricted_cell_dofs_c.end());
-      current_cell_bound += restricted_cell_dofs_c.size();
+      auto it = std::ranges::lower_bound(neighbors, owners[d - size_local]);
+      assert(it != neighbors.end() and *it == owners[d - size_local]);
+      auto& requests_n = requests[std::distance(neighbors.begin(), it)];
+      requests_n.insert(requests_n.end(), {static_cast<std::int64_t>(i),
+                                           ghosts[d - size_local]});
     }
-    _cell_bounds.push_back(current_cell_bound);
   }
+  std::vector<std::int64_t> send_buffer;
+  std::vector<int> send_sizes, send_displacements{0};
+  for (auto& requests_n : requests)
+  {
+    send_buffer.insert(send_buffer.end(), requests_n.begin(), requests_n.end());
+    send_sizes.push_back(requests_n.size());
+    send_displacements.push_back(send_displacements.back()
+                                 + requests_n.size());
+  }
+  std::vector<int> recv_sizes(neighbors.size());
+  // Note: reserve(1) is for MPI implementations that do not like null
+  // pointers when there are no neighbours
+  send_sizes.reserve(1);
+  recv_sizes.reserve(1);
+  MPI_Neighbor_alltoall(send_sizes.data(), 1, MPI_INT, recv_sizes.data(), 1,
+                        MPI_INT, neighbor_comm);
+  std::vector<int> recv_displacements(neighbors.size() + 1, 0);
+  std::partial_sum(recv_sizes.begin(), recv_sizes.end(),
+                   std::next(recv_displacements.begin()));
+  std::vector<std::int64_t> recv_buffer(recv_displacements.back());
+  MPI_Neighbor_alltoallv(send_buffer.data(), send_sizes.data(),
+                         send_displacements.data(), MPI_INT64_T,
+                         recv_buffer.data(), recv_sizes.data(),
+                         recv_displacements.data(), MPI_INT64_T, neighbor_comm);
+
+  // Answer requests with the restricted global index, or -1 if the owner
+  // does not include the requested index in its restriction
+  std::vector<std::vector<std::int32_t>> computed_owned_positions;
+  if (owned_positions.empty())
+  {
+    computed_owned_positions.resize(num_maps);
+    for (std::size_t i = 0; i < num_maps; ++i)
+    {
+      computed_owned_positions[i].resize(index_maps[i].get().size_local(), -1);
+      for (std::int64_t d = 0; d < restricted_sizes_local[i]; ++d)
+        computed_owned_positions[i][restrictions[i][d]] = d;
+      owned_positions.push_back(computed_owned_positions[i]);
+    }
+  }
+  std::vector<std::int64_t> reply_buffer(recv_buffer.size() / 2);
+  for (std::size_t r = 0; r < reply_buffer.size(); ++r)
+  {
+    const std::int64_t i = recv_buffer[2 * r];
+    const std::int64_t local_index
+        = recv_buffer[2 * r + 1] - index_maps[i].get().local_range()[0];
+    const std::int32_t position = owned_positions[i][local_index];
+    reply_buffer[r] = position >= 0 ? restricted_offsets[i] + position : -1;
+  }
+  std::vector<std::int64_t> replies(send_buffer.size() / 2);
+  for (auto& size : send_sizes)
+    size /= 2;
+  for (auto& displacement : send_displacements)
+    displacement /= 2;
+  for (auto& size : recv_sizes)
+    size /= 2;
+  for (auto& displacement : recv_displacements)
+    displacement /= 2;
+  MPI_Neighbor_alltoallv(reply_buffer.data(), recv_sizes.data(),
+                         recv_displacements.data(), MPI_INT64_T,
+                         replies.data(), send_sizes.data(),
+                         send_displacements.data(), MPI_INT64_T, neighbor_comm);
+  MPI_Comm_free(&neighbor_comm);
+
+  // Assemble restricted index maps, preserving the order of the provided
+  // indices. Replies are unpacked in the same order requests were packed.
+  std::vector<std::size_t> reply_positions(send_displacements.begin(),
+                                           std::prev(send_displacements.end()));
+  std::vector<std::pair<std::shared_ptr<const common::IndexMap>,
+                        std::vector<std::int32_t>>>
+      restricted_index_maps;
+  restricted_index_maps.reserve(num_maps);
+  for (std::size_t i = 0; i < num_maps; ++i)
+  {
+    const common::IndexMap& map = index_maps[i].get();
+    const std::int32_t size_local = map.size_local();
+    std::span<const int> owners = map.owners();
+    std::vector<std::int32_t> restricted_to_unrestricted(
+        restrictions[i].begin(),
+        std::next(restrictions[i].begin(), restricted_sizes_local[i]));
+    std::vector<std::int64_t> restricted_ghosts;
+    std::vector<int> restricted_ghost_owners;
+    for (auto d : restrictions[i].subspan(restricted_sizes_local[i]))
+    {
+      const int owner = owners[d - size_local];
+      auto n = std::distance(neighbors.begin(),
+                             std::ranges::lower_bound(neighbors, owner));
+      const std::int64_t restricted_ghost = replies[reply_positions[n]++];
+      if (restricted_ghost >= 0)
+      {
+        restricted_to_unrestricted.push_back(d);
+        restricted_ghosts.push_back(restricted_ghost);
+        restricted_ghost_owners.push_back(owner);
+      }
+    }
+    restricted_index_maps.emplace_back(
+        std::make_shared<const common::IndexMap>(
+            comm, restricted_sizes_local[i],
+            std::array<std::vector<int>, 2>{
+                std::vector<int>(map.src().begin(), map.src().end()),
+                std::vector<int>(map.dest().begin(), map.dest().end())},
+            restricted_ghosts, restricted_ghost_owners),
+        std::move(restricted_to_unrestricted));
+  }
+
+  return restricted_index_maps;
+}
+//-----------------------------------------------------------------------------
+std::vector<multiphenicsx::fem::RestrictedCellDofs>
+multiphenicsx::fem::compute_restricted_cell_dofs(
+    const DofMap& dofmap,
+    std::vector<std::span<const std::int32_t>> restricted_to_unrestricted,
+    bool compact, int num_threads)
+{
+  // Compute the map from unrestricted dofs to restricted dofs of each
+  // restriction
+  const std::size_t num_unrestricted_dofs
+      = dofmap.index_map->size_local() + dofmap.index_map->num_ghosts();
+  std::vector<std::vector<std::int32_t>> unrestricted_to_restricted;
+  std::vector<std::span<const std::int32_t>> unrestricted_to_restricted_spans;
+  unrestricted_to_restricted.reserve(restricted_to_unrestricted.size());
+  for (auto restricted_to_unrestricted_r : restricted_to_unrestricted)
+  {
+    std::vector<std::int32_t>& unrestricted_to_restricted_r
+        = unrestricted_to_restricted.emplace_back(num_unrestricted_dofs, -1);
+    for (std::size_t d = 0; d < restricted_to_unrestricted_r.size(); ++d)
+      unrestricted_to_restricted_r[restricted_to_unrestricted_r[d]] = d;
+    unrestricted_to_restricted_spans.push_back(unrestricted_to_restricted_r);
+  }
+
+  return compute_cell_dofs(dofmap, unrestricted_to_restricted_spans, compact,
+                           num_threads);
 }
 //-----------------------------------------------------------------------------
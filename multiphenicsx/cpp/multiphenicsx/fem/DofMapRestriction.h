@@ -6,10 +6,20 @@
 
 #pragma once
 
+#include <algorithm>
+#include <atomic>
+#include <cstdint>
 #include <dolfinx/common/IndexMap.h>
 #include <dolfinx/fem/DofMap.h>
+#include <dolfinx/graph/AdjacencyList.h>
+#include <dolfinx/mesh/MeshTags.h>
+#include <dolfinx/mesh/Topology.h>
+#include <functional>
 #include <memory>
-#include <unordered_map>
+#include <optional>
+#include <span>
+#include <utility>
+#include <vector>
 
 namespace multiphenicsx
 {
@@ -17,6 +27,21 @@ namespace multiphenicsx
 namespace fem
 {
 
+/// Restricted cell dofs, stored as returned by DofMapRestriction::map() and
+/// DofMapRestriction::active_cells()
+struct RestrictedCellDofs
+{
+  /// Restricted cell dofs
+  std::vector<std::int32_t> dof_array;
+
+  /// Bounds of the restricted dofs of each cell in dof_array
+  std::vector<std::size_t> cell_bounds;
+
+  /// Cells with at least one active degree of freedom, only populated in
+  /// compact storage mode
+  std::vector<std::int32_t> active_cells;
+};
+
 /// Restriction of a DofMap to a list of active degrees of freedom
 
 class DofMapRestriction
@@ -24,8 +49,128 @@ class DofMapRestriction
 public:
   /// Create a DofMapRestriction from a DofMap and a sorted list of active
   /// degrees of freedom
+  /// @param[in] dofmap The DofMap to be restricted.
+  /// @param[in] restriction Sorted list of active degrees of freedom.
+  /// @param[in] compact If true, store restricted dofs only for cells which
+  /// contain at least one active degree of freedom, rather than for all
+  /// cells. This reduces memory usage when the restriction is supported on
+  /// a small portion of the mesh.
+  /// @param[in] num_threads Number of threads used to compute the restricted
+  /// cell dofs. If larger than one, cells are partitioned in contiguous
+  /// chunks, and each thread counts and fills the restricted dofs of a chunk.
+  DofMapRestriction(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                    const std::vector<std::int32_t>& restriction,
+                    bool compact = false, int num_threads = 1);
+
+  /// Create a DofMapRestriction from a DofMap and a list of mesh entities:
+  /// active degrees of freedom are all degrees of freedom in the closure of
+  /// the provided entities
+  /// @param[in] dofmap The DofMap to be restricted.
+  /// @param[in] topology The mesh topology. Connectivity from entities of
+  /// dimension dim to cells is created if not already available.
+  /// @param[in] dim Topological dimension of the entities.
+  /// @param[in] entities Indices (local to the process) of the entities.
+  /// @param[in] compact If true, store restricted dofs only for cells which
+  /// contain at least one active degree of freedom.
+  DofMapRestriction(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                    dolfinx::mesh::Topology& topology, int dim,
+                    std::span<const std::int32_t> entities,
+                    bool compact = false);
+
+  /// Create a DofMapRestriction from a DofMap and mesh tags: active degrees
+  /// of freedom are all degrees of freedom in the closure of the entities
+  /// marked with any of the provided values
+  /// @param[in] dofmap The DofMap to be restricted.
+  /// @param[in] topology The mesh topology associated to meshtags.
+  /// Connectivity from tagged entities to cells is created if not already
+  /// available.
+  /// @param[in] meshtags The mesh tags.
+  /// @param[in] values Values of the tags to be included in the restriction.
+  /// @param[in] compact If true, store restricted dofs only for cells which
+  /// contain at least one active degree of freedom.
   DofMapRestriction(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
-                    const std::vector<std::int32_t>& restriction);
+                    dolfinx::mesh::Topology& topology,
+                    const dolfinx::mesh::MeshTags<std::int32_t>& meshtags,
+                    std::span<const std::int32_t> values,
+                    bool compact = false);
+
+  /// Create a DofMapRestriction by updating the list of active degrees of
+  /// freedom of an existing DofMapRestriction. The storage mode (compact or
+  /// not) of the existing DofMapRestriction is preserved. Restricted cell dofs
+  /// are obtained by renumbering the ones of the existing DofMapRestriction,
+  /// and only cells which contain an added degree of freedom are recomputed
+  /// from the DofMap. The map from unrestricted dofs to cells required to
+  /// locate such cells is computed on the first update, and shared with all
+  /// later updates.
+  /// @param[in] previous The DofMapRestriction to be updated.
+  /// @param[in] added Unrestricted degrees of freedom to be added to the list
+  /// of active degrees of freedom.
+  /// @param[in] removed Unrestricted degrees of freedom to be removed from the
+  /// list of active degrees of freedom. Degrees of freedom which are both
+  /// added and removed are removed.
+  /// @throws std::out_of_range if any added or removed degree of freedom is
+  /// not a valid (owned or ghost) unrestricted degree of freedom.
+  DofMapRestriction(const DofMapRestriction& previous,
+                    std::span<const std::int32_t> added,
+                    std::span<const std::int32_t> removed);
+
+  /// Create a DofMapRestriction by further restricting an existing
+  /// DofMapRestriction. The new DofMapRestriction still restricts the DofMap
+  /// of parent, but it is computed by traversing only the data of parent. The
+  /// storage mode (compact or not) of parent is preserved.
+  /// @param[in] parent The DofMapRestriction to be restricted.
+  /// @param[in] subset Sorted list of active degrees of freedom, in the
+  /// restricted numbering of parent.
+  DofMapRestriction(const DofMapRestriction& parent,
+                    std::span<const std::int32_t> subset);
+
+  /// Create a DofMapRestriction from precomputed data, e.g. loaded from disk.
+  /// No consistency check is carried out between the provided data and the
+  /// DofMap.
+  /// @param[in] dofmap The DofMap to be restricted.
+  /// @param[in] index_map The restricted index map.
+  /// @param[in] restricted_to_unrestricted Map from restricted dofs to
+  /// unrestricted dofs.
+  /// @param[in] dof_array Restricted cell dofs, as returned by map().
+  /// @param[in] cell_bounds Restricted cell bounds, as returned by map().
+  /// @param[in] active_cells Cells with at least one active degree of
+  /// freedom, as returned by active_cells(). Must be empty if compact is
+  /// false.
+  /// @param[in] compact Whether the restricted cell dofs are stored in
+  /// compact mode.
+  DofMapRestriction(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                    std::shared_ptr<const dolfinx::common::IndexMap> index_map,
+                    std::vector<std::int32_t>&& restricted_to_unrestricted,
+                    std::vector<std::int32_t>&& dof_array,
+                    std::vector<std::size_t>&& cell_bounds,
+                    std::vector<std::int32_t>&& active_cells, bool compact);
+
+  /// Create a DofMapRestriction from precomputed data, e.g. as returned by
+  /// create_restricted_index_maps and compute_restricted_cell_dofs.
+  /// @param[in] dofmap The DofMap to be restricted.
+  /// @param[in] index_map The restricted index map.
+  /// @param[in] restricted_to_unrestricted Map from restricted dofs to
+  /// unrestricted dofs.
+  /// @param[in] cell_dofs Restricted cell dofs.
+  /// @param[in] compact Whether the restricted cell dofs are stored in
+  /// compact mode.
+  DofMapRestriction(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                    std::shared_ptr<const dolfinx::common::IndexMap> index_map,
+                    std::vector<std::int32_t>&& restricted_to_unrestricted,
+                    RestrictedCellDofs&& cell_dofs, bool compact);
+
+  /// Create a DofMapRestriction from a DofMap and a precomputed restricted
+  /// index map, e.g. as returned by create_restricted_index_maps.
+  /// @param[in] dofmap The DofMap to be restricted.
+  /// @param[in] index_map The restricted index map.
+  /// @param[in] restricted_to_unrestricted Map from restricted dofs to
+  /// unrestricted dofs.
+  /// @param[in] compact If true, store restricted dofs only for cells which
+  /// contain at least one active degree of freedom.
+  DofMapRestriction(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                    std::shared_ptr<const dolfinx::common::IndexMap> index_map,
+                    std::vector<std::int32_t>&& restricted_to_unrestricted,
+                    bool compact = false);
 
   // Copy constructor
   DofMapRestriction(const DofMapRestriction& dofmap_restriction) = delete;
@@ -50,30 +195,43 @@ public:
   /// index)
   std::span<const std::int32_t> cell_dofs(std::int32_t cell_index) const
   {
+    std::size_t position = cell_index;
+    if (_compact)
+    {
+      auto it = std::ranges::lower_bound(_active_cells, cell_index);
+      if (it == _active_cells.end() or *it != cell_index)
+        return std::span<const std::int32_t>();
+      position = std::distance(_active_cells.begin(), it);
+    }
     return std::span<const std::int32_t>(
-        _dof_array.data() + _cell_bounds[cell_index],
-        _cell_bounds[cell_index + 1] - _cell_bounds[cell_index]);
+        _dof_array.data() + _cell_bounds[position],
+        _cell_bounds[position + 1] - _cell_bounds[position]);
   }
 
   /// Accessor to DofMap provided to constructor
   std::shared_ptr<const dolfinx::fem::DofMap> dofmap() const { return _dofmap; }
 
-  /// Return map from unrestricted dofs to restricted dofs
-  const std::unordered_map<std::int32_t, std::int32_t>&
-  unrestricted_to_restricted() const
+  /// Return map from unrestricted dofs to restricted dofs. The map is stored
+  /// as an array of size equal to the number of (owned and ghost) unrestricted
+  /// dofs, and unrestricted dofs which do not belong to the restriction are
+  /// mapped to -1.
+  std::span<const std::int32_t> unrestricted_to_restricted() const
   {
     return _unrestricted_to_restricted;
   }
 
-  /// Map from restricted dofs to unrestricted dofs
-  const std::unordered_map<std::int32_t, std::int32_t>&
-  restricted_to_unrestricted() const
+  /// Return map from restricted dofs to unrestricted dofs. The map is stored
+  /// as an array of size equal to the number of (owned and ghost) restricted
+  /// dofs.
+  std::span<const std::int32_t> restricted_to_unrestricted() const
   {
     return _restricted_to_unrestricted;
   }
 
   /// Get dofmap data after restriction has been carried out
-  /// @return The adjacency list with dof indices for each cell
+  /// @return The adjacency list with dof indices for each cell. In compact
+  /// storage mode, the adjacency list only contains the cells returned by
+  /// active_cells(), in the same order.
   std::pair<std::span<const std::int32_t>, std::span<const std::size_t>>
   map() const
   {
@@ -81,6 +239,31 @@ public:
                           std::span<const std::size_t>(_cell_bounds));
   }
 
+  /// Return true if restricted dofs are stored only for cells which contain
+  /// at least one active degree of freedom
+  bool compact() const { return _compact; }
+
+  /// Return the sorted list of cells which contain at least one active degree
+  /// of freedom, if restricted dofs are stored in compact mode. Return an
+  /// empty list otherwise.
+  std::span<const std::int32_t> active_cells() const { return _active_cells; }
+
+  /// Return the sorted list of cells which contain at least one active degree
+  /// of freedom, regardless of the storage mode. In compact storage mode the
+  /// list is the same as active_cells(), otherwise it is computed from the
+  /// cell bounds on first use and stored.
+  std::span<const std::int32_t> active_cell_index() const;
+
+  /// Return the sorted list of facets of the cells which contain at least one
+  /// active degree of freedom, i.e. of the facets on which an interior or
+  /// exterior facet integral may contribute to the restricted tensor. The
+  /// list is computed on first use and stored until it is requested for a
+  /// different topology.
+  /// @param[in] topology The mesh topology. Connectivity from cells to facets
+  /// must be available.
+  std::span<const std::int32_t> active_facet_index(
+      std::shared_ptr<const dolfinx::mesh::Topology> topology) const;
+
   /// Object containing information about dof distribution across
   /// processes
   std::shared_ptr<const dolfinx::common::IndexMap> index_map;
@@ -88,22 +271,121 @@ public:
   /// Block size associated to index_map.
   int index_map_bs() const { return _dofmap->index_map_bs(); }
 
+  /// Return an identifier of the restriction, which is unique within the
+  /// process and never reused, even after the restriction is destroyed. It can
+  /// be used to key data cached on other objects, e.g. PETSc matrices.
+  std::uint64_t id() const { return _id; }
+
 private:
-  /// Helper function for constructor: compute cell dofs arrays
-  void _compute_cell_dofs(std::shared_ptr<const dolfinx::fem::DofMap> dofmap);
+  /// Helper function for constructor: compute index map and maps between
+  /// unrestricted and restricted dofs
+  void _compute_index_map(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                          std::span<const std::int32_t> restriction);
+
+  /// Helper function for constructor: compute map from unrestricted dofs to
+  /// restricted dofs, given the one from restricted dofs to unrestricted dofs
+  void _compute_unrestricted_to_restricted(
+      std::shared_ptr<const dolfinx::fem::DofMap> dofmap);
+
+  /// Helper function for constructor: compute cell dofs arrays, possibly
+  /// using several threads
+  void _compute_cell_dofs(std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+                          int num_threads = 1);
+
+  /// Helper function for constructor: compute cell dofs arrays from the ones
+  /// of another DofMapRestriction of the same DofMap. Cell dofs of the
+  /// provided (sorted) cells are recomputed from the DofMap, while the ones of
+  /// any other cell are obtained by renumbering the ones of the other
+  /// DofMapRestriction, whose active degrees of freedom must thus be a
+  /// superset of the ones of this object on such cells
+  void _compute_cell_dofs(const DofMapRestriction& other,
+                          std::span<const std::int32_t> recomputed_cells = {});
+
+  /// Helper function for constructor: return the map from unrestricted dofs
+  /// to the cells which contain them, computing and storing it on first use
+  std::shared_ptr<const dolfinx::graph::AdjacencyList<std::int32_t>>
+  _compute_dof_to_cells() const;
 
   /// DofMap provided to constructor
   std::shared_ptr<const dolfinx::fem::DofMap> _dofmap;
 
-  // Map from unrestricted dofs to restricted dofs
-  std::unordered_map<std::int32_t, std::int32_t> _unrestricted_to_restricted;
+  // Map from unrestricted dofs to restricted dofs, with -1 denoting
+  // unrestricted dofs which do not belong to the restriction
+  std::vector<std::int32_t> _unrestricted_to_restricted;
 
   // Map from restricted dofs to unrestricted dofs
-  std::unordered_map<std::int32_t, std::int32_t> _restricted_to_unrestricted;
+  std::vector<std::int32_t> _restricted_to_unrestricted;
 
   // Cell-local-to-dof map after restriction has been carried out
   std::vector<std::int32_t> _dof_array;
   std::vector<std::size_t> _cell_bounds;
+
+  // Whether cell dofs are stored in compact mode
+  bool _compact;
+
+  // Cells with at least one active dof, only populated in compact mode
+  std::vector<std::int32_t> _active_cells;
+
+  // Cells with at least one active dof, computed on first use in non-compact
+  // mode
+  mutable std::optional<std::vector<std::int32_t>> _active_cell_index;
+
+  // Facets of the cells with at least one active dof, computed on first use,
+  // and topology they were computed for
+  mutable std::vector<std::int32_t> _active_facet_index;
+  mutable std::weak_ptr<const dolfinx::mesh::Topology> _active_facet_topology;
+
+  // Map from unrestricted dofs to cells, only computed when updating the
+  // active dofs, and shared between successive updates
+  mutable std::shared_ptr<const dolfinx::graph::AdjacencyList<std::int32_t>>
+      _dof_to_cells;
+
+  // Unique identifier, taken from a process-wide counter
+  static inline std::atomic<std::uint64_t> _num_created = 0;
+  std::uint64_t _id = _num_created++;
 };
+
+/// @brief Create the restricted index maps of several restrictions at once.
+///
+/// The result is the same as calling dolfinx::common::create_sub_index_map
+/// (preserving the order of the provided indices, and without allowing owner
+/// changes) on each pair of index map and restriction, but communication is
+/// combined across all pairs: a single prefix sum computes the offsets of the
+/// owned indices, and a single neighbourhood exchange computes the new global
+/// indices of the ghosts. All index maps must share the same communicator.
+/// @param[in] index_maps The unrestricted index maps.
+/// @param[in] restrictions For each index map, the sorted list of local
+/// indices (owned and ghosts) in the restriction.
+/// @param[in] owned_positions For each index map, the position in the
+/// restriction of each owned index, or -1 if the index does not belong to the
+/// restriction. If empty, positions are computed from restrictions.
+/// @return For each pair, the restricted index map and the map from restricted
+/// indices to unrestricted indices.
+std::vector<std::pair<std::shared_ptr<const dolfinx::common::IndexMap>,
+                      std::vector<std::int32_t>>>
+create_restricted_index_maps(
+    std::vector<std::reference_wrapper<const dolfinx::common::IndexMap>>
+        index_maps,
+    std::vector<std::span<const std::int32_t>> restrictions,
+    std::vector<std::span<const std::int32_t>> owned_positions = {});
+
+/// @brief Compute the restricted cell dofs of several restrictions of the
+/// same DofMap with a single traversal of the DofMap.
+///
+/// The result for each restriction is the same as the one computed by the
+/// DofMapRestriction constructors, but unrestricted cell dofs are read only
+/// once for all restrictions.
+/// @param[in] dofmap The DofMap to be restricted.
+/// @param[in] restricted_to_unrestricted For each restriction, the map from
+/// restricted dofs to unrestricted dofs.
+/// @param[in] compact If true, store restricted dofs only for cells which
+/// contain at least one active degree of freedom.
+/// @param[in] num_threads Number of threads used in the traversal.
+/// @return The restricted cell dofs of each restriction.
+std::vector<RestrictedCellDofs> compute_restricted_cell_dofs(
+    const dolfinx::fem::DofMap& dofmap,
+    std::vector<std::span<const std::int32_t>> restricted_to_unrestricted,
+    bool compact, int num_threads = 1);
+
 } // namespace fem
 } // namespace multiphenicsx
@@ -6,14 +6,24 @@
 
 #pragma once
 
+#include <algorithm>
+#include <cassert>
 #include <dolfinx/common/IndexMap.h>
+#include <dolfinx/fem/DirichletBC.h>
 #include <dolfinx/fem/Form.h>
+#include <dolfinx/fem/assembler.h>
 #include <dolfinx/la/SparsityPattern.h>
 #include <dolfinx/la/petsc.h>
+#include <functional>
+#include <map>
 #include <memory>
+#include <multiphenicsx/fem/DofMapRestriction.h>
 #include <multiphenicsx/fem/utils.h>
+#include <optional>
 #include <petscmat.h>
 #include <petscvec.h>
+#include <span>
+#include <string>
 #include <vector>
 
 namespace multiphenicsx
@@ -26,6 +36,298 @@ namespace fem
 namespace petsc
 {
 
+namespace impl
+{
+/// @brief Create a matrix with given layout and preallocation.
+/// @param[in] comm MPI communicator.
+/// @param[in] index_maps A pair of index maps, defining the row and column
+/// layout of the matrix.
+/// @param[in] bs Row and column block sizes of the matrix.
+/// @param[in] nnz_diag Number of nonzero blocks in the diagonal part of each
+/// owned block row.
+/// @param[in] nnz_off Number of nonzero blocks in the off-diagonal part of
+/// each owned block row.
+/// @param[in] matrix_type The PETSc matrix type to create. If empty, AIJ is
+/// used.
+/// @return A preallocated matrix, without local-to-global maps. The caller is
+/// responsible for destroying the Mat object.
+inline Mat create_preallocated_matrix(
+    MPI_Comm comm,
+    std::array<std::reference_wrapper<const dolfinx::common::IndexMap>, 2>
+        index_maps,
+    std::array<int, 2> bs, std::span<const std::int32_t> nnz_diag,
+    std::span<const std::int32_t> nnz_off, const std::string& matrix_type)
+{
+  const dolfinx::common::IndexMap& row_map = index_maps[0].get();
+  const dolfinx::common::IndexMap& col_map = index_maps[1].get();
+  assert(nnz_diag.size() == std::size_t(row_map.size_local()));
+  assert(nnz_off.size() == std::size_t(row_map.size_local()));
+
+  PetscErrorCode ierr;
+  Mat A;
+  ierr = MatCreate(comm, &A);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatCreate");
+  ierr = MatSetSizes(A, bs[0] * row_map.size_local(),
+                     bs[1] * col_map.size_local(), PETSC_DETERMINE,
+                     PETSC_DETERMINE);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatSetSizes");
+  ierr = MatSetType(A, matrix_type.empty() ? MATAIJ : matrix_type.c_str());
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatSetType");
+
+  // Preallocate by block if row and column block sizes agree, otherwise
+  // expand block counts to scalar counts
+  if (bs[0] == bs[1])
+  {
+    std::vector<PetscInt> _nnz_diag(nnz_diag.begin(), nnz_diag.end());
+    std::vector<PetscInt> _nnz_off(nnz_off.begin(), nnz_off.end());
+    ierr = MatXAIJSetPreallocation(A, bs[0], _nnz_diag.data(), _nnz_off.data(),
+                                   nullptr, nullptr);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "MatXAIJSetPreallocation");
+  }
+  else
+  {
+    std::vector<PetscInt> _nnz_diag, _nnz_off;
+    _nnz_diag.reserve(bs[0] * nnz_diag.size());
+    _nnz_off.reserve(bs[0] * nnz_off.size());
+    for (std::size_t i = 0; i < nnz_diag.size(); ++i)
+    {
+      for (int k = 0; k < bs[0]; ++k)
+      {
+        _nnz_diag.push_back(bs[1] * nnz_diag[i]);
+        _nnz_off.push_back(bs[1] * nnz_off[i]);
+      }
+    }
+    ierr = MatXAIJSetPreallocation(A, 1, _nnz_diag.data(), _nnz_off.data(),
+                                   nullptr, nullptr);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "MatXAIJSetPreallocation");
+  }
+  ierr = MatSetBlockSizes(A, bs[0], bs[1]);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatSetBlockSizes");
+
+  return A;
+}
+
+/// @brief Create a matrix from a finalised sparsity pattern stored in block
+/// indices.
+///
+/// The sparsity pattern stores block indices, and its own block size is
+/// ignored in favour of `bs`. The nonzero structure of the pattern is
+/// inserted in the matrix, which is however returned without local-to-global
+/// maps. For symmetric (SBAIJ) matrix types, entries in the lower triangular
+/// part are ignored.
+/// @param[in] comm MPI communicator.
+/// @param[in] pattern A finalised sparsity pattern, in block indices.
+/// @param[in] bs Row and column block sizes of the matrix.
+/// @param[in] matrix_type The PETSc matrix type to create. If empty, AIJ is
+/// used.
+/// @return A matrix with the nonzero structure of the pattern. The caller is
+/// responsible for destroying the Mat object.
+inline Mat
+create_matrix_from_block_pattern(MPI_Comm comm,
+                                 const dolfinx::la::SparsityPattern& pattern,
+                                 std::array<int, 2> bs,
+                                 const std::string& matrix_type)
+{
+  const dolfinx::common::IndexMap& row_map = *pattern.index_map(0);
+  const std::int32_t num_rows = row_map.size_local();
+  std::vector<std::int32_t> nnz_diag(num_rows), nnz_off(num_rows);
+  for (std::int32_t row = 0; row < num_rows; ++row)
+  {
+    nnz_diag[row] = pattern.nnz_diag(row);
+    nnz_off[row] = pattern.nnz_off_diag(row);
+  }
+  Mat A = create_preallocated_matrix(
+      comm, {*pattern.index_map(0), *pattern.index_map(1)}, bs, nnz_diag,
+      nnz_off, matrix_type);
+
+  // Symmetric matrix types only store the upper triangular part
+  PetscErrorCode ierr;
+  PetscBool symmetric_type;
+  ierr = PetscObjectTypeCompareAny((PetscObject)A, &symmetric_type, MATSBAIJ,
+                                   MATSEQSBAIJ, MATMPISBAIJ, "");
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectTypeCompareAny");
+  if (symmetric_type)
+  {
+    ierr = MatSetOption(A, MAT_IGNORE_LOWER_TRIANGULAR, PETSC_TRUE);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "MatSetOption");
+  }
+
+  // Insert the nonzero structure of the pattern, using global indices
+  const std::int64_t row_offset = row_map.local_range()[0];
+  const std::vector<std::int64_t> col_global = pattern.column_indices();
+  auto [cols, offsets] = pattern.graph();
+  std::vector<PetscInt> _cols;
+  std::vector<PetscScalar> zeros;
+  for (std::int32_t row = 0; row < num_rows; ++row)
+  {
+    const PetscInt _row = row_offset + row;
+    _cols.clear();
+    for (auto k = offsets[row]; k < offsets[row + 1]; ++k)
+      _cols.push_back(col_global[cols[k]]);
+    zeros.assign(bs[0] * bs[1] * _cols.size(), 0.0);
+    ierr = MatSetValuesBlocked(A, 1, &_row, _cols.size(), _cols.data(),
+                               zeros.data(), INSERT_VALUES);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "MatSetValuesBlocked");
+  }
+  ierr = MatAssemblyBegin(A, MAT_FLUSH_ASSEMBLY);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatAssemblyBegin");
+  ierr = MatAssemblyEnd(A, MAT_FLUSH_ASSEMBLY);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatAssemblyEnd");
+
+  // Entries outside of the pattern should never be inserted
+  ierr = MatSetOption(A, MAT_NEW_NONZERO_ALLOCATION_ERR, PETSC_TRUE);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatSetOption");
+
+  return A;
+}
+/// @brief Mark the dofs of the arguments of a bilinear form which are
+/// associated to boundary conditions.
+/// @param[in] a The bilinear form.
+/// @param[in] bcs Boundary conditions.
+/// @return Markers of the (unrestricted, unrolled) row and column dofs. A
+/// vector is empty if no boundary condition applies to the corresponding
+/// argument.
+template <std::floating_point T>
+std::array<std::vector<std::int8_t>, 2> mark_bc_dofs(
+    const dolfinx::fem::Form<PetscScalar, T>& a,
+    const std::vector<const dolfinx::fem::DirichletBC<PetscScalar, T>*>& bcs)
+{
+  std::array<std::vector<std::int8_t>, 2> dof_markers;
+  for (std::size_t d = 0; d < 2; ++d)
+  {
+    std::shared_ptr V = a.function_spaces()[d];
+    for (const dolfinx::fem::DirichletBC<PetscScalar, T>* bc : bcs)
+    {
+      if (V->contains(*bc->function_space()))
+      {
+        if (dof_markers[d].empty())
+        {
+          std::shared_ptr map = V->dofmap()->index_map;
+          dof_markers[d].resize(V->dofmap()->index_map_bs()
+                                    * (map->size_local() + map->num_ghosts()),
+                                false);
+        }
+        bc->mark_dofs(dof_markers[d]);
+      }
+    }
+  }
+  return dof_markers;
+}
+
+/// @brief Compute the block size of a block matrix in each direction, and
+/// the block size of each field in units of it.
+///
+/// The natural block size is kept if it is shared by all fields, otherwise it
+/// is set to one.
+/// @param[in] index_maps_bs Block sizes of the row and column fields.
+/// @return The row and column block sizes of the block matrix, and the block
+/// size of each row and column field in units of them.
+inline std::pair<std::array<int, 2>, std::array<std::vector<int>, 2>>
+block_sizes(const std::array<std::vector<int>, 2>& index_maps_bs)
+{
+  std::array<int, 2> bs;
+  for (std::size_t d = 0; d < 2; ++d)
+  {
+    const std::vector<int>& index_map_bs = index_maps_bs[d];
+    bs[d] = (!index_map_bs.empty()
+             and std::ranges::all_of(index_map_bs, [&index_map_bs](int bs_f)
+                                     { return bs_f == index_map_bs[0]; }))
+                ? index_map_bs[0]
+                : 1;
+  }
+  std::array<std::vector<int>, 2> unit_bs;
+  for (std::size_t d = 0; d < 2; ++d)
+  {
+    for (int bs_f : index_maps_bs[d])
+      unit_bs[d].push_back(bs[d] == 1 ? bs_f : 1);
+  }
+  return {bs, unit_bs};
+}
+} // namespace impl
+
+/// @brief Create a matrix from a finalised sparsity pattern
+///
+/// This allows to create several matrices with the same nonzero structure
+/// while building the sparsity pattern only once.
+/// @param[in] pattern A finalised sparsity pattern, e.g. as returned by
+/// multiphenicsx::fem::create_sparsity_pattern.
+/// @param[in] matrix_type The PETSc matrix type to create
+/// @return A sparse matrix with a layout and sparsity that matches the
+/// pattern. The caller is responsible for destroying the Mat object.
+inline Mat create_matrix(const dolfinx::la::SparsityPattern& pattern,
+                         const std::string& matrix_type = std::string())
+{
+  return dolfinx::la::petsc::create_matrix(pattern.index_map(0)->comm(),
+                                           pattern, matrix_type);
+}
+
+/// @brief Create a matrix, preallocated from given nonzero counts.
+/// @param[in] index_maps A pair of index maps, defining the row and column
+/// layout of the matrix.
+/// @param[in] index_maps_bs A pair of int, representing the block size of
+/// index_maps.
+/// @param[in] nnz_diag Number of nonzero blocks in the diagonal part of each
+/// owned block row, e.g. as returned by multiphenicsx::fem::count_nonzeros.
+/// @param[in] nnz_off Number of nonzero blocks in the off-diagonal part of
+/// each owned block row.
+/// @param[in] matrix_type The PETSc matrix type to create
+/// @return A sparse matrix with a layout and preallocation that matches the
+/// counts. The caller is responsible for destroying the Mat object.
+inline Mat create_matrix_from_nonzero_counts(
+    std::array<std::reference_wrapper<const dolfinx::common::IndexMap>, 2>
+        index_maps,
+    const std::array<int, 2> index_maps_bs,
+    std::span<const std::int32_t> nnz_diag,
+    std::span<const std::int32_t> nnz_off,
+    const std::string& matrix_type = std::string())
+{
+  // Create PETSc matrix
+  Mat A = impl::create_preallocated_matrix(
+      index_maps[0].get().comm(), index_maps, index_maps_bs, nnz_diag,
+      nnz_off, matrix_type);
+
+  // Create PETSc local-to-global maps and attach to matrix
+  PetscErrorCode ierr;
+  std::array<ISLocalToGlobalMapping, 2> petsc_local_to_global;
+  for (std::size_t d = 0; d < 2; ++d)
+  {
+    const std::vector<std::int64_t> global
+        = index_maps[d].get().global_indices();
+    const std::vector<PetscInt> _global(global.begin(), global.end());
+    ierr = ISLocalToGlobalMappingCreate(
+        MPI_COMM_SELF, index_maps_bs[d], _global.size(), _global.data(),
+        PETSC_COPY_VALUES, &petsc_local_to_global[d]);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__,
+                                "ISLocalToGlobalMappingCreate");
+  }
+  ierr = MatSetLocalToGlobalMapping(A, petsc_local_to_global[0],
+                                    petsc_local_to_global[1]);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatSetLocalToGlobalMapping");
+  for (std::size_t d = 0; d < 2; ++d)
+    ISLocalToGlobalMappingDestroy(&petsc_local_to_global[d]);
+
+  // Entries outside of the counted nonzeros should never be inserted
+  ierr = MatSetOption(A, MAT_NEW_NONZERO_ALLOCATION_ERR, PETSC_TRUE);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "MatSetOption");
+
+  return A;
+}
+
 /// @brief Create a matrix
 /// @param[in] a A bilinear form
 /// @param[in] index_maps A pair of index maps. Row index map is given by
@@ -36,7 +338,12 @@ namespace petsc
 /// dofmap is given by dofmaps[0], while column dofmap is given by dofmaps[1].
 /// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
 /// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
 /// @param[in] matrix_type The PETSc matrix type to create
+/// @param[in] num_threads Number of threads used to build the sparsity
+/// pattern.
 /// @return A sparse matrix with a layout and sparsity that matches the
 /// bilinear form. The caller is responsible for destroying the Mat
 /// object.
@@ -48,36 +355,52 @@ Mat create_matrix(
     const std::array<int, 2> index_maps_bs,
     std::array<std::span<const std::int32_t>, 2> dofmaps_list,
     std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
-    std::string matrix_type = std::string())
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    std::string matrix_type = std::string(), int num_threads = 1)
 {
   dolfinx::la::SparsityPattern pattern
       = multiphenicsx::fem::create_sparsity_pattern(
-          a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds);
+          a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds,
+          dofmaps_cells, num_threads);
   pattern.finalize();
-  return dolfinx::la::petsc::create_matrix(a.mesh()->comm(), pattern,
-                                           matrix_type);
+  return create_matrix(pattern, matrix_type);
 }
 
-/// @brief Initialise a monolithic matrix for an array of bilinear
-/// forms.
-/// @param[in] a Rectangular array of bilinear forms. The `a(i, j)` form
-/// will correspond to the `(i, j)` block in the returned matrix
-/// @param[in] index_maps A pair of vectors of index maps. Index maps for block
-/// (i, j) will be constructed from (index_maps[0][i], index_maps[1][j]).
-/// @param[in] index_maps_bs A pair of vectors of int, representing the block
-/// size of the corresponding entry in index_maps.
-/// @param[in] dofmaps_list An array of list of spans containing the dofmaps
-/// list for each block. The dofmap pair for block (i, j) will be constructed
-/// from (dofmaps[0][i], dofmaps[1][j]).
-/// @param[in] dofmaps_bounds An array of list of spans containing the dofmaps
-/// bounds for each block.
-/// @param[in] matrix_type The type of PETSc Mat. If empty the PETSc default is
-/// used.
-/// @return A sparse matrix  with a layout and sparsity that matches the
-/// bilinear forms. The caller is responsible for destroying the Mat
+/// @brief Create a matrix, preallocated from nonzero counts computed
+/// directly from the dofmaps.
+///
+/// Contrary to create_matrix, no sparsity pattern is built: the number of
+/// nonzeros in the diagonal and off-diagonal parts of each row is computed by
+/// multiphenicsx::fem::count_nonzeros, and used to preallocate the matrix
+/// exactly.
+/// @note See create_matrix for a description of the arguments.
+/// @return A sparse matrix with a layout and preallocation that matches the
+/// bilinear form. The caller is responsible for destroying the Mat
 /// object.
 template <std::floating_point T>
-Mat create_matrix_block(
+Mat create_matrix_from_nonzero_counts(
+    const dolfinx::fem::Form<PetscScalar, T>& a,
+    std::array<std::reference_wrapper<const dolfinx::common::IndexMap>, 2>
+        index_maps,
+    const std::array<int, 2> index_maps_bs,
+    std::array<std::span<const std::int32_t>, 2> dofmaps_list,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    std::string matrix_type = std::string())
+{
+  auto [nnz_diag, nnz_off] = multiphenicsx::fem::count_nonzeros(
+      a, index_maps, dofmaps_list, dofmaps_bounds, dofmaps_cells);
+  return create_matrix_from_nonzero_counts(index_maps, index_maps_bs,
+                                           nnz_diag, nnz_off, matrix_type);
+}
+
+/// @brief Build the sparsity pattern of a monolithic matrix for an array of
+/// bilinear forms.
+/// @note See create_matrix_block for a description of the arguments.
+/// @return The finalised sparsity pattern of the monolithic matrix, in units
+/// of the block sizes returned by impl::block_sizes.
+template <std::floating_point T>
+dolfinx::la::SparsityPattern create_block_sparsity_pattern(
     const std::vector<std::vector<const dolfinx::fem::Form<PetscScalar, T>*>>&
         a,
     std::array<
@@ -86,16 +409,20 @@ Mat create_matrix_block(
     const std::array<std::vector<int>, 2> index_maps_bs,
     std::array<std::vector<std::span<const std::int32_t>>, 2> dofmaps_list,
     std::array<std::vector<std::span<const std::size_t>>, 2> dofmaps_bounds,
-    std::string matrix_type = std::string())
+    std::array<std::vector<std::optional<std::span<const std::int32_t>>>, 2>
+        dofmaps_cells,
+    int num_threads = 1)
 {
   std::size_t rows = index_maps[0].size();
   assert(index_maps_bs[0].size() == rows);
   assert(dofmaps_list[0].size() == rows);
   assert(dofmaps_bounds[0].size() == rows);
+  assert(dofmaps_cells[0].size() == rows);
   std::size_t cols = index_maps[1].size();
   assert(index_maps_bs[1].size() == cols);
   assert(dofmaps_list[1].size() == cols);
   assert(dofmaps_bounds[1].size() == cols);
+  assert(dofmaps_cells[1].size() == cols);
 
   // Build sparsity pattern for each block
   std::shared_ptr<const dolfinx::mesh::Mesh<T>> mesh;
@@ -112,7 +439,9 @@ Mat create_matrix_block(
                 *form, {{index_maps[0][row], index_maps[1][col]}},
                 {{index_maps_bs[0][row], index_maps_bs[1][col]}},
                 {{dofmaps_list[0][row], dofmaps_list[1][col]}},
-                {{dofmaps_bounds[0][row], dofmaps_bounds[1][col]}})));
+                {{dofmaps_bounds[0][row], dofmaps_bounds[1][col]}},
+                {{dofmaps_cells[0][row], dofmaps_cells[1][col]}},
+                num_threads)));
         if (!mesh)
           mesh = form->mesh();
       }
@@ -124,7 +453,9 @@ Mat create_matrix_block(
   if (!mesh)
     throw std::runtime_error("Could not find a Mesh.");
 
-  // Compute offsets for the fields
+  // Indices of the merged sparsity pattern are expressed in units of the
+  // block size of the monolithic matrix
+  auto [bs, unit_bs] = impl::block_sizes(index_maps_bs);
   std::array<std::vector<std::pair<
                  std::reference_wrapper<const dolfinx::common::IndexMap>, int>>,
              2>
@@ -133,7 +464,7 @@ Mat create_matrix_block(
   {
     for (std::size_t f = 0; f < index_maps[d].size(); ++f)
     {
-      maps_and_bs[d].emplace_back(index_maps[d][f], index_maps_bs[d][f]);
+      maps_and_bs[d].emplace_back(index_maps[d][f], unit_bs[d][f]);
     }
   }
 
@@ -143,57 +474,106 @@ Mat create_matrix_block(
     for (std::size_t col = 0; col < cols; ++col)
       p[row].push_back(patterns[row][col].get());
 
-  dolfinx::la::SparsityPattern pattern(mesh->comm(), p, maps_and_bs,
-                                       index_maps_bs);
+  dolfinx::la::SparsityPattern pattern(mesh->comm(), p, maps_and_bs, unit_bs);
   pattern.finalize();
+  return pattern;
+}
+
+/// @brief Initialise a monolithic matrix from the finalised sparsity pattern
+/// of an array of bilinear forms.
+///
+/// This allows to create several matrices with the same nonzero structure
+/// while building the sparsity pattern only once.
+/// @param[in] pattern The finalised sparsity pattern, as returned by
+/// create_block_sparsity_pattern.
+/// @param[in] index_maps A pair of vectors of index maps, the same that were
+/// used to build the pattern.
+/// @param[in] index_maps_bs A pair of vectors of int, representing the block
+/// size of the corresponding entry in index_maps.
+/// @param[in] matrix_type The type of PETSc Mat. If empty the PETSc default is
+/// used.
+/// @note See create_matrix_block for a description of the block size and of
+/// the storage of the returned matrix.
+/// @return A sparse matrix with a layout and sparsity that matches the
+/// pattern. The caller is responsible for destroying the Mat object.
+inline Mat create_matrix_block(
+    const dolfinx::la::SparsityPattern& pattern,
+    std::array<
+        std::vector<std::reference_wrapper<const dolfinx::common::IndexMap>>, 2>
+        index_maps,
+    const std::array<std::vector<int>, 2> index_maps_bs,
+    const std::string& matrix_type = std::string())
+{
+  MPI_Comm comm = pattern.index_map(0)->comm();
+  auto [bs, unit_bs] = impl::block_sizes(index_maps_bs);
 
   // FIXME: Add option to pass customised local-to-global map to PETSc
   // Mat constructor
 
   // Initialise matrix
-  Mat A = dolfinx::la::petsc::create_matrix(mesh->comm(), pattern, matrix_type);
+  Mat A;
+  if (bs[0] == 1 and bs[1] == 1
+      and matrix_type.find("sbaij") == std::string::npos)
+  {
+    A = dolfinx::la::petsc::create_matrix(comm, pattern, matrix_type);
+  }
+  else
+  {
+    A = impl::create_matrix_from_block_pattern(comm, pattern, bs, matrix_type);
+  }
+
+  // Rows and columns share the same layout if they are built from the same
+  // index maps with the same block sizes
+  const bool same_layout
+      = index_maps_bs[0] == index_maps_bs[1]
+        and std::ranges::equal(
+            index_maps[0], index_maps[1],
+            [](const dolfinx::common::IndexMap& map0,
+               const dolfinx::common::IndexMap& map1)
+            { return &map0 == &map1; });
 
   // Create row and column local-to-global maps (field0, field1, field2,
   // etc), i.e. ghosts of field0 appear before owned indices of field1
   std::array<std::vector<PetscInt>, 2> _maps;
-  for (int d = 0; d < 2; ++d)
+  for (int d = 0; d < (same_layout ? 1 : 2); ++d)
   {
     // TODO: Index map concatenation has already been computed inside
     // the SparsityPattern constructor, but we also need it here to
     // build the PETSc local-to-global map. Compute outside and pass
     // into SparsityPattern constructor.
-
-    // TODO: avoid concatenating the same maps twice in case that V[0]
-    // == V[1].
     const std::vector<std::reference_wrapper<const dolfinx::common::IndexMap>>&
         index_map
         = index_maps[d];
-    const std::vector<int>& index_map_bs = index_maps_bs[d];
+    const std::vector<int>& index_map_bs = unit_bs[d];
     std::vector<PetscInt>& _map = _maps[d];
+    std::vector<
+        std::pair<std::reference_wrapper<const dolfinx::common::IndexMap>, int>>
+        maps_and_bs;
+    for (std::size_t f = 0; f < index_map.size(); ++f)
+      maps_and_bs.emplace_back(index_map[f], index_map_bs[f]);
 
     // Concatenate the block index map in the row and column directions
     auto [rank_offset, local_offset, ghosts, _]
-        = dolfinx::common::stack_index_maps(maps_and_bs[d]);
+        = dolfinx::common::stack_index_maps(maps_and_bs);
     for (std::size_t f = 0; f < index_map.size(); ++f)
     {
       const dolfinx::common::IndexMap& map = index_map[f].get();
-      const int bs = index_map_bs[f];
-      const std::int32_t size_local = bs * map.size_local();
+      const int bs_f = index_map_bs[f];
+      const std::int32_t size_local = bs_f * map.size_local();
       const std::vector global = map.global_indices();
       for (std::int32_t i = 0; i < size_local; ++i)
         _map.push_back(i + rank_offset + local_offset[f]);
-      for (std::size_t i = size_local; i < bs * global.size(); ++i)
+      for (std::size_t i = size_local; i < bs_f * global.size(); ++i)
         _map.push_back(ghosts[f][i - size_local]);
     }
   }
 
   // Create PETSc local-to-global map/index sets and attach to matrix
   ISLocalToGlobalMapping petsc_local_to_global0;
-  ISLocalToGlobalMappingCreate(MPI_COMM_SELF, 1, _maps[0].size(),
+  ISLocalToGlobalMappingCreate(MPI_COMM_SELF, bs[0], _maps[0].size(),
                                _maps[0].data(), PETSC_COPY_VALUES,
                                &petsc_local_to_global0);
-  if (&dofmaps_list[0] == &dofmaps_list[1]
-      && &dofmaps_bounds[0] == &dofmaps_bounds[1])
+  if (same_layout)
   {
     MatSetLocalToGlobalMapping(A, petsc_local_to_global0,
                                petsc_local_to_global0);
@@ -202,7 +582,7 @@ Mat create_matrix_block(
   else
   {
     ISLocalToGlobalMapping petsc_local_to_global1;
-    ISLocalToGlobalMappingCreate(MPI_COMM_SELF, 1, _maps[1].size(),
+    ISLocalToGlobalMappingCreate(MPI_COMM_SELF, bs[1], _maps[1].size(),
                                  _maps[1].data(), PETSC_COPY_VALUES,
                                  &petsc_local_to_global1);
     MatSetLocalToGlobalMapping(A, petsc_local_to_global0,
@@ -214,11 +594,38 @@ Mat create_matrix_block(
   return A;
 }
 
-/// @brief Create nested (MatNest) matrix.
-///
-/// @note The caller is responsible for destroying the Mat object.
+/// @brief Initialise a monolithic matrix for an array of bilinear
+/// forms.
+/// @param[in] a Rectangular array of bilinear forms. The `a(i, j)` form
+/// will correspond to the `(i, j)` block in the returned matrix
+/// @param[in] index_maps A pair of vectors of index maps. Index maps for block
+/// (i, j) will be constructed from (index_maps[0][i], index_maps[1][j]).
+/// @param[in] index_maps_bs A pair of vectors of int, representing the block
+/// size of the corresponding entry in index_maps.
+/// @param[in] dofmaps_list An array of list of spans containing the dofmaps
+/// list for each block. The dofmap pair for block (i, j) will be constructed
+/// from (dofmaps[0][i], dofmaps[1][j]).
+/// @param[in] dofmaps_bounds An array of list of spans containing the dofmaps
+/// bounds for each block.
+/// @param[in] dofmaps_cells An array of list of spans containing the sorted
+/// list of cells stored in the dofmaps for each block, for dofmaps in compact
+/// storage mode. Pass std::nullopt for dofmaps storing dofs for all cells.
+/// @param[in] matrix_type The type of PETSc Mat. If empty the PETSc default is
+/// used.
+/// @param[in] num_threads Number of threads used to build the sparsity
+/// pattern of each block.
+/// @note For symmetric (SBAIJ) matrix types, only the upper triangular part of
+/// the matrix is stored, and lower triangular entries are ignored on
+/// insertion. Null forms may then be passed for blocks below the diagonal
+/// when they do not contribute to the upper triangular part, i.e. in serial.
+/// @note The row (respectively, column) block size of the returned matrix is
+/// the one of the row (respectively, column) index maps if they all share the
+/// same block size, and one otherwise.
+/// @return A sparse matrix  with a layout and sparsity that matches the
+/// bilinear forms. The caller is responsible for destroying the Mat
+/// object.
 template <std::floating_point T>
-Mat create_matrix_nest(
+Mat create_matrix_block(
     const std::vector<std::vector<const dolfinx::fem::Form<PetscScalar, T>*>>&
         a,
     std::array<
@@ -227,47 +634,62 @@ Mat create_matrix_nest(
     const std::array<std::vector<int>, 2> index_maps_bs,
     std::array<std::vector<std::span<const std::int32_t>>, 2> dofmaps_list,
     std::array<std::vector<std::span<const std::size_t>>, 2> dofmaps_bounds,
+    std::array<std::vector<std::optional<std::span<const std::int32_t>>>, 2>
+        dofmaps_cells,
+    std::string matrix_type = std::string(), int num_threads = 1)
+{
+  dolfinx::la::SparsityPattern pattern = create_block_sparsity_pattern(
+      a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds,
+      dofmaps_cells, num_threads);
+  return create_matrix_block(pattern, index_maps, index_maps_bs, matrix_type);
+}
+
+/// @brief Create nested (MatNest) matrix from the finalised sparsity patterns
+/// of its blocks.
+///
+/// This allows to create several matrices with the same nonzero structure
+/// while building the sparsity patterns only once.
+/// @param[in] patterns Rectangular array of finalised sparsity patterns. Null
+/// patterns correspond to empty blocks.
+/// @param[in] matrix_types The type of PETSc Mat of each block. If empty the
+/// PETSc default is used for every block.
+/// @return A nested matrix whose blocks have a layout and sparsity that
+/// matches the patterns. The caller is responsible for destroying the Mat
+/// object.
+inline Mat create_matrix_nest(
+    const std::vector<std::vector<const dolfinx::la::SparsityPattern*>>&
+        patterns,
     const std::vector<std::vector<std::string>>& matrix_types)
 {
-  std::size_t rows = index_maps[0].size();
-  assert(index_maps_bs[0].size() == rows);
-  assert(dofmaps_list[0].size() == rows);
-  assert(dofmaps_bounds[0].size() == rows);
-  std::size_t cols = index_maps[1].size();
-  assert(index_maps_bs[1].size() == cols);
-  assert(dofmaps_list[1].size() == cols);
-  assert(dofmaps_bounds[1].size() == cols);
+  std::size_t rows = patterns.size();
+  std::size_t cols = rows > 0 ? patterns[0].size() : 0;
   std::vector<std::vector<std::string>> _matrix_types(
       rows, std::vector<std::string>(cols));
   if (!matrix_types.empty())
     _matrix_types = matrix_types;
 
-  // Loop over each form and create matrix
+  // Loop over each pattern and create matrix
   std::vector<Mat> mats(rows * cols, nullptr);
-  std::shared_ptr<const mesh::Mesh<T>> mesh;
+  std::optional<MPI_Comm> comm;
   for (std::size_t i = 0; i < rows; ++i)
   {
     for (std::size_t j = 0; j < cols; ++j)
     {
-      if (const dolfinx::fem::Form<PetscScalar, T>* form = a[i][j]; form)
+      if (const dolfinx::la::SparsityPattern* pattern = patterns[i][j];
+          pattern)
       {
-        mats[i * cols + j] = multiphenicsx::fem::petsc::create_matrix(
-            *form, {{index_maps[0][i], index_maps[1][j]}},
-            {{index_maps_bs[0][i], index_maps_bs[1][j]}},
-            {{dofmaps_list[0][i], dofmaps_list[1][j]}},
-            {{dofmaps_bounds[0][i], dofmaps_bounds[1][j]}},
-            _matrix_types[i][j]);
-        mesh = form->mesh();
+        mats[i * cols + j] = create_matrix(*pattern, _matrix_types[i][j]);
+        comm = pattern->index_map(0)->comm();
       }
     }
   }
 
-  if (!mesh)
-    throw std::runtime_error("Could not find a Mesh.");
+  if (!comm)
+    throw std::runtime_error("Could not find a sparsity pattern.");
 
   // Initialise block (MatNest) matrix
   Mat A;
-  MatCreate(mesh->comm(), &A);
+  MatCreate(*comm, &A);
   MatSetType(A, MATNEST);
   MatNestSetSubMats(A, rows, nullptr, cols, nullptr, mats.data());
   MatSetUp(A);
@@ -282,6 +704,303 @@ Mat create_matrix_nest(
   return A;
 }
 
+/// @brief Create nested (MatNest) matrix.
+///
+/// @note The caller is responsible for destroying the Mat object.
+/// @note See create_matrix_block for a description of the arguments.
+template <std::floating_point T>
+Mat create_matrix_nest(
+    const std::vector<std::vector<const dolfinx::fem::Form<PetscScalar, T>*>>&
+        a,
+    std::array<
+        std::vector<std::reference_wrapper<const dolfinx::common::IndexMap>>, 2>
+        index_maps,
+    const std::array<std::vector<int>, 2> index_maps_bs,
+    std::array<std::vector<std::span<const std::int32_t>>, 2> dofmaps_list,
+    std::array<std::vector<std::span<const std::size_t>>, 2> dofmaps_bounds,
+    std::array<std::vector<std::optional<std::span<const std::int32_t>>>, 2>
+        dofmaps_cells,
+    const std::vector<std::vector<std::string>>& matrix_types,
+    int num_threads = 1)
+{
+  std::size_t rows = index_maps[0].size();
+  assert(index_maps_bs[0].size() == rows);
+  assert(dofmaps_list[0].size() == rows);
+  assert(dofmaps_bounds[0].size() == rows);
+  assert(dofmaps_cells[0].size() == rows);
+  std::size_t cols = index_maps[1].size();
+  assert(index_maps_bs[1].size() == cols);
+  assert(dofmaps_list[1].size() == cols);
+  assert(dofmaps_bounds[1].size() == cols);
+  assert(dofmaps_cells[1].size() == cols);
+
+  // Loop over each form and build its sparsity pattern
+  std::vector<std::unique_ptr<dolfinx::la::SparsityPattern>> storage;
+  std::vector<std::vector<const dolfinx::la::SparsityPattern*>> patterns(
+      rows, std::vector<const dolfinx::la::SparsityPattern*>(cols, nullptr));
+  for (std::size_t i = 0; i < rows; ++i)
+  {
+    for (std::size_t j = 0; j < cols; ++j)
+    {
+      if (const dolfinx::fem::Form<PetscScalar, T>* form = a[i][j]; form)
+      {
+        storage.push_back(std::make_unique<dolfinx::la::SparsityPattern>(
+            multiphenicsx::fem::create_sparsity_pattern(
+                *form, {{index_maps[0][i], index_maps[1][j]}},
+                {{index_maps_bs[0][i], index_maps_bs[1][j]}},
+                {{dofmaps_list[0][i], dofmaps_list[1][j]}},
+                {{dofmaps_bounds[0][i], dofmaps_bounds[1][j]}},
+                {{dofmaps_cells[0][i], dofmaps_cells[1][j]}}, num_threads)));
+        storage.back()->finalize();
+        patterns[i][j] = storage.back().get();
+      }
+    }
+  }
+
+  return create_matrix_nest(patterns, matrix_types);
+}
+
+/// @brief Assemble a bilinear form into a matrix, and its transpose into a
+/// second matrix, with a single evaluation of the element kernels.
+///
+/// This is meant for pairs of blocks of a block matrix which are the
+/// transpose of each other, e.g. the pressure-velocity coupling of a Stokes
+/// problem. Rows and columns associated to Dirichlet boundary conditions are
+/// zeroed in both matrices.
+/// @param[in,out] A The matrix to assemble the form into. Local indices of
+/// its rows and columns are the ones of the dofmaps of the form.
+/// @param[in,out] AT The matrix to assemble the transpose of the form into.
+/// Local indices of its rows (columns) are the ones of the column (row)
+/// dofmap of the form.
+/// @param[in] a The bilinear form.
+/// @param[in] constants Constants that appear in `a`.
+/// @param[in] coefficients Coefficients that appear in `a`.
+/// @param[in] bcs Boundary conditions to apply.
+/// @param[in] unrolled If true, element matrices are inserted by entry,
+/// otherwise by block.
+template <std::floating_point T>
+void assemble_matrix_and_transpose(
+    Mat A, Mat AT, const dolfinx::fem::Form<PetscScalar, T>& a,
+    std::span<const PetscScalar> constants,
+    const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                   std::pair<std::span<const PetscScalar>, int>>&
+        coefficients,
+    const std::vector<const dolfinx::fem::DirichletBC<PetscScalar, T>*>& bcs,
+    bool unrolled)
+{
+  // Mark dofs associated to boundary conditions
+  const std::array<std::vector<std::int8_t>, 2> dof_markers
+      = impl::mark_bc_dofs(a, bcs);
+
+  // Insert each element matrix in A, and its transpose in AT
+  const std::array<int, 2> bs = {a.function_spaces()[0]->dofmap()->bs(),
+                                 a.function_spaces()[1]->dofmap()->bs()};
+  using set_fn_t = std::function<int(std::span<const std::int32_t>,
+                                     std::span<const std::int32_t>,
+                                     std::span<const PetscScalar>)>;
+  auto create_set_fn = [unrolled](Mat mat, int bs0, int bs1) -> set_fn_t
+  {
+    if (unrolled)
+    {
+      return dolfinx::la::petsc::Matrix::set_block_expand_fn(mat, bs0, bs1,
+                                                             ADD_VALUES);
+    }
+    else
+      return dolfinx::la::petsc::Matrix::set_block_fn(mat, ADD_VALUES);
+  };
+  set_fn_t set_A = create_set_fn(A, bs[0], bs[1]);
+  set_fn_t set_AT = create_set_fn(AT, bs[1], bs[0]);
+  std::vector<PetscScalar> values_transpose;
+  auto set = [&set_A, &set_AT, &bs,
+              &values_transpose](std::span<const std::int32_t> rows,
+                                 std::span<const std::int32_t> cols,
+                                 std::span<const PetscScalar> values)
+  {
+    const std::size_t num_rows = bs[0] * rows.size();
+    const std::size_t num_cols = bs[1] * cols.size();
+    values_transpose.resize(num_rows * num_cols);
+    for (std::size_t i = 0; i < num_rows; ++i)
+      for (std::size_t j = 0; j < num_cols; ++j)
+        values_transpose[j * num_rows + i] = values[i * num_cols + j];
+    const int ierr = set_A(rows, cols, values);
+    if (ierr != 0)
+      return ierr;
+    return set_AT(cols, rows, values_transpose);
+  };
+  dolfinx::fem::assemble_matrix(set, a, constants, coefficients,
+                                dof_markers[0], dof_markers[1]);
+}
+
+/// @brief Assemble a bilinear form into a restricted matrix, inserting
+/// element matrices directly in the local numbering of the matrix.
+///
+/// Rows and columns of each element matrix which are not active in the
+/// restriction are discarded before insertion, and the remaining ones are
+/// inserted with MatSetValuesLocal (or MatSetValuesBlockedLocal) in A. This
+/// avoids extracting a local submatrix and inserting entries which are then
+/// discarded by PETSc. Kernels are only run on the entities of the
+/// integration domains which have active dofs in both restrictions, see
+/// assemble_active_entities. Rows and columns associated to Dirichlet
+/// boundary conditions are zeroed.
+/// @param[in,out] A The matrix to assemble the form into. Its local numbering
+/// must be the one of the restricted index maps, e.g. as returned by
+/// create_matrix or create_matrix_block.
+/// @param[in] a The bilinear form.
+/// @param[in] constants Constants that appear in `a`.
+/// @param[in] coefficients Coefficients that appear in `a`.
+/// @param[in] bcs Boundary conditions to apply.
+/// @param[in] restrictions Restrictions of the row and column dofmaps of `a`.
+/// @param[in] offsets Offsets of the (unrolled) restricted dofs in the local
+/// numbering of A, i.e. the position of the block in a block matrix.
+/// @param[in] unrolled If true, element matrices are inserted by entry,
+/// otherwise by block. The latter requires the block sizes of A to agree
+/// with the ones of the dofmaps of `a`.
+template <std::floating_point T>
+void assemble_matrix_restricted(
+    Mat A, const dolfinx::fem::Form<PetscScalar, T>& a,
+    std::span<const PetscScalar> constants,
+    const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                   std::pair<std::span<const PetscScalar>, int>>&
+        coefficients,
+    const std::vector<const dolfinx::fem::DirichletBC<PetscScalar, T>*>& bcs,
+    std::array<std::reference_wrapper<const DofMapRestriction>, 2>
+        restrictions,
+    std::array<PetscInt, 2> offsets, bool unrolled)
+{
+  const std::array<std::span<const std::int32_t>, 2>
+      unrestricted_to_restricted
+      = {restrictions[0].get().unrestricted_to_restricted(),
+         restrictions[1].get().unrestricted_to_restricted()};
+
+  // Mark dofs associated to boundary conditions
+  const std::array<std::vector<std::int8_t>, 2> dof_markers
+      = impl::mark_bc_dofs(a, bcs);
+
+  // Compact each element matrix to the active rows and columns, and insert
+  // it in A with restricted local indices
+  const std::array<int, 2> bs = {a.function_spaces()[0]->dofmap()->bs(),
+                                 a.function_spaces()[1]->dofmap()->bs()};
+  for (std::size_t d = 0; d < 2; ++d)
+    assert(unrolled or offsets[d] % bs[d] == 0);
+  std::array<std::vector<std::size_t>, 2> active_entries;
+  std::array<std::vector<PetscInt>, 2> restricted_dofs;
+  std::vector<PetscScalar> restricted_values;
+  auto set = [&](std::span<const std::int32_t> rows,
+                 std::span<const std::int32_t> cols,
+                 std::span<const PetscScalar> values) -> int
+  {
+    const std::array<std::span<const std::int32_t>, 2> dofs = {rows, cols};
+    for (std::size_t d = 0; d < 2; ++d)
+    {
+      active_entries[d].clear();
+      restricted_dofs[d].clear();
+      for (std::size_t k = 0; k < dofs[d].size(); ++k)
+      {
+        const std::int32_t restricted_dof
+            = unrestricted_to_restricted[d][dofs[d][k]];
+        if (restricted_dof >= 0)
+        {
+          for (int c = 0; c < bs[d]; ++c)
+          {
+            active_entries[d].push_back(bs[d] * k + c);
+            if (unrolled)
+            {
+              restricted_dofs[d].push_back(offsets[d] + bs[d] * restricted_dof
+                                           + c);
+            }
+          }
+          if (!unrolled)
+            restricted_dofs[d].push_back(offsets[d] / bs[d] + restricted_dof);
+        }
+      }
+    }
+    if (active_entries[0].empty() or active_entries[1].empty())
+      return 0;
+
+    const std::size_t num_cols = bs[1] * cols.size();
+    const std::size_t num_active_cols = active_entries[1].size();
+    restricted_values.resize(active_entries[0].size() * num_active_cols);
+    for (std::size_t i = 0; i < active_entries[0].size(); ++i)
+    {
+      const std::size_t row_offset = active_entries[0][i] * num_cols;
+      for (std::size_t j = 0; j < num_active_cols; ++j)
+      {
+        restricted_values[i * num_active_cols + j]
+            = values[row_offset + active_entries[1][j]];
+      }
+    }
+
+    PetscErrorCode ierr;
+    if (unrolled)
+    {
+      ierr = MatSetValuesLocal(
+          A, restricted_dofs[0].size(), restricted_dofs[0].data(),
+          restricted_dofs[1].size(), restricted_dofs[1].data(),
+          restricted_values.data(), ADD_VALUES);
+      if (ierr != 0)
+        dolfinx::la::petsc::error(ierr, __FILE__, "MatSetValuesLocal");
+    }
+    else
+    {
+      ierr = MatSetValuesBlockedLocal(
+          A, restricted_dofs[0].size(), restricted_dofs[0].data(),
+          restricted_dofs[1].size(), restricted_dofs[1].data(),
+          restricted_values.data(), ADD_VALUES);
+      if (ierr != 0)
+        dolfinx::la::petsc::error(ierr, __FILE__, "MatSetValuesBlockedLocal");
+    }
+    return ierr;
+  };
+
+  // Zero rows and columns of element matrices associated to boundary
+  // conditions, and insert them
+  auto insert = [&](std::array<std::span<const std::int32_t>, 2> dofs,
+                    std::span<PetscScalar> values)
+  {
+    const std::size_t num_cols = bs[1] * dofs[1].size();
+    if (!dof_markers[0].empty())
+    {
+      for (std::size_t i = 0; i < dofs[0].size(); ++i)
+      {
+        for (int k = 0; k < bs[0]; ++k)
+        {
+          if (dof_markers[0][bs[0] * dofs[0][i] + k])
+          {
+            std::fill_n(std::next(values.begin(), (bs[0] * i + k) * num_cols),
+                        num_cols, 0);
+          }
+        }
+      }
+    }
+    if (!dof_markers[1].empty())
+    {
+      const std::size_t num_rows = bs[0] * dofs[0].size();
+      for (std::size_t j = 0; j < dofs[1].size(); ++j)
+      {
+        for (int k = 0; k < bs[1]; ++k)
+        {
+          if (dof_markers[1][bs[1] * dofs[1][j] + k])
+          {
+            for (std::size_t row = 0; row < num_rows; ++row)
+              values[row * num_cols + bs[1] * j + k] = 0;
+          }
+        }
+      }
+    }
+    set(dofs[0], dofs[1], values);
+  };
+  std::array<std::span<const std::size_t>, 2> dofmaps_bounds;
+  std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells;
+  for (std::size_t d = 0; d < 2; ++d)
+  {
+    dofmaps_bounds[d] = restrictions[d].get().map().second;
+    if (restrictions[d].get().compact())
+      dofmaps_cells[d] = restrictions[d].get().active_cells();
+  }
+  multiphenicsx::fem::assemble_active_entities<2>(
+      a, constants, coefficients, dofmaps_bounds, dofmaps_cells, insert);
+}
+
 } // namespace petsc
 } // namespace fem
 } // namespace multiphenicsx
@@ -4,54 +4,287 @@
 //
 // SPDX-License-Identifier: LGPL-3.0-or-later
 
+#include <algorithm>
+#include <array>
+#include <dolfinx/common/IndexMap.h>
+#include <dolfinx/common/MPI.h>
 #include <dolfinx/la/SparsityPattern.h>
 #include <dolfinx/mesh/Topology.h>
+#include <iterator>
+#include <memory>
+#include <numeric>
 #include <multiphenicsx/fem/sparsitybuild.h>
+#include <optional>
+#include <thread>
+#include <vector>
 
 using namespace dolfinx;
 namespace sparsitybuild = multiphenicsx::fem::sparsitybuild;
 
+namespace
+{
+/// Insert entries into a sparsity pattern, possibly using several threads.
+/// The kernel is called as kernel(begin, end, insert), and is expected to call
+/// insert(rows, cols) for each entity in the range [begin, end). When more than
+/// one thread is requested, entities are partitioned in contiguous chunks, and
+/// each thread stores the (row, column) pairs of its chunk in a flat buffer,
+/// which is then sorted and deduplicated. Memory usage thus scales with the
+/// number of inserted entries rather than with the number of threads times the
+/// number of rows. Each buffer is then inserted into the sparsity pattern one
+/// row at a time; entries shared by different chunks are deduplicated when the
+/// pattern is finalised.
+template <typename Kernel>
+void insert_entries(la::SparsityPattern& pattern, std::size_t num_entities,
+                    int num_threads, const Kernel& kernel)
+{
+  if (num_threads <= 1 or num_entities <= 1)
+  {
+    kernel(std::size_t(0), num_entities,
+           [&pattern](std::span<const std::int32_t> rows,
+                      std::span<const std::int32_t> cols)
+           { pattern.insert(rows, cols); });
+    return;
+  }
+
+  num_threads
+      = static_cast<int>(std::min<std::size_t>(num_threads, num_entities));
+
+  // Build thread-local sorted lists of unique (row, column) pairs
+  std::vector<std::vector<std::array<std::int32_t, 2>>> thread_entries(
+      num_threads);
+  {
+    std::vector<std::jthread> threads;
+    threads.reserve(num_threads);
+    for (int t = 0; t < num_threads; ++t)
+    {
+      threads.emplace_back(
+          [&, t]()
+          {
+            auto [begin, end]
+                = dolfinx::MPI::local_range(t, num_entities, num_threads);
+            std::vector<std::array<std::int32_t, 2>>& entries_t
+                = thread_entries[t];
+            kernel(begin, end,
+                   [&entries_t](std::span<const std::int32_t> rows,
+                                std::span<const std::int32_t> cols)
+                   {
+                     for (auto row : rows)
+                       for (auto col : cols)
+                         entries_t.push_back({row, col});
+                   });
+            std::ranges::sort(entries_t);
+            auto [first, last] = std::ranges::unique(entries_t);
+            entries_t.erase(first, last);
+          });
+    }
+  }
+
+  // Insert thread-local entries, one row at a time
+  std::vector<std::int32_t> cols;
+  for (std::vector<std::array<std::int32_t, 2>>& entries_t : thread_entries)
+  {
+    for (auto it = entries_t.begin(); it != entries_t.end();)
+    {
+      std::int32_t row = (*it)[0];
+      cols.clear();
+      for (; it != entries_t.end() and (*it)[0] == row; ++it)
+        cols.push_back((*it)[1]);
+      pattern.insert(std::span(&row, 1), cols);
+    }
+    std::vector<std::array<std::int32_t, 2>>().swap(entries_t);
+  }
+}
+
+/// Insert entries into a sparsity pattern in bulk. The kernel is called as in
+/// insert_entries, but entries are not inserted one entity at a time: a first
+/// call of the kernel counts the number of entries of each row, a second call
+/// gathers all entries in a contiguous row-wise buffer, and each row is then
+/// sorted, deduplicated and inserted once. This is meant for the case when the
+/// same rows are visited by many entities with large dof lists, e.g. interior
+/// facets, but calls the kernel twice; it is thus only used on request.
+template <typename Kernel>
+void insert_entries_batched(la::SparsityPattern& pattern,
+                            std::size_t num_entities, const Kernel& kernel)
+{
+  std::shared_ptr<const common::IndexMap> row_map = pattern.index_map(0);
+  const std::int32_t num_rows = row_map->size_local() + row_map->num_ghosts();
+
+  // Count entries of each row
+  std::vector<std::size_t> offsets(num_rows + 1, 0);
+  kernel(std::size_t(0), num_entities,
+         [&offsets](std::span<const std::int32_t> rows,
+                    std::span<const std::int32_t> cols)
+         {
+           for (auto row : rows)
+             offsets[row + 1] += cols.size();
+         });
+  std::partial_sum(offsets.begin(), offsets.end(), offsets.begin());
+
+  // Gather entries of each row
+  std::vector<std::int32_t> entries(offsets.back());
+  std::vector<std::size_t> positions(offsets.begin(), std::prev(offsets.end()));
+  kernel(std::size_t(0), num_entities,
+         [&entries, &positions](std::span<const std::int32_t> rows,
+                                std::span<const std::int32_t> cols)
+         {
+           for (auto row : rows)
+           {
+             std::ranges::copy(cols,
+                               std::next(entries.begin(), positions[row]));
+             positions[row] += cols.size();
+           }
+         });
+
+  // Deduplicate and insert each row
+  for (std::int32_t row = 0; row < num_rows; ++row)
+  {
+    auto begin = std::next(entries.begin(), offsets[row]);
+    auto end = std::next(entries.begin(), offsets[row + 1]);
+    if (begin != end)
+    {
+      std::sort(begin, end);
+      end = std::unique(begin, end);
+      pattern.insert(std::span(&row, 1),
+                     std::span<const std::int32_t>(&*begin, end - begin));
+    }
+  }
+}
+} // namespace
+
 //-----------------------------------------------------------------------------
 void sparsitybuild::cells(
     la::SparsityPattern& pattern, std::span<const std::int32_t> cells,
     std::array<std::span<const std::int32_t>, 2> dofmaps_list,
-    std::array<std::span<const std::size_t>, 2> dofmaps_bounds)
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    int num_threads)
 {
-  for (auto c : cells)
-  {
-    auto cell_dofs_0
-        = std::span(dofmaps_list[0].data() + dofmaps_bounds[0][c],
-                    dofmaps_bounds[0][c + 1] - dofmaps_bounds[0][c]);
-    auto cell_dofs_1
-        = std::span(dofmaps_list[1].data() + dofmaps_bounds[1][c],
-                    dofmaps_bounds[1][c + 1] - dofmaps_bounds[1][c]);
-    pattern.insert(cell_dofs_0, cell_dofs_1);
-  }
+  insert_entries(
+      pattern, cells.size(), num_threads,
+      [&](std::size_t begin, std::size_t end, auto&& insert)
+      {
+        for (std::size_t index = begin; index < end; ++index)
+        {
+          auto cell_dofs_0 = sparsitybuild::cell_dofs(
+              dofmaps_list[0], dofmaps_bounds[0], dofmaps_cells[0],
+              cells[index]);
+          auto cell_dofs_1 = sparsitybuild::cell_dofs(
+              dofmaps_list[1], dofmaps_bounds[1], dofmaps_cells[1],
+              cells[index]);
+          if (!cell_dofs_0.empty() and !cell_dofs_1.empty())
+            insert(cell_dofs_0, cell_dofs_1);
+        }
+      });
 }
 //-----------------------------------------------------------------------------
 void sparsitybuild::interior_facets(
     la::SparsityPattern& pattern, std::span<const std::int32_t> facets,
     std::array<std::span<const std::int32_t>, 2> dofmaps_list,
-    std::array<std::span<const std::size_t>, 2> dofmaps_bounds)
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    int num_threads, bool batched)
+{
+  auto kernel = [&](std::size_t begin, std::size_t end, auto&& insert)
+  {
+    std::array<std::vector<std::int32_t>, 2> macro_dofs;
+    for (std::size_t index = 2 * begin; index < 2 * end; index += 2)
+    {
+      int cell_0 = facets[index];
+      int cell_1 = facets[index + 1];
+      for (std::size_t i = 0; i < 2; ++i)
+      {
+        auto cell_dofs_0 = sparsitybuild::cell_dofs(
+            dofmaps_list[i], dofmaps_bounds[i], dofmaps_cells[i], cell_0);
+        auto cell_dofs_1 = sparsitybuild::cell_dofs(
+            dofmaps_list[i], dofmaps_bounds[i], dofmaps_cells[i], cell_1);
+        macro_dofs[i].resize(cell_dofs_0.size() + cell_dofs_1.size());
+        std::copy(cell_dofs_0.begin(), cell_dofs_0.end(),
+                  macro_dofs[i].begin());
+        std::copy(cell_dofs_1.begin(), cell_dofs_1.end(),
+                  std::next(macro_dofs[i].begin(), cell_dofs_0.size()));
+      }
+      if (!macro_dofs[0].empty() and !macro_dofs[1].empty())
+        insert(macro_dofs[0], macro_dofs[1]);
+    }
+  };
+  if (num_threads <= 1 and batched)
+    insert_entries_batched(pattern, facets.size() / 2, kernel);
+  else
+    insert_entries(pattern, facets.size() / 2, num_threads, kernel);
+}
+//-----------------------------------------------------------------------------
+std::vector<std::int32_t> sparsitybuild::active_cells(
+    std::span<const std::int32_t> cells,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells)
+{
+  std::vector<std::int32_t> active;
+  active.reserve(cells.size());
+  std::ranges::copy_if(
+      cells, std::back_inserter(active),
+      [&](std::int32_t cell)
+      {
+        return has_dofs(dofmaps_bounds[0], dofmaps_cells[0], cell)
+               and has_dofs(dofmaps_bounds[1], dofmaps_cells[1], cell);
+      });
+  return active;
+}
+//-----------------------------------------------------------------------------
+std::vector<std::int32_t> sparsitybuild::active_interior_facets(
+    std::span<const std::int32_t> facets,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells)
 {
-  std::array<std::vector<std::int32_t>, 2> macro_dofs;
+  std::vector<std::int32_t> active;
+  active.reserve(facets.size());
   for (std::size_t index = 0; index < facets.size(); index += 2)
   {
     int cell_0 = facets[index];
     int cell_1 = facets[index + 1];
+    bool active_facet = true;
     for (std::size_t i = 0; i < 2; ++i)
     {
-      auto cell_dofs_0 = std::span(
-          dofmaps_list[i].data() + dofmaps_bounds[i][cell_0],
-          dofmaps_bounds[i][cell_0 + 1] - dofmaps_bounds[i][cell_0]);
-      auto cell_dofs_1 = std::span(
-          dofmaps_list[i].data() + dofmaps_bounds[i][cell_1],
-          dofmaps_bounds[i][cell_1 + 1] - dofmaps_bounds[i][cell_1]);
-      macro_dofs[i].resize(cell_dofs_0.size() + cell_dofs_1.size());
-      std::copy(cell_dofs_0.begin(), cell_dofs_0.end(), macro_dofs[i].begin());
-      std::copy(cell_dofs_1.begin(), cell_dofs_1.end(),
-                std::next(macro_dofs[i].begin(), cell_dofs_0.size()));
+      active_facet
+          = active_facet
+            and (has_dofs(dofmaps_bounds[i], dofmaps_cells[i], cell_0)
+                 or has_dofs(dofmaps_bounds[i], dofmaps_cells[i], cell_1));
     }
-    pattern.insert(macro_dofs[0], macro_dofs[1]);
+    if (active_facet)
+      active.insert(active.end(), {cell_0, cell_1});
+  }
+  return active;
+}
+//-----------------------------------------------------------------------------
+bool sparsitybuild::has_dofs(
+    std::span<const std::size_t> dofmap_bounds,
+    std::optional<std::span<const std::int32_t>> dofmap_cells,
+    std::int32_t cell)
+{
+  if (dofmap_cells)
+  {
+    // Compact storage: only cells with at least one dof are stored
+    return std::ranges::binary_search(*dofmap_cells, cell);
   }
+  return dofmap_bounds[cell + 1] > dofmap_bounds[cell];
 }
+//-----------------------------------------------------------------------------
+std::span<const std::int32_t>
+sparsitybuild::cell_dofs(std::span<const std::int32_t> dofmap_list,
+                         std::span<const std::size_t> dofmap_bounds,
+                         std::optional<std::span<const std::int32_t>>
+                             dofmap_cells,
+                         std::int32_t cell)
+{
+  std::size_t position = cell;
+  if (dofmap_cells)
+  {
+    // Compact storage: locate the cell in the list of stored cells
+    auto it = std::ranges::lower_bound(*dofmap_cells, cell);
+    if (it == dofmap_cells->end() or *it != cell)
+      return std::span<const std::int32_t>();
+    position = std::distance(dofmap_cells->begin(), it);
+  }
+  return std::span(dofmap_list.data() + dofmap_bounds[position],
+                   dofmap_bounds[position + 1] - dofmap_bounds[position]);
+}
+//-----------------------------------------------------------------------------
@@ -7,8 +7,12 @@
 #pragma once
 
 #include <array>
+#include <cstdint>
 #include <dolfinx/la/SparsityPattern.h>
 #include <dolfinx/mesh/Topology.h>
+#include <optional>
+#include <span>
+#include <vector>
 
 namespace multiphenicsx
 {
@@ -22,16 +26,104 @@ namespace sparsitybuild
 {
 
 /// Iterate over cells and insert entries into sparsity pattern
-void cells(dolfinx::la::SparsityPattern& pattern,
-           std::span<const std::int32_t> cells,
-           std::array<std::span<const std::int32_t>, 2> dofmaps_list,
-           std::array<std::span<const std::size_t>, 2> dofmaps_bounds);
+/// @param[in,out] pattern The sparsity pattern.
+/// @param[in] cells The cells to iterate over.
+/// @param[in] dofmaps_list An array of spans containing the dofmaps list.
+/// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
+/// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode (see
+/// DofMapRestriction::active_cells). Cells not in the list have no dofs. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
+/// @param[in] num_threads Number of threads used to build the pattern. If
+/// larger than one, cells are partitioned among threads, each collecting the
+/// sorted unique (row, column) pairs of its cells, which are then inserted.
+void cells(
+    dolfinx::la::SparsityPattern& pattern, std::span<const std::int32_t> cells,
+    std::array<std::span<const std::int32_t>, 2> dofmaps_list,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    int num_threads = 1);
 
 /// Iterate over interior facets and insert entries into sparsity pattern
+/// @param[in,out] pattern The sparsity pattern.
+/// @param[in] facets The interior facets to iterate over, stored as pairs of
+/// adjacent cells.
+/// @param[in] dofmaps_list An array of spans containing the dofmaps list.
+/// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
+/// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
+/// @param[in] num_threads Number of threads used to build the pattern. If
+/// larger than one, facets are partitioned among threads, each collecting the
+/// sorted unique (row, column) pairs of its facets, which are then inserted.
+/// @param[in] batched If true, and facets are not partitioned among threads,
+/// the macro cell dofs of all facets are gathered in a contiguous row-wise
+/// buffer, and each row is deduplicated and inserted once, rather than
+/// inserting the entries of each facet in turn. This visits facets twice, and
+/// is thus experimental and disabled by default.
 void interior_facets(
     dolfinx::la::SparsityPattern& pattern, std::span<const std::int32_t> facets,
     std::array<std::span<const std::int32_t>, 2> dofmaps_list,
-    std::array<std::span<const std::size_t>, 2> dofmaps_bounds);
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    int num_threads = 1, bool batched = false);
+
+/// Extract the cells which have at least one dof in both dofmaps, i.e. the
+/// cells which contribute to the sparsity pattern
+/// @param[in] cells The cells to be filtered.
+/// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
+/// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
+/// @return The active cells, in the same order as in the input.
+std::vector<std::int32_t> active_cells(
+    std::span<const std::int32_t> cells,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells);
+
+/// Extract the interior facets whose macro cell has at least one dof in both
+/// dofmaps, i.e. the interior facets which contribute to the sparsity pattern
+/// @param[in] facets The interior facets to be filtered, stored as pairs of
+/// adjacent cells.
+/// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
+/// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
+/// @return The active interior facets, stored as pairs of adjacent cells in
+/// the same order as in the input.
+std::vector<std::int32_t> active_interior_facets(
+    std::span<const std::int32_t> facets,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells);
+
+/// Return true if a cell has at least one dof in a dofmap stored as an
+/// adjacency list, possibly in compact storage mode
+/// @param[in] dofmap_bounds The dofmap cell bounds.
+/// @param[in] dofmap_cells The sorted list of cells stored in the dofmap, for
+/// dofmaps in compact storage mode. Pass std::nullopt for dofmaps storing
+/// dofs for all cells.
+/// @param[in] cell The cell.
+bool has_dofs(std::span<const std::size_t> dofmap_bounds,
+              std::optional<std::span<const std::int32_t>> dofmap_cells,
+              std::int32_t cell);
+
+/// Get the dofs of a cell from a dofmap stored as an adjacency list
+/// @param[in] dofmap_list The dofmap list.
+/// @param[in] dofmap_bounds The dofmap cell bounds.
+/// @param[in] dofmap_cells The sorted list of cells stored in the dofmap, for
+/// dofmaps in compact storage mode. Pass std::nullopt for dofmaps storing
+/// dofs for all cells.
+/// @param[in] cell The cell.
+/// @return The dofs of the cell, or an empty span if the cell is not stored.
+std::span<const std::int32_t>
+cell_dofs(std::span<const std::int32_t> dofmap_list,
+          std::span<const std::size_t> dofmap_bounds,
+          std::optional<std::span<const std::int32_t>> dofmap_cells,
+          std::int32_t cell);
 
 } // namespace sparsitybuild
 } // namespace fem
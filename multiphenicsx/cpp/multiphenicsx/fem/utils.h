@@ -6,9 +6,21 @@
 
 #pragma once
 
+#include <algorithm>
+#include <dolfinx/common/MPI.h>
+#include <dolfinx/fem/DofMap.h>
+#include <dolfinx/fem/FiniteElement.h>
 #include <dolfinx/fem/Form.h>
+#include <dolfinx/fem/FunctionSpace.h>
 #include <dolfinx/la/SparsityPattern.h>
+#include <dolfinx/mesh/Mesh.h>
+#include <dolfinx/mesh/cell_types.h>
+#include <functional>
+#include <map>
 #include <multiphenicsx/fem/sparsitybuild.h>
+#include <numeric>
+#include <optional>
+#include <stdexcept>
 
 namespace multiphenicsx
 {
@@ -28,6 +40,14 @@ namespace fem
 /// dofmap is given by dofmaps[0], while column dofmap is given by dofmaps[1].
 /// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
 /// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
+/// @param[in] num_threads Number of threads used to build the pattern.
+/// @note Integration domains are intersected with the cells (or interior
+/// facets) which have at least one dof in both dofmaps before the pattern is
+/// built, so that the cost of the build scales with the size of the
+/// restriction rather than with the size of the mesh.
 /// @return The corresponding sparsity pattern
 template <typename T, std::floating_point U>
 dolfinx::la::SparsityPattern create_sparsity_pattern(
@@ -36,7 +56,9 @@ dolfinx::la::SparsityPattern create_sparsity_pattern(
         index_maps,
     const std::array<int, 2> index_maps_bs,
     std::array<std::span<const std::int32_t>, 2> dofmaps_list,
-    std::array<std::span<const std::size_t>, 2> dofmaps_bounds)
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells,
+    int num_threads = 1)
 {
   if (a.rank() != 2)
   {
@@ -80,9 +102,13 @@ dolfinx::la::SparsityPattern create_sparsity_pattern(
     case dolfinx::fem::IntegralType::cell:
       for (int id : ids)
       {
-        multiphenicsx::fem::sparsitybuild::cells(
-            pattern, a.domain_arg(integral_type, 0, id, 0), dofmaps_list,
-            dofmaps_bounds);
+        std::vector<std::int32_t> cells
+            = multiphenicsx::fem::sparsitybuild::active_cells(
+                a.domain_arg(integral_type, 0, id, 0), dofmaps_bounds,
+                dofmaps_cells);
+        multiphenicsx::fem::sparsitybuild::cells(pattern, cells, dofmaps_list,
+                                                 dofmaps_bounds, dofmaps_cells,
+                                                 num_threads);
       }
       break;
     case dolfinx::fem::IntegralType::interior_facet:
@@ -94,8 +120,11 @@ dolfinx::la::SparsityPattern create_sparsity_pattern(
         f.reserve(facets.size() / 2);
         for (std::size_t i = 0; i < facets.size(); i += 4)
           f.insert(f.end(), {facets[i], facets[i + 2]});
+        f = multiphenicsx::fem::sparsitybuild::active_interior_facets(
+            f, dofmaps_bounds, dofmaps_cells);
         multiphenicsx::fem::sparsitybuild::interior_facets(
-            pattern, f, dofmaps_list, dofmaps_bounds);
+            pattern, f, dofmaps_list, dofmaps_bounds, dofmaps_cells,
+            num_threads);
       }
       break;
     case dolfinx::fem::IntegralType::exterior_facet:
@@ -107,8 +136,11 @@ dolfinx::la::SparsityPattern create_sparsity_pattern(
         cells.reserve(facets.size() / 2);
         for (std::size_t i = 0; i < facets.size(); i += 2)
           cells.push_back(facets[i]);
+        cells = multiphenicsx::fem::sparsitybuild::active_cells(
+            cells, dofmaps_bounds, dofmaps_cells);
         multiphenicsx::fem::sparsitybuild::cells(pattern, cells, dofmaps_list,
-                                                 dofmaps_bounds);
+                                                 dofmaps_bounds, dofmaps_cells,
+                                                 num_threads);
       }
       break;
     default:
@@ -121,5 +153,690 @@ dolfinx::la::SparsityPattern create_sparsity_pattern(
   return pattern;
 }
 
+/// @brief Count the nonzeros of each row of the matrix associated to a
+/// bilinear form, without building a sparsity pattern.
+///
+/// Rows are visited one at a time: the entities (cells or interior facets) of
+/// the integration domains which contain each row are stored in a compressed
+/// row-to-entity map, and distinct columns are counted with a marker array
+/// over columns. Memory usage is thus proportional to the size of the dofmaps
+/// rather than to the number of nonzeros. The distinct columns of ghost rows
+/// are sent to the owner of each row, which merges them with its own columns,
+/// so that counts are exact also at process interfaces.
+/// @param[in] a A bilinear form
+/// @param[in] index_maps A pair of index maps. Row index map is given by
+/// index_maps[0], column index map is given by index_maps[1].
+/// @param[in] dofmaps_list An array of spans containing the dofmaps list.
+/// @param[in] dofmaps_bounds An array of spans containing the dofmaps cell
+/// bounds.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each dofmap, for dofmaps in compact storage mode. Pass
+/// std::nullopt for dofmaps storing dofs for all cells.
+/// @return Number of nonzero (block) columns in the diagonal and
+/// off-diagonal parts of each owned (block) row.
+template <typename T, std::floating_point U>
+std::array<std::vector<std::int32_t>, 2> count_nonzeros(
+    const dolfinx::fem::Form<T, U>& a,
+    std::array<std::reference_wrapper<const dolfinx::common::IndexMap>, 2>
+        index_maps,
+    std::array<std::span<const std::int32_t>, 2> dofmaps_list,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells)
+{
+  if (a.rank() != 2)
+  {
+    throw std::runtime_error(
+        "Cannot count nonzeros. Form is not a bilinear.");
+  }
+
+  // Get mesh
+  std::shared_ptr mesh = a.mesh();
+  assert(mesh);
+
+  const std::set<dolfinx::fem::IntegralType> integral_types
+      = a.integral_types();
+  if (integral_types.find(dolfinx::fem::IntegralType::interior_facet)
+          != integral_types.end()
+      or integral_types.find(dolfinx::fem::IntegralType::exterior_facet)
+             != integral_types.end())
+  {
+    int tdim = mesh->topology()->dim();
+    mesh->topology_mutable()->create_entities(tdim - 1);
+    mesh->topology_mutable()->create_connectivity(tdim - 1, tdim);
+  }
+
+  dolfinx::common::Timer t0("Count nonzeros");
+
+  // Collect the active entities of all integration domains, as pairs of
+  // cells. The second cell is -1 for cell and exterior facet integrals.
+  std::vector<std::array<std::int32_t, 2>> entities;
+  for (auto integral_type : integral_types)
+  {
+    for (int id : a.integral_ids(integral_type))
+    {
+      std::span<const std::int32_t> domain
+          = a.domain_arg(integral_type, 0, id, 0);
+      switch (integral_type)
+      {
+      case dolfinx::fem::IntegralType::cell:
+        for (auto cell : multiphenicsx::fem::sparsitybuild::active_cells(
+                 domain, dofmaps_bounds, dofmaps_cells))
+          entities.push_back({cell, -1});
+        break;
+      case dolfinx::fem::IntegralType::interior_facet:
+      {
+        std::vector<std::int32_t> f;
+        f.reserve(domain.size() / 2);
+        for (std::size_t i = 0; i < domain.size(); i += 4)
+          f.insert(f.end(), {domain[i], domain[i + 2]});
+        f = multiphenicsx::fem::sparsitybuild::active_interior_facets(
+            f, dofmaps_bounds, dofmaps_cells);
+        for (std::size_t i = 0; i < f.size(); i += 2)
+          entities.push_back({f[i], f[i + 1]});
+        break;
+      }
+      case dolfinx::fem::IntegralType::exterior_facet:
+      {
+        std::vector<std::int32_t> cells;
+        cells.reserve(domain.size() / 2);
+        for (std::size_t i = 0; i < domain.size(); i += 2)
+          cells.push_back(domain[i]);
+        for (auto cell : multiphenicsx::fem::sparsitybuild::active_cells(
+                 cells, dofmaps_bounds, dofmaps_cells))
+          entities.push_back({cell, -1});
+        break;
+      }
+      default:
+        throw std::runtime_error("Unsupported integral type");
+      }
+    }
+  }
+
+  // Apply a function to the dofs of each cell of an entity
+  auto for_each_cell_dofs = [&](std::size_t i,
+                                const std::array<std::int32_t, 2>& entity,
+                                auto&& f)
+  {
+    for (auto cell : entity)
+    {
+      if (cell >= 0)
+      {
+        f(multiphenicsx::fem::sparsitybuild::cell_dofs(
+            dofmaps_list[i], dofmaps_bounds[i], dofmaps_cells[i], cell));
+      }
+    }
+  };
+
+  const dolfinx::common::IndexMap& row_map = index_maps[0].get();
+  const dolfinx::common::IndexMap& col_map = index_maps[1].get();
+  const std::int32_t num_rows = row_map.size_local() + row_map.num_ghosts();
+  const std::int32_t num_cols = col_map.size_local() + col_map.num_ghosts();
+
+  // Build the map from rows to entities, in two passes
+  std::vector<std::size_t> row_offsets(num_rows + 1, 0);
+  for (const auto& entity : entities)
+  {
+    for_each_cell_dofs(0, entity,
+                       [&row_offsets](std::span<const std::int32_t> rows)
+                       {
+                         for (auto row : rows)
+                           row_offsets[row + 1] += 1;
+                       });
+  }
+  std::partial_sum(row_offsets.begin(), row_offsets.end(),
+                   row_offsets.begin());
+  std::vector<std::int32_t> row_entities(row_offsets.back());
+  {
+    std::vector<std::size_t> positions(row_offsets.begin(),
+                                       std::prev(row_offsets.end()));
+    for (std::size_t e = 0; e < entities.size(); ++e)
+    {
+      const std::int32_t entity = static_cast<std::int32_t>(e);
+      for_each_cell_dofs(0, entities[e],
+                         [&](std::span<const std::int32_t> rows)
+                         {
+                           for (auto row : rows)
+                             row_entities[positions[row]++] = entity;
+                         });
+    }
+  }
+
+  // Apply a function to the distinct columns of a row
+  std::vector<std::int32_t> marker(num_cols, -1);
+  auto for_each_col = [&](std::int32_t row, auto&& f)
+  {
+    for (std::size_t k = row_offsets[row]; k < row_offsets[row + 1]; ++k)
+    {
+      for_each_cell_dofs(1, entities[row_entities[k]],
+                         [&](std::span<const std::int32_t> cols)
+                         {
+                           for (auto col : cols)
+                           {
+                             if (marker[col] != row)
+                             {
+                               marker[col] = row;
+                               f(col);
+                             }
+                           }
+                         });
+    }
+  };
+
+  // Create a (symmetric) neighbourhood communicator over the row index map
+  MPI_Comm comm = row_map.comm();
+  std::vector<int> neighbors(row_map.src().begin(), row_map.src().end());
+  neighbors.insert(neighbors.end(), row_map.dest().begin(),
+                   row_map.dest().end());
+  std::ranges::sort(neighbors);
+  auto [unique_end, range_end] = std::ranges::unique(neighbors);
+  neighbors.erase(unique_end, range_end);
+  MPI_Comm neighbor_comm;
+  MPI_Dist_graph_create_adjacent(
+      comm, neighbors.size(), neighbors.data(), MPI_UNWEIGHTED,
+      neighbors.size(), neighbors.data(), MPI_UNWEIGHTED, MPI_INFO_NULL, false,
+      &neighbor_comm);
+
+  // Send the distinct columns of each ghost row to the owner of the row, as
+  // (global row, global column) pairs
+  const std::int32_t size_local = row_map.size_local();
+  std::span<const std::int64_t> row_ghosts = row_map.ghosts();
+  std::span<const int> row_owners = row_map.owners();
+  std::vector<std::int64_t> global_cols(num_cols);
+  {
+    std::vector<std::int32_t> local_cols(num_cols);
+    std::iota(local_cols.begin(), local_cols.end(), 0);
+    col_map.local_to_global(local_cols, global_cols);
+  }
+  std::vector<std::vector<std::int64_t>> ghost_row_cols(neighbors.size());
+  for (std::int32_t row = size_local; row < num_rows; ++row)
+  {
+    auto it = std::ranges::lower_bound(neighbors,
+                                       row_owners[row - size_local]);
+    assert(it != neighbors.end() and *it == row_owners[row - size_local]);
+    auto& ghost_row_cols_n
+        = ghost_row_cols[std::distance(neighbors.begin(), it)];
+    for_each_col(row,
+                 [&](std::int32_t col)
+                 {
+                   ghost_row_cols_n.insert(
+                       ghost_row_cols_n.end(),
+                       {row_ghosts[row - size_local], global_cols[col]});
+                 });
+  }
+  std::vector<std::int64_t> send_buffer;
+  std::vector<int> send_sizes, send_displacements{0};
+  for (auto& ghost_row_cols_n : ghost_row_cols)
+  {
+    send_buffer.insert(send_buffer.end(), ghost_row_cols_n.begin(),
+                       ghost_row_cols_n.end());
+    send_sizes.push_back(ghost_row_cols_n.size());
+    send_displacements.push_back(send_displacements.back()
+                                 + ghost_row_cols_n.size());
+  }
+  std::vector<int> recv_sizes(neighbors.size());
+  // Note: reserve(1) is for MPI implementations that do not like null
+  // pointers when there are no neighbours
+  send_sizes.reserve(1);
+  recv_sizes.reserve(1);
+  MPI_Neighbor_alltoall(send_sizes.data(), 1, MPI_INT, recv_sizes.data(), 1,
+                        MPI_INT, neighbor_comm);
+  std::vector<int> recv_displacements(neighbors.size() + 1, 0);
+  std::partial_sum(recv_sizes.begin(), recv_sizes.end(),
+                   std::next(recv_displacements.begin()));
+  std::vector<std::int64_t> recv_buffer(recv_displacements.back());
+  MPI_Neighbor_alltoallv(send_buffer.data(), send_sizes.data(),
+                         send_displacements.data(), MPI_INT64_T,
+                         recv_buffer.data(), recv_sizes.data(),
+                         recv_displacements.data(), MPI_INT64_T, neighbor_comm);
+  MPI_Comm_free(&neighbor_comm);
+
+  // Store the received columns of each owned row in a compressed map
+  const std::int64_t row_offset = row_map.local_range()[0];
+  std::vector<std::size_t> remote_offsets(size_local + 1, 0);
+  for (std::size_t r = 0; r < recv_buffer.size(); r += 2)
+    remote_offsets[recv_buffer[r] - row_offset + 1] += 1;
+  std::partial_sum(remote_offsets.begin(), remote_offsets.end(),
+                   remote_offsets.begin());
+  std::vector<std::int64_t> remote_cols(remote_offsets.back());
+  {
+    std::vector<std::size_t> positions(remote_offsets.begin(),
+                                       std::prev(remote_offsets.end()));
+    for (std::size_t r = 0; r < recv_buffer.size(); r += 2)
+    {
+      remote_cols[positions[recv_buffer[r] - row_offset]++]
+          = recv_buffer[r + 1];
+    }
+  }
+
+  // Count distinct columns of each owned row: a column belongs to the
+  // diagonal part if it is owned by this process. Rows shared with other
+  // processes merge local and received columns in global numbering.
+  const std::array<std::int64_t, 2> col_range = col_map.local_range();
+  std::vector<std::int32_t> nnz_diag(size_local, 0), nnz_off(size_local, 0);
+  std::vector<std::int64_t> row_cols;
+  for (std::int32_t row = 0; row < size_local; ++row)
+  {
+    if (remote_offsets[row] == remote_offsets[row + 1])
+    {
+      for_each_col(row,
+                   [&](std::int32_t col)
+                   {
+                     if (col < col_map.size_local())
+                       nnz_diag[row] += 1;
+                     else
+                       nnz_off[row] += 1;
+                   });
+    }
+    else
+    {
+      row_cols.assign(std::next(remote_cols.begin(), remote_offsets[row]),
+                      std::next(remote_cols.begin(), remote_offsets[row + 1]));
+      for_each_col(row, [&](std::int32_t col)
+                   { row_cols.push_back(global_cols[col]); });
+      std::ranges::sort(row_cols);
+      auto cols_end = std::ranges::unique(row_cols).begin();
+      for (auto it = row_cols.begin(); it != cols_end; ++it)
+      {
+        if (*it >= col_range[0] and *it < col_range[1])
+          nnz_diag[row] += 1;
+        else
+          nnz_off[row] += 1;
+      }
+    }
+  }
+
+  t0.stop();
+
+  return {std::move(nnz_diag), std::move(nnz_off)};
+}
+
+/// @brief Tabulate the element tensors of a form on the entities of its
+/// integration domains which are active in restricted dofmaps.
+///
+/// A cell (or exterior facet) is active if the cell of each argument has at
+/// least one restricted dof, while an interior facet is active if, for each
+/// argument, at least one of its two cells has a restricted dof. This is the
+/// same criterion used by create_sparsity_pattern, so that kernels are only
+/// run on the entities which contribute to the restricted tensor. Packed
+/// coefficients are indexed by the position of each entity in the
+/// integration domain, so that they do not need to be repacked.
+/// @param[in] a A form of rank R.
+/// @param[in] constants Constants that appear in `a`.
+/// @param[in] coefficients Coefficients that appear in `a`.
+/// @param[in] dofmaps_bounds An array of spans containing the restricted
+/// dofmaps cell bounds, one for each argument.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each restricted dofmap, for dofmaps in compact storage
+/// mode. Pass std::nullopt for dofmaps storing dofs for all cells.
+/// @param[in] insert Function called on each active entity with the
+/// (unrestricted) dofs of each argument and the element tensor, after dof
+/// transformations have been applied. For interior facets, the dofs of the
+/// two cells are concatenated.
+/// @throws std::runtime_error if `a` contains integrals other than cell,
+/// exterior facet or interior facet integrals.
+template <std::size_t R, typename T, std::floating_point U, typename Insert>
+void assemble_active_entities(
+    const dolfinx::fem::Form<T, U>& a, std::span<const T> constants,
+    const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                   std::pair<std::span<const T>, int>>& coefficients,
+    std::array<std::span<const std::size_t>, R> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, R> dofmaps_cells,
+    Insert&& insert)
+{
+  static_assert(R == 1 or R == 2);
+  assert(a.rank() == R);
+
+  // Only cell, exterior facet and interior facet integrals are supported: any
+  // other integral must not be silently skipped
+  for (auto integral_type : a.integral_types())
+  {
+    switch (integral_type)
+    {
+    case dolfinx::fem::IntegralType::cell:
+    case dolfinx::fem::IntegralType::exterior_facet:
+    case dolfinx::fem::IntegralType::interior_facet:
+      break;
+    default:
+      throw std::runtime_error("Unsupported integral type");
+    }
+  }
+
+  // Get mesh and geometry data
+  std::shared_ptr mesh = a.mesh();
+  assert(mesh);
+  const int tdim = mesh->topology()->dim();
+  auto x_dofmap = mesh->geometry().dofmap();
+  const std::size_t num_dofs_g = x_dofmap.extent(1);
+  std::span<const U> x = mesh->geometry().x();
+  std::vector<U> coordinate_dofs(2 * 3 * num_dofs_g);
+  auto copy_coordinate_dofs = [&](std::int32_t cell, std::size_t offset)
+  {
+    for (std::size_t i = 0; i < num_dofs_g; ++i)
+    {
+      std::copy_n(std::next(x.begin(), 3 * x_dofmap(cell, i)), 3,
+                  std::next(coordinate_dofs.begin(), offset + 3 * i));
+    }
+  };
+
+  // Get facet permutations
+  std::span<const std::uint8_t> perms;
+  if (a.needs_facet_permutations())
+  {
+    mesh->topology_mutable()->create_entity_permutations();
+    perms = std::span(mesh->topology()->get_facet_permutations());
+  }
+  const int num_facets_per_cell = dolfinx::mesh::cell_num_entities(
+      mesh->topology()->cell_type(), tdim - 1);
+  auto perm = [&](std::int32_t cell, int local_facet) -> std::uint8_t
+  {
+    return perms.empty() ? 0 : perms[cell * num_facets_per_cell + local_facet];
+  };
+
+  // Get dofmaps, block sizes and dof transformations of the arguments. Row
+  // transformations are applied from the left, column transformations from
+  // the right.
+  using DofTransformation = std::function<void(
+      std::span<T>, std::span<const std::uint32_t>, std::int32_t, int)>;
+  std::array<std::shared_ptr<const dolfinx::fem::DofMap>, R> dofmaps;
+  std::array<DofTransformation, R> transformations;
+  std::array<std::span<const std::uint32_t>, R> cell_info;
+  for (std::size_t d = 0; d < R; ++d)
+  {
+    std::shared_ptr V = a.function_spaces()[d];
+    dofmaps[d] = V->dofmap();
+    std::shared_ptr element = V->element();
+    if (element->needs_dof_transformations())
+    {
+      V->mesh()->topology_mutable()->create_entity_permutations();
+      cell_info[d]
+          = std::span(V->mesh()->topology()->get_cell_permutation_info());
+      if (d == 0)
+      {
+        transformations[d] = element->template dof_transformation_fn<T>(
+            dolfinx::fem::doftransform::standard);
+      }
+      else
+      {
+        transformations[d] = element->template dof_transformation_right_fn<T>(
+            dolfinx::fem::doftransform::transpose);
+      }
+    }
+  }
+  auto cell_dofs = [&](std::size_t d, std::int32_t cell)
+  {
+    auto map = dofmaps[d]->map();
+    return std::span<const std::int32_t>(
+        map.data_handle() + cell * map.extent(1), map.extent(1));
+  };
+  auto has_dofs = [&](std::size_t d, std::int32_t cell)
+  {
+    return cell >= 0
+           and multiphenicsx::fem::sparsitybuild::has_dofs(
+               dofmaps_bounds[d], dofmaps_cells[d], cell);
+  };
+
+  // Tabulate and insert the element tensor of an entity, given the argument
+  // cells (one or two for each argument), the position of the entity in the
+  // integration domain, local facet indices and permutations
+  std::array<std::vector<std::int32_t>, R> macro_dofs;
+  std::vector<T> Ae;
+  auto assemble_entity
+      = [&](const auto& kernel, std::span<const T> coeffs, int cstride,
+            std::array<std::span<const std::int32_t>, R> cells,
+            std::size_t index, const int* local_facets,
+            const std::uint8_t* perms_)
+  {
+    std::array<std::span<const std::int32_t>, R> dofs;
+    std::array<std::size_t, R> dims;
+    for (std::size_t d = 0; d < R; ++d)
+    {
+      if (cells[d].size() == 1)
+        dofs[d] = cell_dofs(d, cells[d][0]);
+      else
+      {
+        macro_dofs[d].clear();
+        for (auto cell : cells[d])
+        {
+          auto dofs_ = cell_dofs(d, cell);
+          macro_dofs[d].insert(macro_dofs[d].end(), dofs_.begin(),
+                               dofs_.end());
+        }
+        dofs[d] = macro_dofs[d];
+      }
+      dims[d] = dofmaps[d]->bs() * dofs[d].size();
+    }
+    const std::size_t num_rows = dims[0];
+    const std::size_t num_cols = R == 2 ? dims[R - 1] : 1;
+    Ae.resize(num_rows * num_cols);
+    std::ranges::fill(Ae, T(0));
+    kernel(Ae.data(), coeffs.data() + index * cstride, constants.data(),
+           coordinate_dofs.data(), local_facets, perms_, nullptr);
+
+    // Apply dof transformations to each cell block of the element tensor
+    std::span<T> _Ae(Ae);
+    for (std::size_t d = 0; d < R; ++d)
+    {
+      if (!transformations[d])
+        continue;
+      const std::size_t cell_dim = dims[d] / cells[d].size();
+      for (std::size_t k = 0; k < cells[d].size(); ++k)
+      {
+        if (d == 0)
+        {
+          transformations[d](_Ae.subspan(k * cell_dim * num_cols,
+                                         cell_dim * num_cols),
+                             cell_info[d], cells[d][k], num_cols);
+        }
+        else
+        {
+          for (std::size_t row = 0; row < num_rows; ++row)
+          {
+            transformations[d](
+                _Ae.subspan(row * num_cols + k * cell_dim, cell_dim),
+                cell_info[d], cells[d][k], 1);
+          }
+        }
+      }
+    }
+    insert(dofs, _Ae);
+  };
+
+  for (int id : a.integral_ids(dolfinx::fem::IntegralType::cell))
+  {
+    const auto& kernel = a.kernel(dolfinx::fem::IntegralType::cell, id, 0);
+    assert(kernel);
+    auto& [coeffs, cstride]
+        = coefficients.at({dolfinx::fem::IntegralType::cell, id});
+    std::span<const std::int32_t> cells
+        = a.domain(dolfinx::fem::IntegralType::cell, id, 0);
+    std::array<std::span<const std::int32_t>, R> cells_arg;
+    for (std::size_t d = 0; d < R; ++d)
+      cells_arg[d] = a.domain_arg(dolfinx::fem::IntegralType::cell, d, id, 0);
+    for (std::size_t index = 0; index < cells.size(); ++index)
+    {
+      std::array<std::span<const std::int32_t>, R> entity_cells;
+      bool active = true;
+      for (std::size_t d = 0; d < R; ++d)
+      {
+        entity_cells[d] = cells_arg[d].subspan(index, 1);
+        active = active and has_dofs(d, cells_arg[d][index]);
+      }
+      if (!active)
+        continue;
+      copy_coordinate_dofs(cells[index], 0);
+      assemble_entity(kernel, coeffs, cstride, entity_cells, index, nullptr,
+                      nullptr);
+    }
+  }
+
+  for (int id : a.integral_ids(dolfinx::fem::IntegralType::exterior_facet))
+  {
+    const auto& kernel
+        = a.kernel(dolfinx::fem::IntegralType::exterior_facet, id, 0);
+    assert(kernel);
+    auto& [coeffs, cstride]
+        = coefficients.at({dolfinx::fem::IntegralType::exterior_facet, id});
+    std::span<const std::int32_t> facets
+        = a.domain(dolfinx::fem::IntegralType::exterior_facet, id, 0);
+    std::array<std::span<const std::int32_t>, R> facets_arg;
+    for (std::size_t d = 0; d < R; ++d)
+    {
+      facets_arg[d]
+          = a.domain_arg(dolfinx::fem::IntegralType::exterior_facet, d, id, 0);
+    }
+    for (std::size_t i = 0; i < facets.size(); i += 2)
+    {
+      std::array<std::span<const std::int32_t>, R> entity_cells;
+      bool active = true;
+      for (std::size_t d = 0; d < R; ++d)
+      {
+        entity_cells[d] = facets_arg[d].subspan(i, 1);
+        active = active and has_dofs(d, facets_arg[d][i]);
+      }
+      if (!active)
+        continue;
+      copy_coordinate_dofs(facets[i], 0);
+      const std::uint8_t perm_ = perm(facets[i], facets[i + 1]);
+      assemble_entity(kernel, coeffs, cstride, entity_cells, i / 2,
+                      &facets[i + 1], &perm_);
+    }
+  }
+
+  for (int id : a.integral_ids(dolfinx::fem::IntegralType::interior_facet))
+  {
+    const auto& kernel
+        = a.kernel(dolfinx::fem::IntegralType::interior_facet, id, 0);
+    assert(kernel);
+    auto& [coeffs, cstride]
+        = coefficients.at({dolfinx::fem::IntegralType::interior_facet, id});
+    std::span<const std::int32_t> facets
+        = a.domain(dolfinx::fem::IntegralType::interior_facet, id, 0);
+    std::array<std::span<const std::int32_t>, R> facets_arg;
+    for (std::size_t d = 0; d < R; ++d)
+    {
+      facets_arg[d]
+          = a.domain_arg(dolfinx::fem::IntegralType::interior_facet, d, id, 0);
+    }
+    std::array<std::array<std::int32_t, 2>, R> entity_cells_data;
+    for (std::size_t i = 0; i < facets.size(); i += 4)
+    {
+      std::array<std::span<const std::int32_t>, R> entity_cells;
+      bool active = true;
+      for (std::size_t d = 0; d < R; ++d)
+      {
+        const std::int32_t cell_0 = facets_arg[d][i];
+        const std::int32_t cell_1 = facets_arg[d][i + 2];
+        entity_cells_data[d] = {cell_0, cell_1};
+        entity_cells[d] = entity_cells_data[d];
+        active = active and cell_0 >= 0 and cell_1 >= 0
+                 and (has_dofs(d, cell_0) or has_dofs(d, cell_1));
+      }
+      if (!active)
+        continue;
+      copy_coordinate_dofs(facets[i], 0);
+      copy_coordinate_dofs(facets[i + 2], 3 * num_dofs_g);
+      const std::array<int, 2> local_facets = {facets[i + 1], facets[i + 3]};
+      const std::array<std::uint8_t, 2> perms_
+          = {perm(facets[i], facets[i + 1]),
+             perm(facets[i + 2], facets[i + 3])};
+      assemble_entity(kernel, coeffs, cstride, entity_cells, i / 4,
+                      local_facets.data(), perms_.data());
+    }
+  }
+}
+
+/// @brief Assemble a linear form into an unrestricted vector, only running
+/// kernels on the entities which are active in a restricted dofmap.
+///
+/// Entries of `b` associated to inactive dofs are unchanged, but they may
+/// differ from the ones computed by dolfinx::fem::assemble_vector, since
+/// entities without any active dof are skipped.
+/// @param[in,out] b The vector to assemble the form into, in the unrestricted
+/// (unrolled, local) numbering of the dofmap of `L`.
+/// @param[in] L The linear form.
+/// @param[in] constants Constants that appear in `L`.
+/// @param[in] coefficients Coefficients that appear in `L`.
+/// @param[in] dofmap_bounds The restricted dofmap cell bounds.
+/// @param[in] dofmap_cells The sorted list of cells stored in the restricted
+/// dofmap, for dofmaps in compact storage mode. Pass std::nullopt for
+/// dofmaps storing dofs for all cells.
+template <typename T, std::floating_point U>
+void assemble_vector_restricted(
+    std::span<T> b, const dolfinx::fem::Form<T, U>& L,
+    std::span<const T> constants,
+    const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                   std::pair<std::span<const T>, int>>& coefficients,
+    std::span<const std::size_t> dofmap_bounds,
+    std::optional<std::span<const std::int32_t>> dofmap_cells)
+{
+  const int bs = L.function_spaces()[0]->dofmap()->bs();
+  assemble_active_entities<1>(
+      L, constants, coefficients,
+      std::array<std::span<const std::size_t>, 1>{dofmap_bounds},
+      std::array<std::optional<std::span<const std::int32_t>>, 1>{
+          dofmap_cells},
+      [&](std::array<std::span<const std::int32_t>, 1> dofs,
+          std::span<const T> be)
+      {
+        for (std::size_t i = 0; i < dofs[0].size(); ++i)
+          for (int k = 0; k < bs; ++k)
+            b[bs * dofs[0][i] + k] += be[bs * i + k];
+      });
+}
+
+/// @brief Assemble the diagonal of a bilinear form into an unrestricted
+/// vector, only running kernels on the entities which are active in
+/// restricted dofmaps.
+///
+/// The diagonal entries of each element matrix are added to `d`, without
+/// ever storing the matrix. The two arguments of `a` must share the same
+/// dofmap.
+/// @param[in,out] d The vector to assemble the diagonal into, in the
+/// unrestricted (unrolled, local) numbering of the dofmap of `a`.
+/// @param[in] a The bilinear form.
+/// @param[in] constants Constants that appear in `a`.
+/// @param[in] coefficients Coefficients that appear in `a`.
+/// @param[in] dofmaps_bounds An array of spans containing the restricted
+/// dofmaps cell bounds, one for each argument.
+/// @param[in] dofmaps_cells An array of spans containing the sorted list of
+/// cells stored in each restricted dofmap, for dofmaps in compact storage
+/// mode. Pass std::nullopt for dofmaps storing dofs for all cells.
+template <typename T, std::floating_point U>
+void assemble_diagonal_restricted(
+    std::span<T> d, const dolfinx::fem::Form<T, U>& a,
+    std::span<const T> constants,
+    const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                   std::pair<std::span<const T>, int>>& coefficients,
+    std::array<std::span<const std::size_t>, 2> dofmaps_bounds,
+    std::array<std::optional<std::span<const std::int32_t>>, 2> dofmaps_cells)
+{
+  std::shared_ptr dofmap = a.function_spaces()[0]->dofmap();
+  if (a.function_spaces()[1]->dofmap() != dofmap)
+    throw std::runtime_error("Bilinear form arguments have different dofmaps");
+  const int bs = dofmap->bs();
+  assemble_active_entities<2>(
+      a, constants, coefficients, dofmaps_bounds, dofmaps_cells,
+      [&](std::array<std::span<const std::int32_t>, 2> dofs,
+          std::span<const T> Ae)
+      {
+        // Rows and columns of interior facet tensors may repeat the dofs
+        // shared by the two cells, hence all matching pairs are visited
+        const std::size_t num_cols = bs * dofs[1].size();
+        for (std::size_t i = 0; i < dofs[0].size(); ++i)
+        {
+          for (std::size_t j = 0; j < dofs[1].size(); ++j)
+          {
+            if (dofs[0][i] != dofs[1][j])
+              continue;
+            for (int k = 0; k < bs; ++k)
+            {
+              d[bs * dofs[0][i] + k]
+                  += Ae[(bs * i + k) * num_cols + bs * j + k];
+            }
+          }
+        }
+      });
+}
+
 } // namespace fem
 } // namespace multiphenicsx
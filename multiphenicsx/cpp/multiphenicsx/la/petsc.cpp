@@ -4,14 +4,22 @@
 //
 // SPDX-License-Identifier: LGPL-3.0-or-later
 
+#include <algorithm>
 #include <cassert>
+#include <cstdint>
 #include <dolfinx/la/petsc.h> // for dolfinx::la::petsc::error
+#include <memory>
 #include <multiphenicsx/la/petsc.h>
+#include <numeric>
+#include <ranges>
+#include <stdexcept>
+#include <string>
 #include <vector>
 
 using namespace dolfinx;
 using multiphenicsx::la::petsc::MatSubMatrixWrapper;
 using multiphenicsx::la::petsc::VecSubVectorReadWrapper;
+using multiphenicsx::la::petsc::VecSubVectorTransferPlan;
 using multiphenicsx::la::petsc::VecSubVectorWrapper;
 
 //-----------------------------------------------------------------------------
@@ -135,12 +143,156 @@ MatSubMatrixWrapper::MatSubMatrixWrapper(Mat A, std::array<IS, 2> index_sets)
     dolfinx::la::petsc::error(ierr, __FILE__, "MatGetLocalSubMatrix");
 }
 //-----------------------------------------------------------------------------
+namespace
+{
+/// Get the local-to-global map of a restricted local submatrix of A along
+/// direction i. "Local" is intended with respect to the unrestricted index
+/// set, while "global" is intended with respect to the restricted index set
+/// for entries in the restriction, and is set to -1 (i.e., values
+/// corresponding to those indices will be discarded) for entries not in the
+/// restriction.
+///
+/// The map only depends on A, on the restriction and on the position of the
+/// (contiguous) restricted index set, so it is computed once and then cached
+/// on A with PetscObjectCompose. Maps are stored in one slot for each position
+/// of the restricted index set in A, so that their number is bounded by the
+/// number of blocks of A: the name of each map records the identifier of the
+/// restriction it was computed for, and a map computed for another
+/// restriction replaces the stored one. The returned map is owned by A.
+ISLocalToGlobalMapping restricted_local_to_global_mapping(
+    Mat A, std::size_t i, ISLocalToGlobalMapping local_to_global_matrix,
+    IS unrestricted_index_set, IS restricted_index_set,
+    std::span<const std::int32_t> unrestricted_to_restricted,
+    std::uint64_t unrestricted_to_restricted_id,
+    PetscInt unrestricted_to_restricted_correction, PetscInt bs)
+{
+  PetscErrorCode ierr;
+
+  PetscInt unrestricted_is_size;
+  ierr = ISBlockGetLocalSize(unrestricted_index_set, &unrestricted_is_size);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISBlockGetLocalSize");
+  PetscInt restricted_is_size;
+  ierr = ISBlockGetLocalSize(restricted_index_set, &restricted_is_size);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISBlockGetLocalSize");
+  const PetscInt* restricted_indices;
+  ierr = ISBlockGetIndices(restricted_index_set, &restricted_indices);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISBlockGetIndices");
+  const PetscInt restricted_offset
+      = restricted_is_size > 0 ? restricted_indices[0] : 0;
+  if (!std::ranges::equal(
+          std::span(restricted_indices, restricted_is_size),
+          std::views::iota(restricted_offset,
+                           restricted_offset + restricted_is_size)))
+  {
+    ISBlockRestoreIndices(restricted_index_set, &restricted_indices);
+    throw std::runtime_error("Restricted index set is not contiguous");
+  }
+
+  // Look for a cached map in the slot of the restricted index set, and check
+  // that it was computed for the same restriction
+  const std::string slot = "multiphenicsx_restricted_l2g_" + std::to_string(i)
+                           + "_" + std::to_string(restricted_offset) + "_"
+                           + std::to_string(restricted_is_size);
+  const std::string name
+      = std::to_string(unrestricted_to_restricted_id) + "_"
+        + std::to_string(unrestricted_to_restricted.size()) + "_"
+        + std::to_string(unrestricted_is_size) + "_"
+        + std::to_string(unrestricted_to_restricted_correction) + "_"
+        + std::to_string(bs);
+  PetscObject cached_local_to_global = nullptr;
+  ierr = PetscObjectQuery((PetscObject)A, slot.c_str(),
+                          &cached_local_to_global);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectQuery");
+  if (cached_local_to_global)
+  {
+    const char* cached_name;
+    ierr = PetscObjectGetName(cached_local_to_global, &cached_name);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectGetName");
+    if (name == cached_name)
+    {
+      ierr = ISBlockRestoreIndices(restricted_index_set, &restricted_indices);
+      if (ierr != 0)
+        dolfinx::la::petsc::error(ierr, __FILE__, "ISBlockRestoreIndices");
+      return (ISLocalToGlobalMapping)cached_local_to_global;
+    }
+  }
+
+  // Compute the restricted local indices of all active entries, and convert
+  // them to global indices with a single call
+  std::vector<PetscInt> local_to_global(unrestricted_is_size, -1);
+  std::vector<PetscInt> active_entries;
+  std::vector<PetscInt> restricted_local_indices;
+  for (PetscInt unrestricted_index = 0;
+       unrestricted_index < unrestricted_is_size; unrestricted_index++)
+  {
+    const std::int32_t restricted_index = unrestricted_to_restricted
+        [unrestricted_index / unrestricted_to_restricted_correction];
+    if (restricted_index >= 0)
+    {
+      active_entries.push_back(unrestricted_index);
+      restricted_local_indices.push_back(
+          restricted_indices[unrestricted_to_restricted_correction
+                                 * restricted_index
+                             + unrestricted_index
+                                   % unrestricted_to_restricted_correction]);
+    }
+  }
+  std::vector<PetscInt> restricted_global_indices(
+      restricted_local_indices.size());
+  ierr = ISLocalToGlobalMappingApplyBlock(
+      local_to_global_matrix, restricted_local_indices.size(),
+      restricted_local_indices.data(), restricted_global_indices.data());
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__,
+                              "ISLocalToGlobalMappingApplyBlock");
+  for (std::size_t k = 0; k < active_entries.size(); ++k)
+    local_to_global[active_entries[k]] = restricted_global_indices[k];
+
+  ierr = ISBlockRestoreIndices(restricted_index_set, &restricted_indices);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISBlockRestoreIndices");
+
+  // Create the map, and cache it on A
+  MPI_Comm comm = MPI_COMM_NULL;
+  ierr = PetscObjectGetComm((PetscObject)A, &comm);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectGetComm");
+  ISLocalToGlobalMapping petsc_local_to_global;
+  ierr = ISLocalToGlobalMappingCreate(comm, bs, local_to_global.size(),
+                                      local_to_global.data(), PETSC_COPY_VALUES,
+                                      &petsc_local_to_global);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISLocalToGlobalMappingCreate");
+  ierr = PetscObjectSetName((PetscObject)petsc_local_to_global, name.c_str());
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectSetName");
+  // Composing with the name of the slot releases any map previously stored
+  ierr = PetscObjectCompose((PetscObject)A, slot.c_str(),
+                            (PetscObject)petsc_local_to_global);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectCompose");
+  ierr = ISLocalToGlobalMappingDestroy(&petsc_local_to_global);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISLocalToGlobalMappingDestroy");
+  ierr = PetscObjectQuery((PetscObject)A, slot.c_str(),
+                          &cached_local_to_global);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectQuery");
+  return (ISLocalToGlobalMapping)cached_local_to_global;
+}
+} // namespace
+//-----------------------------------------------------------------------------
 MatSubMatrixWrapper::MatSubMatrixWrapper(
     Mat A, std::array<IS, 2> unrestricted_index_sets,
     std::array<IS, 2> restricted_index_sets,
-    std::array<std::unordered_map<std::int32_t, std::int32_t>, 2>
-        unrestricted_to_restricted,
-    std::array<int, 2> unrestricted_to_restricted_bs)
+    std::array<std::span<const std::int32_t>, 2> unrestricted_to_restricted,
+    std::array<int, 2> unrestricted_to_restricted_bs,
+    std::array<std::uint64_t, 2> unrestricted_to_restricted_ids)
     : MatSubMatrixWrapper(A, restricted_index_sets)
 {
   PetscErrorCode ierr;
@@ -148,11 +300,8 @@ MatSubMatrixWrapper::MatSubMatrixWrapper(
   // Initialization of custom local to global PETSc map.
   // In order not to change the assembly routines, here "local" is intended
   // with respect to the *unrestricted* index sets (which where generated using
-  // the index map that will be passed to the assembly routines). Instead,
-  // "global" is intended with respect to the *restricted* index sets for
-  // entries in the restriction, while it is set to -1 (i.e., values
-  // corresponding to those indices will be discarded) for entries not in the
-  // restriction.
+  // the index map that will be passed to the assembly routines), see
+  // restricted_local_to_global_mapping.
 
   // Get sub matrix (i.e., index sets) block sizes
   std::vector<PetscInt> bs(2);
@@ -164,7 +313,8 @@ MatSubMatrixWrapper::MatSubMatrixWrapper(
   // they should either be the same (typically the case of restricted matrices
   // or restricted nest matrices) or unrestricted_to_restricted_bs may be larger
   // than the sub matrix block sizes (typically the case of restricted block
-  // matrices, because bs is forced to one).
+  // matrices whose blocks do not share the same block size, because bs is
+  // then set to one).
   assert(bs[0] == unrestricted_to_restricted_bs[0]
          || (bs[0] == 1 && unrestricted_to_restricted_bs[0] > 1));
   assert(bs[1] == unrestricted_to_restricted_bs[1]
@@ -191,88 +341,26 @@ MatSubMatrixWrapper::MatSubMatrixWrapper(
   if (ierr != 0)
     dolfinx::la::petsc::error(ierr, __FILE__, "MatGetLocalToGlobalMapping");
 
-  // Allocate data for submatrix local-to-global maps in an STL vector
-  std::array<std::vector<PetscInt>, 2> stl_local_to_global_submatrix;
-  for (std::size_t i = 0; i < 2; ++i)
-  {
-    PetscInt unrestricted_is_size;
-    ierr = ISBlockGetLocalSize(unrestricted_index_sets[i],
-                               &unrestricted_is_size);
-    if (ierr != 0)
-      dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
-    stl_local_to_global_submatrix[i].resize(unrestricted_is_size);
-
-    const PetscInt* restricted_indices;
-    ierr = ISBlockGetIndices(restricted_index_sets[i], &restricted_indices);
-    if (ierr != 0)
-      dolfinx::la::petsc::error(ierr, __FILE__, "ISGetIndices");
-
-    std::vector<PetscInt> restricted_local_index(1);
-    std::vector<PetscInt> restricted_global_index(1);
-
-    for (PetscInt unrestricted_index = 0;
-         unrestricted_index < unrestricted_is_size; unrestricted_index++)
-    {
-      if (unrestricted_to_restricted[i].count(
-              unrestricted_index / unrestricted_to_restricted_correction[i])
-          > 0)
-      {
-        restricted_local_index[0] = restricted_indices
-            [unrestricted_to_restricted_correction[i]
-                 * unrestricted_to_restricted[i].at(
-                     unrestricted_index
-                     / unrestricted_to_restricted_correction[i])
-             + unrestricted_index % unrestricted_to_restricted_correction[i]];
-        ISLocalToGlobalMappingApplyBlock(
-            petsc_local_to_global_matrix[i], restricted_local_index.size(),
-            restricted_local_index.data(), restricted_global_index.data());
-        stl_local_to_global_submatrix[i][unrestricted_index]
-            = restricted_global_index[0];
-      }
-      else
-      {
-        stl_local_to_global_submatrix[i][unrestricted_index] = -1;
-      }
-    }
-
-    ierr = ISBlockRestoreIndices(restricted_index_sets[i], &restricted_indices);
-    if (ierr != 0)
-      dolfinx::la::petsc::error(ierr, __FILE__, "ISRestoreIndices");
-  }
-
-  // Get communicator from submatrix object
-  MPI_Comm comm = MPI_COMM_NULL;
-  ierr = PetscObjectGetComm((PetscObject)_sub_matrix, &comm);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "PetscObjectGetComm");
-
-  // Create submatrix local-to-global maps as index set
+  // Get submatrix local-to-global maps, which are computed on the first
+  // wrapper of the pair (A, restriction) and then cached on A
   std::array<ISLocalToGlobalMapping, 2> petsc_local_to_global_submatrix;
   for (std::size_t i = 0; i < 2; ++i)
   {
-    ierr = ISLocalToGlobalMappingCreate(
-        comm, bs[i], stl_local_to_global_submatrix[i].size(),
-        stl_local_to_global_submatrix[i].data(), PETSC_COPY_VALUES,
-        &petsc_local_to_global_submatrix[i]);
-    if (ierr != 0)
-      dolfinx::la::petsc::error(ierr, __FILE__, "ISLocalToGlobalMappingCreate");
+    petsc_local_to_global_submatrix[i]
+        = restricted_local_to_global_mapping(
+            A, i, petsc_local_to_global_matrix[i], unrestricted_index_sets[i],
+            restricted_index_sets[i], unrestricted_to_restricted[i],
+            unrestricted_to_restricted_ids[i],
+            unrestricted_to_restricted_correction[i], bs[i]);
   }
 
-  // Set submatrix local-to-global maps
+  // Set submatrix local-to-global maps. There is no need to destroy them,
+  // since they are owned by A.
   ierr = MatSetLocalToGlobalMapping(_sub_matrix,
                                     petsc_local_to_global_submatrix[0],
                                     petsc_local_to_global_submatrix[1]);
   if (ierr != 0)
     dolfinx::la::petsc::error(ierr, __FILE__, "MatSetLocalToGlobalMapping");
-
-  // Clean up submatrix local-to-global maps
-  for (std::size_t i = 0; i < 2; ++i)
-  {
-    ierr = ISLocalToGlobalMappingDestroy(&petsc_local_to_global_submatrix[i]);
-    if (ierr != 0)
-      dolfinx::la::petsc::error(ierr, __FILE__,
-                                "ISLocalToGlobalMappingDestroy");
-  }
 }
 //-----------------------------------------------------------------------------
 MatSubMatrixWrapper::~MatSubMatrixWrapper()
@@ -299,25 +387,101 @@ void MatSubMatrixWrapper::restore()
 //-----------------------------------------------------------------------------
 Mat MatSubMatrixWrapper::mat() const { return _sub_matrix; }
 //-----------------------------------------------------------------------------
-VecSubVectorReadWrapper::VecSubVectorReadWrapper(Vec x, IS index_set,
-                                                 bool ghosted)
-    : _ghosted(ghosted)
+VecSubVectorTransferPlan::VecSubVectorTransferPlan(IS index_set)
 {
   PetscErrorCode ierr;
 
-  // Get number of entries to extract from x
+  // Get number of entries stored in the content of the wrappers
   PetscInt is_size;
   ierr = ISGetLocalSize(index_set, &is_size);
   if (ierr != 0)
     dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
+  _size = is_size;
 
-  // Get indices of entries to extract from x
+  // Get indices of entries in the local form of the Vec object
   const PetscInt* indices;
   ierr = ISGetIndices(index_set, &indices);
   if (ierr != 0)
     dolfinx::la::petsc::error(ierr, __FILE__, "ISGetIndices");
+  _vector_indices.assign(indices, indices + is_size);
+  ierr = ISRestoreIndices(index_set, &indices);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISRestoreIndices");
+
+  // All entries are transferred
+  _content_indices.resize(is_size);
+  std::iota(_content_indices.begin(), _content_indices.end(), 0);
+}
+//-----------------------------------------------------------------------------
+VecSubVectorTransferPlan::VecSubVectorTransferPlan(
+    IS unrestricted_index_set, IS restricted_index_set,
+    std::span<const std::int32_t> unrestricted_to_restricted,
+    int unrestricted_to_restricted_bs)
+{
+  PetscErrorCode ierr;
+
+  // Get number of entries stored in the content of the wrappers
+  PetscInt unrestricted_is_size;
+  ierr = ISGetLocalSize(unrestricted_index_set, &unrestricted_is_size);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
+  _size = unrestricted_is_size;
+
+  // Get indices of entries in the local form of the Vec object
+  PetscInt restricted_is_size;
+  ierr = ISGetLocalSize(restricted_index_set, &restricted_is_size);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
+  const PetscInt* restricted_indices;
+  ierr = ISGetIndices(restricted_index_set, &restricted_indices);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetIndices");
+
+  // Store the active entries. Entries whose restricted counterpart is not
+  // part of the restricted index set (e.g., ghosts, when the restricted
+  // index set is not ghosted) are skipped.
+  _vector_indices.reserve(restricted_is_size);
+  _content_indices.reserve(restricted_is_size);
+  for (PetscInt unrestricted_index = 0;
+       unrestricted_index < unrestricted_is_size; unrestricted_index++)
+  {
+    const std::int32_t restricted_index
+        = unrestricted_to_restricted[unrestricted_index
+                                     / unrestricted_to_restricted_bs];
+    if (restricted_index >= 0)
+    {
+      const PetscInt restricted_position
+          = unrestricted_to_restricted_bs * restricted_index
+            + unrestricted_index % unrestricted_to_restricted_bs;
+      if (restricted_position < restricted_is_size)
+      {
+        _vector_indices.push_back(restricted_indices[restricted_position]);
+        _content_indices.push_back(unrestricted_index);
+      }
+    }
+  }
+
+  // Restore indices
+  ierr = ISRestoreIndices(restricted_index_set, &restricted_indices);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISRestoreIndices");
+}
+//-----------------------------------------------------------------------------
+VecSubVectorReadWrapper::VecSubVectorReadWrapper(Vec x, IS index_set,
+                                                 bool ghosted)
+    : VecSubVectorReadWrapper(x, index_set, ghosted, false)
+{
+  // Nothing else to be done
+}
+//-----------------------------------------------------------------------------
+VecSubVectorReadWrapper::VecSubVectorReadWrapper(Vec x, IS index_set,
+                                                 bool ghosted, bool writable)
+    : _ghosted(ghosted), _writable(writable), _view_vector(nullptr),
+      _view_local_form(nullptr), _view_array(nullptr)
+{
+  PetscErrorCode ierr;
 
-  // Fetch vector content from x
+  // Get local form of x
   Vec x_local_form;
   if (_ghosted)
   {
@@ -329,10 +493,45 @@ VecSubVectorReadWrapper::VecSubVectorReadWrapper(Vec x, IS index_set,
   {
     x_local_form = x;
   }
-  _content.resize(is_size, 0.);
-  ierr = VecGetValues(x_local_form, is_size, indices, _content.data());
+
+  // If the entries to extract are contiguous in the local form, provide a
+  // view rather than a copy
+  PetscInt local_form_size;
+  ierr = VecGetLocalSize(x_local_form, &local_form_size);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "VecGetLocalSize");
+  PetscInt start;
+  PetscBool contiguous;
+  ierr = ISContiguousLocal(index_set, 0, local_form_size, &start, &contiguous);
   if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "VecGetValues");
+    dolfinx::la::petsc::error(ierr, __FILE__, "ISContiguousLocal");
+  if (contiguous)
+  {
+    PetscInt is_size;
+    ierr = ISGetLocalSize(index_set, &is_size);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
+    PetscScalar* array;
+    if (_writable)
+    {
+      ierr = VecGetArray(x_local_form, &array);
+      if (ierr != 0)
+        dolfinx::la::petsc::error(ierr, __FILE__, "VecGetArray");
+    }
+    else
+    {
+      const PetscScalar* array_read;
+      ierr = VecGetArrayRead(x_local_form, &array_read);
+      if (ierr != 0)
+        dolfinx::la::petsc::error(ierr, __FILE__, "VecGetArrayRead");
+      array = const_cast<PetscScalar*>(array_read);
+    }
+    _view_vector = x;
+    _view_local_form = x_local_form;
+    _view_array = array;
+    _view = std::span<PetscScalar>(array + start, is_size);
+    return;
+  }
   if (_ghosted)
   {
     ierr = VecGhostRestoreLocalForm(x, &x_local_form);
@@ -340,34 +539,53 @@ VecSubVectorReadWrapper::VecSubVectorReadWrapper(Vec x, IS index_set,
       dolfinx::la::petsc::error(ierr, __FILE__, "VecGhostRestoreLocalForm");
   }
 
-  // Restore indices
-  ierr = ISRestoreIndices(index_set, &indices);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISRestoreIndices");
+  // Otherwise, fetch a copy of the vector content from x
+  _transfer_plan = std::make_shared<const VecSubVectorTransferPlan>(index_set);
+  gather(x);
 }
 //-----------------------------------------------------------------------------
 VecSubVectorReadWrapper::VecSubVectorReadWrapper(
     Vec x, IS unrestricted_index_set, IS restricted_index_set,
-    const std::unordered_map<std::int32_t, std::int32_t>&
-        unrestricted_to_restricted,
+    std::span<const std::int32_t> unrestricted_to_restricted,
     int unrestricted_to_restricted_bs, bool ghosted)
-    : _ghosted(ghosted)
+    : VecSubVectorReadWrapper(
+          x,
+          std::make_shared<const VecSubVectorTransferPlan>(
+              unrestricted_index_set, restricted_index_set,
+              unrestricted_to_restricted, unrestricted_to_restricted_bs),
+          ghosted)
+{
+  // Nothing else to be done
+}
+//-----------------------------------------------------------------------------
+VecSubVectorReadWrapper::VecSubVectorReadWrapper(
+    Vec x, std::shared_ptr<const VecSubVectorTransferPlan> transfer_plan,
+    bool ghosted)
+    : _ghosted(ghosted), _writable(false), _transfer_plan(transfer_plan),
+      _view_vector(nullptr), _view_local_form(nullptr), _view_array(nullptr)
+{
+  gather(x);
+}
+//-----------------------------------------------------------------------------
+VecSubVectorReadWrapper::~VecSubVectorReadWrapper()
+{
+  // Release the view, in case restore was not called
+  if (_view_array)
+    release_view();
+}
+//-----------------------------------------------------------------------------
+void VecSubVectorReadWrapper::restore()
+{
+  if (_view_array)
+    release_view();
+}
+//-----------------------------------------------------------------------------
+void VecSubVectorReadWrapper::gather(Vec x)
 {
   PetscErrorCode ierr;
+  assert(_transfer_plan);
 
-  // Get number of entries to extract from x
-  PetscInt restricted_is_size;
-  ierr = ISGetLocalSize(restricted_index_set, &restricted_is_size);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
-
-  // Get indices of entries to extract from x
-  const PetscInt* restricted_indices;
-  ierr = ISGetIndices(restricted_index_set, &restricted_indices);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetIndices");
-
-  // Fetch vector content from x
+  // Fetch vector content from the local form of x
   Vec x_local_form;
   if (_ghosted)
   {
@@ -379,113 +597,85 @@ VecSubVectorReadWrapper::VecSubVectorReadWrapper(
   {
     x_local_form = x;
   }
-  std::vector<PetscScalar> restricted_content(restricted_is_size, 0.);
-  ierr = VecGetValues(x_local_form, restricted_is_size, restricted_indices,
-                      restricted_content.data());
+  const PetscScalar* array_local_form;
+  ierr = VecGetArrayRead(x_local_form, &array_local_form);
   if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "VecGetValues");
+    dolfinx::la::petsc::error(ierr, __FILE__, "VecGetArrayRead");
+  _content.assign(_transfer_plan->size(), 0.);
+  _transfer_plan->gather(array_local_form, _content);
+  ierr = VecRestoreArrayRead(x_local_form, &array_local_form);
+  if (ierr != 0)
+    dolfinx::la::petsc::error(ierr, __FILE__, "VecRestoreArrayRead");
   if (_ghosted)
   {
     ierr = VecGhostRestoreLocalForm(x, &x_local_form);
     if (ierr != 0)
       dolfinx::la::petsc::error(ierr, __FILE__, "VecGhostRestoreLocalForm");
   }
-
-  // Restore indices
-  ierr = ISRestoreIndices(restricted_index_set, &restricted_indices);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISRestoreIndices");
-
-  // Get number of entries to be stored in _content
-  PetscInt unrestricted_is_size;
-  ierr = ISGetLocalSize(unrestricted_index_set, &unrestricted_is_size);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
-
-  // Assign vector content to an STL vector indexed with respect to the
-  // unrestricted index set
-  _content.resize(unrestricted_is_size, 0.);
-  for (PetscInt unrestricted_index = 0;
-       unrestricted_index < unrestricted_is_size; unrestricted_index++)
-  {
-    if (unrestricted_to_restricted.count(unrestricted_index
-                                         / unrestricted_to_restricted_bs)
-        > 0)
-    {
-      _content[unrestricted_index] = restricted_content
-          [unrestricted_to_restricted_bs
-               * unrestricted_to_restricted.at(unrestricted_index
-                                               / unrestricted_to_restricted_bs)
-           + unrestricted_index % unrestricted_to_restricted_bs];
-    }
-  }
 }
 //-----------------------------------------------------------------------------
-VecSubVectorReadWrapper::~VecSubVectorReadWrapper()
+void VecSubVectorReadWrapper::release_view()
 {
-  // Nothing to be done
+  PetscErrorCode ierr;
+  assert(_view_array);
+  if (_writable)
+  {
+    ierr = VecRestoreArray(_view_local_form, &_view_array);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "VecRestoreArray");
+  }
+  else
+  {
+    const PetscScalar* array_read = _view_array;
+    ierr = VecRestoreArrayRead(_view_local_form, &array_read);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "VecRestoreArrayRead");
+  }
+  if (_ghosted)
+  {
+    ierr = VecGhostRestoreLocalForm(_view_vector, &_view_local_form);
+    if (ierr != 0)
+      dolfinx::la::petsc::error(ierr, __FILE__, "VecGhostRestoreLocalForm");
+  }
+
+  // Clear pointers
+  _view_vector = nullptr;
+  _view_local_form = nullptr;
+  _view_array = nullptr;
+  _view = std::span<PetscScalar>();
 }
 //-----------------------------------------------------------------------------
 VecSubVectorWrapper::VecSubVectorWrapper(Vec x, IS index_set, bool ghosted)
-    : VecSubVectorReadWrapper(x, index_set, ghosted), _global_vector(x),
-      _is(index_set)
+    : VecSubVectorReadWrapper(x, index_set, ghosted, true), _global_vector(x)
 {
-  PetscErrorCode ierr;
-
-  // Get number of entries stored in _content
-  PetscInt is_size;
-  ierr = ISGetLocalSize(index_set, &is_size);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
-
-  // Fill in _restricted_to_unrestricted attribute with the identity map
-  for (PetscInt index = 0; index < is_size; index++)
-  {
-    _restricted_to_unrestricted[index] = index;
-  }
+  // Nothing else to be done
 }
 //-----------------------------------------------------------------------------
 VecSubVectorWrapper::VecSubVectorWrapper(
     Vec x, IS unrestricted_index_set, IS restricted_index_set,
-    const std::unordered_map<std::int32_t, std::int32_t>&
-        unrestricted_to_restricted,
+    std::span<const std::int32_t> unrestricted_to_restricted,
     int unrestricted_to_restricted_bs, bool ghosted)
     : VecSubVectorReadWrapper(x, unrestricted_index_set, restricted_index_set,
                               unrestricted_to_restricted,
                               unrestricted_to_restricted_bs, ghosted),
-      _global_vector(x), _is(restricted_index_set)
+      _global_vector(x)
 {
-  PetscErrorCode ierr;
-
-  // Get number of entries stored in _content
-  PetscInt unrestricted_is_size;
-  ierr = ISGetLocalSize(unrestricted_index_set, &unrestricted_is_size);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetLocalSize");
-
-  // Fill in _restricted_to_unrestricted attribute
-  for (PetscInt unrestricted_index = 0;
-       unrestricted_index < unrestricted_is_size; unrestricted_index++)
-  {
-    if (unrestricted_to_restricted.count(unrestricted_index
-                                         / unrestricted_to_restricted_bs)
-        > 0)
-    {
-      _restricted_to_unrestricted
-          [unrestricted_to_restricted_bs
-               * unrestricted_to_restricted.at(unrestricted_index
-                                               / unrestricted_to_restricted_bs)
-           + unrestricted_index % unrestricted_to_restricted_bs]
-          = unrestricted_index;
-    }
-  }
+  // Nothing else to be done
+}
+//-----------------------------------------------------------------------------
+VecSubVectorWrapper::VecSubVectorWrapper(
+    Vec x, std::shared_ptr<const VecSubVectorTransferPlan> transfer_plan,
+    bool ghosted)
+    : VecSubVectorReadWrapper(x, transfer_plan, ghosted), _global_vector(x)
+{
+  // Nothing else to be done
 }
 //-----------------------------------------------------------------------------
 VecSubVectorWrapper::~VecSubVectorWrapper()
 {
   // Sub vector should have been restored before destroying object
-  assert(!_is);
-  assert(_restricted_to_unrestricted.size() == 0);
+  assert(!_global_vector);
+  assert(!_transfer_plan);
   assert(_content.size() == 0);
 }
 //-----------------------------------------------------------------------------
@@ -493,23 +683,16 @@ void VecSubVectorWrapper::restore()
 {
   PetscErrorCode ierr;
 
-  // Get indices of entries to restore in x
-  const PetscInt* restricted_indices;
-  ierr = ISGetIndices(_is, &restricted_indices);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISGetIndices");
-
-  // Restrict values from content attribute
-  std::vector<PetscScalar> restricted_values(
-      _restricted_to_unrestricted.size());
-  for (auto& restricted_to_unrestricted_it : _restricted_to_unrestricted)
+  // Release the view, if any: changes are already stored in the Vec object
+  if (_view_array)
   {
-    auto restricted_index = restricted_to_unrestricted_it.first;
-    auto unrestricted_index = restricted_to_unrestricted_it.second;
-    restricted_values[restricted_index] = _content[unrestricted_index];
+    release_view();
+    _global_vector = nullptr;
+    return;
   }
 
-  // Insert values calling PETSc API
+  // Insert values in the local form of the Vec object
+  assert(_transfer_plan);
   Vec global_vector_local_form;
   if (_ghosted)
   {
@@ -525,8 +708,7 @@ void VecSubVectorWrapper::restore()
   ierr = VecGetArray(global_vector_local_form, &array_local_form);
   if (ierr != 0)
     dolfinx::la::petsc::error(ierr, __FILE__, "VecGetArray");
-  for (std::size_t i = 0; i < restricted_values.size(); ++i)
-    array_local_form[restricted_indices[i]] = restricted_values[i];
+  _transfer_plan->scatter(_content, array_local_form);
   ierr = VecRestoreArray(global_vector_local_form, &array_local_form);
   if (ierr != 0)
     dolfinx::la::petsc::error(ierr, __FILE__, "VecRestoreArray");
@@ -537,14 +719,9 @@ void VecSubVectorWrapper::restore()
       dolfinx::la::petsc::error(ierr, __FILE__, "VecGhostRestoreLocalForm");
   }
 
-  // Restore indices
-  ierr = ISRestoreIndices(_is, &restricted_indices);
-  if (ierr != 0)
-    dolfinx::la::petsc::error(ierr, __FILE__, "ISRestoreIndices");
-
   // Clear storage
-  _is = nullptr;
-  _restricted_to_unrestricted.clear();
+  _global_vector = nullptr;
+  _transfer_plan.reset();
   _content.clear();
 }
 //-----------------------------------------------------------------------------
@@ -6,10 +6,13 @@
 
 #pragma once
 
+#include <cassert>
+#include <cstdint>
 #include <dolfinx/common/IndexMap.h>
+#include <memory>
 #include <petscmat.h>
 #include <petscvec.h>
-#include <unordered_map>
+#include <span>
 #include <vector>
 
 namespace multiphenicsx::la
@@ -62,13 +65,17 @@ public:
   /// Constructor (for cases without restriction)
   MatSubMatrixWrapper(Mat A, std::array<IS, 2> index_sets),
 
-      /// Constructor (for cases with restriction)
+      /// Constructor (for cases with restriction). The identifiers
+      /// unrestricted_to_restricted_ids (e.g., DofMapRestriction::id) must
+      /// change whenever the content of unrestricted_to_restricted changes,
+      /// since they key the local-to-global maps cached on A.
       MatSubMatrixWrapper(
           Mat A, std::array<IS, 2> unrestricted_index_sets,
           std::array<IS, 2> restricted_index_sets,
-          std::array<std::unordered_map<std::int32_t, std::int32_t>, 2>
+          std::array<std::span<const std::int32_t>, 2>
               unrestricted_to_restricted,
-          std::array<int, 2> unrestricted_to_restricted_bs);
+          std::array<int, 2> unrestricted_to_restricted_bs,
+          std::array<std::uint64_t, 2> unrestricted_to_restricted_ids);
 
   /// Destructor
   ~MatSubMatrixWrapper();
@@ -97,8 +104,71 @@ private:
   std::array<IS, 2> _is;
 };
 
+/// Precomputed indices to transfer entries between the local form of a Vec
+/// object and the content of a VecSubVectorReadWrapper or
+/// VecSubVectorWrapper
+///
+/// The content of the wrappers is indexed with respect to the unrestricted
+/// index set, while the Vec object is indexed with respect to the restricted
+/// index set. The transfer plan stores, for each entry which is active in
+/// the restriction, its position in both, so that transfers in either
+/// direction are plain indexed loops. A transfer plan only depends on the
+/// index sets and on the restriction, and can thus be reused by several
+/// wrappers.
+class VecSubVectorTransferPlan
+{
+public:
+  /// Constructor (for cases without restriction)
+  VecSubVectorTransferPlan(IS index_set),
+
+      /// Constructor (for cases with restriction)
+      VecSubVectorTransferPlan(
+          IS unrestricted_index_set, IS restricted_index_set,
+          std::span<const std::int32_t> unrestricted_to_restricted,
+          int unrestricted_to_restricted_bs);
+
+  /// Size of the content of the wrappers
+  std::size_t size() const { return _size; }
+
+  /// Indices in the local form of the Vec object of the entries to transfer
+  std::span<const PetscInt> vector_indices() const { return _vector_indices; }
+
+  /// Positions in the content of the wrappers of the entries to transfer
+  std::span<const std::int32_t> content_indices() const
+  {
+    return _content_indices;
+  }
+
+  /// Gather entries from the array of the local form of a Vec object into
+  /// the content of a wrapper
+  void gather(const PetscScalar* array, std::span<PetscScalar> content) const
+  {
+    assert(content.size() == _size);
+    for (std::size_t i = 0; i < _content_indices.size(); ++i)
+      content[_content_indices[i]] = array[_vector_indices[i]];
+  }
+
+  /// Scatter entries from the content of a wrapper into the array of the
+  /// local form of a Vec object
+  void scatter(std::span<const PetscScalar> content, PetscScalar* array) const
+  {
+    assert(content.size() == _size);
+    for (std::size_t i = 0; i < _content_indices.size(); ++i)
+      array[_vector_indices[i]] = content[_content_indices[i]];
+  }
+
+private:
+  std::size_t _size;
+  std::vector<PetscInt> _vector_indices;
+  std::vector<std::int32_t> _content_indices;
+};
+
 /// Read-only wrapper around a local subvector of a Vec object, used in
 /// combination with DofMapRestriction
+///
+/// Without restriction, if the index set is contiguous the content is a view
+/// of the (local form of the) Vec object, rather than a copy. Such view is
+/// read-only.
 class VecSubVectorReadWrapper
 {
 public:
@@ -108,9 +178,13 @@ public:
       /// Constructor (for cases with restriction)
       VecSubVectorReadWrapper(
           Vec x, IS unrestricted_index_set, IS restricted_index_set,
-          const std::unordered_map<std::int32_t, std::int32_t>&
-              unrestricted_to_restricted,
-          int unrestricted_to_restricted_bs, bool ghosted = true);
+          std::span<const std::int32_t> unrestricted_to_restricted,
+          int unrestricted_to_restricted_bs, bool ghosted = true),
+
+      /// Constructor (from a precomputed transfer plan)
+      VecSubVectorReadWrapper(
+          Vec x, std::shared_ptr<const VecSubVectorTransferPlan> transfer_plan,
+          bool ghosted = true);
 
   /// Destructor
   ~VecSubVectorReadWrapper();
@@ -127,16 +201,49 @@ public:
   /// Move assignment operator (deleted)
   VecSubVectorReadWrapper& operator=(VecSubVectorReadWrapper&&) = delete;
 
+  /// Release the view of the Vec object, if any
+  void restore();
+
   /// Get content
-  std::vector<PetscScalar>& mutable_content() { return _content; }
+  std::span<PetscScalar> mutable_content()
+  {
+    return _view_array ? _view : std::span<PetscScalar>(_content);
+  }
+
+  /// Return true if the content is a view of the Vec object, rather than a
+  /// copy
+  bool is_view() const { return _view_array != nullptr; }
+
+  /// Return true if the content must not be modified
+  bool read_only() const { return _view_array != nullptr and !_writable; }
 
 protected:
+  /// Constructor (for cases without restriction), possibly providing a view
+  /// which can be modified
+  VecSubVectorReadWrapper(Vec x, IS index_set, bool ghosted, bool writable);
+
+  /// Gather the content from x according to the transfer plan
+  void gather(Vec x);
+
+  /// Release the view of the Vec object
+  void release_view();
+
   std::vector<PetscScalar> _content;
   bool _ghosted;
+  bool _writable;
+  std::shared_ptr<const VecSubVectorTransferPlan> _transfer_plan;
+  Vec _view_vector;
+  Vec _view_local_form;
+  PetscScalar* _view_array;
+  std::span<PetscScalar> _view;
 };
 
 /// Wrapper around a local subvector of a Vec object, used in combination with
 /// DofMapRestriction
+///
+/// Without restriction, if the index set is contiguous the content is a view
+/// of the (local form of the) Vec object, and changes to the content are
+/// immediately visible in the Vec object.
 class VecSubVectorWrapper : public VecSubVectorReadWrapper
 {
 public:
@@ -146,10 +253,15 @@ public:
       /// Constructor (for cases with restriction)
       VecSubVectorWrapper(Vec x, IS unrestricted_index_set,
                           IS restricted_index_set,
-                          const std::unordered_map<std::int32_t, std::int32_t>&
+                          std::span<const std::int32_t>
                               unrestricted_to_restricted,
                           int unrestricted_to_restricted_bs,
-                          bool ghosted = true);
+                          bool ghosted = true),
+
+      /// Constructor (from a precomputed transfer plan)
+      VecSubVectorWrapper(
+          Vec x, std::shared_ptr<const VecSubVectorTransferPlan> transfer_plan,
+          bool ghosted = true);
 
   /// Destructor
   ~VecSubVectorWrapper();
@@ -171,8 +283,6 @@ public:
 
 private:
   Vec _global_vector;
-  IS _is;
-  std::unordered_map<std::int32_t, std::int32_t> _restricted_to_unrestricted;
 };
 
 } // namespace petsc
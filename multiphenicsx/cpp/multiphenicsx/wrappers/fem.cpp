@@ -6,9 +6,14 @@
 
 #include <array>
 #include <dolfinx/common/IndexMap.h>
+#include <dolfinx/fem/DirichletBC.h>
 #include <dolfinx/fem/DofMap.h>
 #include <dolfinx/fem/Form.h>
+#include <dolfinx/la/SparsityPattern.h>
+#include <dolfinx/mesh/MeshTags.h>
+#include <dolfinx/mesh/Topology.h>
 #include <dolfinx_wrappers/caster_petsc.h>
+#include <map>
 #include <memory>
 #include <multiphenicsx/fem/DofMapRestriction.h>
 #include <multiphenicsx/fem/petsc.h>
@@ -17,14 +22,18 @@
 #include <nanobind/ndarray.h>
 #include <nanobind/stl/array.h>
 #include <nanobind/stl/complex.h>
+#include <nanobind/stl/map.h>
+#include <nanobind/stl/optional.h>
 #include <nanobind/stl/pair.h>
 #include <nanobind/stl/shared_ptr.h>
 #include <nanobind/stl/string.h>
 #include <nanobind/stl/unordered_map.h>
 #include <nanobind/stl/vector.h>
+#include <optional>
 #include <petsc4py/petsc4py.h>
 #include <span>
 #include <string>
+#include <unordered_map>
 #include <vector>
 
 namespace nb = nanobind;
@@ -82,6 +91,62 @@ std::array<std::span<const T>, 2> convert_ndarray_to_span(
       {convert_ndarray_to_span(input[0]), convert_ndarray_to_span(input[1])}};
 }
 
+template <class T, class... Args>
+std::optional<std::span<const T>> convert_ndarray_to_span(
+    const std::optional<nb::ndarray<const T, Args...>>& input)
+{
+  if (input)
+    return convert_ndarray_to_span(*input);
+  else
+    return std::nullopt;
+}
+
+template <class T, class... Args>
+std::vector<std::optional<std::span<const T>>> convert_ndarray_to_span(
+    const std::vector<std::optional<nb::ndarray<const T, Args...>>>& input)
+{
+  std::vector<std::optional<std::span<const T>>> output;
+  output.reserve(input.size());
+  for (auto& input_ : input)
+    output.push_back(convert_ndarray_to_span(input_));
+  return output;
+}
+
+template <class T, class... Args>
+std::array<std::optional<std::span<const T>>, 2> convert_ndarray_to_span(
+    const std::array<std::optional<nb::ndarray<const T, Args...>>, 2>& input)
+{
+  return {
+      {convert_ndarray_to_span(input[0]), convert_ndarray_to_span(input[1])}};
+}
+
+template <class T>
+std::map<std::pair<dolfinx::fem::IntegralType, int>,
+         std::pair<std::span<const T>, int>>
+convert_coefficients(
+    const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                   nb::ndarray<const T, nb::ndim<2>, nb::c_contig>>& input)
+{
+  std::map<std::pair<dolfinx::fem::IntegralType, int>,
+           std::pair<std::span<const T>, int>>
+      output;
+  for (auto& [key, coefficient] : input)
+  {
+    output.emplace(key, std::pair(convert_ndarray_to_span(coefficient),
+                                  static_cast<int>(coefficient.shape(1))));
+  }
+  return output;
+}
+
+template <class T>
+nb::ndarray<T, nb::numpy> convert_vector_to_ndarray(std::vector<T>&& input)
+{
+  auto* data = new std::vector<T>(std::move(input));
+  nb::capsule owner(data, [](void* p) noexcept
+                    { delete static_cast<std::vector<T>*>(p); });
+  return nb::ndarray<T, nb::numpy>(data->data(), {data->size()}, owner);
+}
+
 template <class T, class... Args>
 std::array<std::vector<std::span<const T>>, 2> convert_ndarray_to_span(
     const std::array<std::vector<nb::ndarray<const T, Args...>>, 2>& input)
@@ -89,6 +154,16 @@ std::array<std::vector<std::span<const T>>, 2> convert_ndarray_to_span(
   return {
       {convert_ndarray_to_span(input[0]), convert_ndarray_to_span(input[1])}};
 }
+
+template <class T, class... Args>
+std::array<std::vector<std::optional<std::span<const T>>>, 2>
+convert_ndarray_to_span(
+    const std::array<std::vector<std::optional<nb::ndarray<const T, Args...>>>,
+                     2>& input)
+{
+  return {
+      {convert_ndarray_to_span(input[0]), convert_ndarray_to_span(input[1])}};
+}
 } // namespace
 
 namespace multiphenicsx_wrappers
@@ -109,21 +184,143 @@ void fem_petsc_module(nb::module_& m)
          std::array<nb::ndarray<const std::size_t, nb::ndim<1>, nb::c_contig>,
                     2>
              dofmaps_bounds_,
-         const std::string& matrix_type)
+         std::array<std::optional<nb::ndarray<const std::int32_t, nb::ndim<1>,
+                                              nb::c_contig>>,
+                    2>
+             dofmaps_cells_,
+         const std::string& matrix_type, int num_threads)
       {
         auto index_maps = convert_shared_ptr_to_reference_wrapper(index_maps_);
         auto dofmaps_list = convert_ndarray_to_span(dofmaps_list_);
         auto dofmaps_bounds = convert_ndarray_to_span(dofmaps_bounds_);
+        auto dofmaps_cells = convert_ndarray_to_span(dofmaps_cells_);
         return multiphenicsx::fem::petsc::create_matrix(
             a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds,
-            matrix_type);
+            dofmaps_cells, matrix_type, num_threads);
       },
       nb::rv_policy::take_ownership, nb::arg("a"), nb::arg("index_maps"),
       nb::arg("index_maps_bs"), nb::arg("dofmaps_list"),
-      nb::arg("dofmaps_bounds"), nb::arg("matrix_type") = std::string(),
+      nb::arg("dofmaps_bounds"), nb::arg("dofmaps_cells"),
+      nb::arg("matrix_type") = std::string(), nb::arg("num_threads") = 1,
       "Create a PETSc Mat for bilinear form.");
   m.def(
-      "create_matrix_block",
+      "create_matrix_from_nonzero_counts",
+      [](const dolfinx::fem::Form<PetscScalar, PetscReal>& a,
+         std::array<std::shared_ptr<const dolfinx::common::IndexMap>, 2>
+             index_maps_,
+         const std::array<int, 2> index_maps_bs,
+         std::array<nb::ndarray<const std::int32_t, nb::c_contig>, 2>
+             dofmaps_list_,
+         std::array<nb::ndarray<const std::size_t, nb::ndim<1>, nb::c_contig>,
+                    2>
+             dofmaps_bounds_,
+         std::array<std::optional<nb::ndarray<const std::int32_t, nb::ndim<1>,
+                                              nb::c_contig>>,
+                    2>
+             dofmaps_cells_,
+         const std::string& matrix_type)
+      {
+        auto index_maps = convert_shared_ptr_to_reference_wrapper(index_maps_);
+        auto dofmaps_list = convert_ndarray_to_span(dofmaps_list_);
+        auto dofmaps_bounds = convert_ndarray_to_span(dofmaps_bounds_);
+        auto dofmaps_cells = convert_ndarray_to_span(dofmaps_cells_);
+        return multiphenicsx::fem::petsc::create_matrix_from_nonzero_counts(
+            a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds,
+            dofmaps_cells, matrix_type);
+      },
+      nb::rv_policy::take_ownership, nb::arg("a"), nb::arg("index_maps"),
+      nb::arg("index_maps_bs"), nb::arg("dofmaps_list"),
+      nb::arg("dofmaps_bounds"), nb::arg("dofmaps_cells"),
+      nb::arg("matrix_type") = std::string(),
+      "Create a PETSc Mat for bilinear form, preallocated from nonzero "
+      "counts.");
+  m.def(
+      "create_matrix_from_nonzero_counts",
+      [](std::array<std::shared_ptr<const dolfinx::common::IndexMap>, 2>
+             index_maps_,
+         const std::array<int, 2> index_maps_bs,
+         nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig> nnz_diag,
+         nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig> nnz_off,
+         const std::string& matrix_type)
+      {
+        return multiphenicsx::fem::petsc::create_matrix_from_nonzero_counts(
+            convert_shared_ptr_to_reference_wrapper(index_maps_),
+            index_maps_bs, convert_ndarray_to_span(nnz_diag),
+            convert_ndarray_to_span(nnz_off), matrix_type);
+      },
+      nb::rv_policy::take_ownership, nb::arg("index_maps"),
+      nb::arg("index_maps_bs"), nb::arg("nnz_diag"), nb::arg("nnz_off"),
+      nb::arg("matrix_type") = std::string(),
+      "Create a PETSc Mat preallocated from given nonzero counts.");
+  m.def(
+      "count_nonzeros",
+      [](const dolfinx::fem::Form<PetscScalar, PetscReal>& a,
+         std::array<std::shared_ptr<const dolfinx::common::IndexMap>, 2>
+             index_maps_,
+         std::array<nb::ndarray<const std::int32_t, nb::c_contig>, 2>
+             dofmaps_list_,
+         std::array<nb::ndarray<const std::size_t, nb::ndim<1>, nb::c_contig>,
+                    2>
+             dofmaps_bounds_,
+         std::array<std::optional<nb::ndarray<const std::int32_t, nb::ndim<1>,
+                                              nb::c_contig>>,
+                    2>
+             dofmaps_cells_)
+      {
+        auto [nnz_diag, nnz_off] = multiphenicsx::fem::count_nonzeros(
+            a, convert_shared_ptr_to_reference_wrapper(index_maps_),
+            convert_ndarray_to_span(dofmaps_list_),
+            convert_ndarray_to_span(dofmaps_bounds_),
+            convert_ndarray_to_span(dofmaps_cells_));
+        return std::make_pair(convert_vector_to_ndarray(std::move(nnz_diag)),
+                              convert_vector_to_ndarray(std::move(nnz_off)));
+      },
+      nb::arg("a"), nb::arg("index_maps"), nb::arg("dofmaps_list"),
+      nb::arg("dofmaps_bounds"), nb::arg("dofmaps_cells"),
+      "Count the nonzeros in the diagonal and off-diagonal parts of each "
+      "owned row of the matrix of a bilinear form.");
+  m.def(
+      "create_sparsity_pattern",
+      [](const dolfinx::fem::Form<PetscScalar, PetscReal>& a,
+         std::array<std::shared_ptr<const dolfinx::common::IndexMap>, 2>
+             index_maps_,
+         const std::array<int, 2> index_maps_bs,
+         std::array<nb::ndarray<const std::int32_t, nb::c_contig>, 2>
+             dofmaps_list_,
+         std::array<nb::ndarray<const std::size_t, nb::ndim<1>, nb::c_contig>,
+                    2>
+             dofmaps_bounds_,
+         std::array<std::optional<nb::ndarray<const std::int32_t, nb::ndim<1>,
+                                              nb::c_contig>>,
+                    2>
+             dofmaps_cells_,
+         int num_threads)
+      {
+        dolfinx::la::SparsityPattern pattern
+            = multiphenicsx::fem::create_sparsity_pattern(
+                a, convert_shared_ptr_to_reference_wrapper(index_maps_),
+                index_maps_bs, convert_ndarray_to_span(dofmaps_list_),
+                convert_ndarray_to_span(dofmaps_bounds_),
+                convert_ndarray_to_span(dofmaps_cells_), num_threads);
+        pattern.finalize();
+        return pattern;
+      },
+      nb::arg("a"), nb::arg("index_maps"), nb::arg("index_maps_bs"),
+      nb::arg("dofmaps_list"), nb::arg("dofmaps_bounds"),
+      nb::arg("dofmaps_cells"), nb::arg("num_threads") = 1,
+      "Build the finalised sparsity pattern of a bilinear form.");
+  m.def(
+      "create_matrix_from_sparsity_pattern",
+      [](const dolfinx::la::SparsityPattern& pattern,
+         const std::string& matrix_type)
+      {
+        return multiphenicsx::fem::petsc::create_matrix(pattern, matrix_type);
+      },
+      nb::rv_policy::take_ownership, nb::arg("pattern"),
+      nb::arg("matrix_type") = std::string(),
+      "Create a PETSc Mat from a finalised sparsity pattern.");
+  m.def(
+      "create_block_sparsity_pattern",
       [](const std::vector<
              std::vector<const dolfinx::fem::Form<PetscScalar, PetscReal>*>>& a,
          std::array<
@@ -137,18 +334,87 @@ void fem_petsc_module(nb::module_& m)
                                             nb::c_contig>>,
                     2>
              dofmaps_bounds_,
+         std::array<std::vector<std::optional<nb::ndarray<
+                        const std::int32_t, nb::ndim<1>, nb::c_contig>>>,
+                    2>
+             dofmaps_cells_,
+         int num_threads)
+      {
+        return multiphenicsx::fem::petsc::create_block_sparsity_pattern(
+            a, convert_shared_ptr_to_reference_wrapper(index_maps_),
+            index_maps_bs, convert_ndarray_to_span(dofmaps_list_),
+            convert_ndarray_to_span(dofmaps_bounds_),
+            convert_ndarray_to_span(dofmaps_cells_), num_threads);
+      },
+      nb::arg("a"), nb::arg("index_maps"), nb::arg("index_maps_bs"),
+      nb::arg("dofmaps_list"), nb::arg("dofmaps_bounds"),
+      nb::arg("dofmaps_cells"), nb::arg("num_threads") = 1,
+      "Build the finalised sparsity pattern of a monolithic matrix for "
+      "stacked bilinear forms.");
+  m.def(
+      "create_matrix_block_from_sparsity_pattern",
+      [](const dolfinx::la::SparsityPattern& pattern,
+         std::array<
+             std::vector<std::shared_ptr<const dolfinx::common::IndexMap>>, 2>
+             index_maps_,
+         const std::array<std::vector<int>, 2> index_maps_bs,
          const std::string& matrix_type)
+      {
+        return multiphenicsx::fem::petsc::create_matrix_block(
+            pattern, convert_shared_ptr_to_reference_wrapper(index_maps_),
+            index_maps_bs, matrix_type);
+      },
+      nb::rv_policy::take_ownership, nb::arg("pattern"),
+      nb::arg("index_maps"), nb::arg("index_maps_bs"),
+      nb::arg("matrix_type") = std::string(),
+      "Create monolithic sparse matrix from the finalised sparsity pattern of "
+      "stacked bilinear forms.");
+  m.def(
+      "create_matrix_nest_from_sparsity_patterns",
+      [](const std::vector<std::vector<const dolfinx::la::SparsityPattern*>>&
+             patterns,
+         const std::vector<std::vector<std::string>>& matrix_types)
+      {
+        return multiphenicsx::fem::petsc::create_matrix_nest(patterns,
+                                                             matrix_types);
+      },
+      nb::rv_policy::take_ownership, nb::arg("patterns"),
+      nb::arg("matrix_types") = std::vector<std::vector<std::string>>(),
+      "Create nested sparse matrix from the finalised sparsity patterns of "
+      "its blocks.");
+  m.def(
+      "create_matrix_block",
+      [](const std::vector<
+             std::vector<const dolfinx::fem::Form<PetscScalar, PetscReal>*>>& a,
+         std::array<
+             std::vector<std::shared_ptr<const dolfinx::common::IndexMap>>, 2>
+             index_maps_,
+         const std::array<std::vector<int>, 2> index_maps_bs,
+         std::array<std::vector<nb::ndarray<const std::int32_t, nb::c_contig>>,
+                    2>
+             dofmaps_list_,
+         std::array<std::vector<nb::ndarray<const std::size_t, nb::ndim<1>,
+                                            nb::c_contig>>,
+                    2>
+             dofmaps_bounds_,
+         std::array<std::vector<std::optional<nb::ndarray<
+                        const std::int32_t, nb::ndim<1>, nb::c_contig>>>,
+                    2>
+             dofmaps_cells_,
+         const std::string& matrix_type, int num_threads)
       {
         auto index_maps = convert_shared_ptr_to_reference_wrapper(index_maps_);
         auto dofmaps_list = convert_ndarray_to_span(dofmaps_list_);
         auto dofmaps_bounds = convert_ndarray_to_span(dofmaps_bounds_);
+        auto dofmaps_cells = convert_ndarray_to_span(dofmaps_cells_);
         return multiphenicsx::fem::petsc::create_matrix_block(
             a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds,
-            matrix_type);
+            dofmaps_cells, matrix_type, num_threads);
       },
       nb::rv_policy::take_ownership, nb::arg("a"), nb::arg("index_maps"),
       nb::arg("index_maps_bs"), nb::arg("dofmaps_list"),
-      nb::arg("dofmaps_bounds"), nb::arg("matrix_type") = std::string(),
+      nb::arg("dofmaps_bounds"), nb::arg("dofmaps_cells"),
+      nb::arg("matrix_type") = std::string(), nb::arg("num_threads") = 1,
       "Create monolithic sparse matrix for stacked bilinear forms.");
   m.def(
       "create_matrix_nest",
@@ -165,20 +431,75 @@ void fem_petsc_module(nb::module_& m)
                                             nb::c_contig>>,
                     2>
              dofmaps_bounds_,
-         const std::vector<std::vector<std::string>>& matrix_types)
+         std::array<std::vector<std::optional<nb::ndarray<
+                        const std::int32_t, nb::ndim<1>, nb::c_contig>>>,
+                    2>
+             dofmaps_cells_,
+         const std::vector<std::vector<std::string>>& matrix_types,
+         int num_threads)
       {
         auto index_maps = convert_shared_ptr_to_reference_wrapper(index_maps_);
         auto dofmaps_list = convert_ndarray_to_span(dofmaps_list_);
         auto dofmaps_bounds = convert_ndarray_to_span(dofmaps_bounds_);
+        auto dofmaps_cells = convert_ndarray_to_span(dofmaps_cells_);
         return multiphenicsx::fem::petsc::create_matrix_nest(
             a, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds,
-            matrix_types);
+            dofmaps_cells, matrix_types, num_threads);
       },
       nb::rv_policy::take_ownership, nb::arg("a"), nb::arg("index_maps"),
       nb::arg("index_maps_bs"), nb::arg("dofmaps_list"),
-      nb::arg("dofmaps_bounds"),
+      nb::arg("dofmaps_bounds"), nb::arg("dofmaps_cells"),
       nb::arg("matrix_types") = std::vector<std::vector<std::string>>(),
+      nb::arg("num_threads") = 1,
       "Create nested sparse matrix for bilinear forms.");
+
+  // Assemble PETSc matrices
+  m.def(
+      "assemble_matrix_and_transpose",
+      [](Mat A, Mat AT, const dolfinx::fem::Form<PetscScalar, PetscReal>& a,
+         nb::ndarray<const PetscScalar, nb::ndim<1>, nb::c_contig> constants,
+         const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                        nb::ndarray<const PetscScalar, nb::ndim<2>,
+                                    nb::c_contig>>& coefficients,
+         const std::vector<
+             const dolfinx::fem::DirichletBC<PetscScalar, PetscReal>*>& bcs,
+         bool unrolled)
+      {
+        multiphenicsx::fem::petsc::assemble_matrix_and_transpose(
+            A, AT, a, convert_ndarray_to_span(constants),
+            convert_coefficients(coefficients), bcs, unrolled);
+      },
+      nb::arg("A"), nb::arg("AT"), nb::arg("a"), nb::arg("constants"),
+      nb::arg("coeffs"), nb::arg("bcs"), nb::arg("unrolled") = false,
+      "Assemble bilinear form into a PETSc matrix, and its transpose into a "
+      "second PETSc matrix.");
+  m.def(
+      "assemble_matrix_restricted",
+      [](Mat A, const dolfinx::fem::Form<PetscScalar, PetscReal>& a,
+         nb::ndarray<const PetscScalar, nb::ndim<1>, nb::c_contig> constants,
+         const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                        nb::ndarray<const PetscScalar, nb::ndim<2>,
+                                    nb::c_contig>>& coefficients,
+         const std::vector<
+             const dolfinx::fem::DirichletBC<PetscScalar, PetscReal>*>& bcs,
+         const std::array<
+             std::shared_ptr<const multiphenicsx::fem::DofMapRestriction>, 2>&
+             restrictions,
+         std::array<PetscInt, 2> offsets, bool unrolled)
+      {
+        multiphenicsx::fem::petsc::assemble_matrix_restricted(
+            A, a, convert_ndarray_to_span(constants),
+            convert_coefficients(coefficients), bcs,
+            convert_shared_ptr_to_reference_wrapper(restrictions), offsets,
+            unrolled);
+      },
+      nb::arg("A"), nb::arg("a"), nb::arg("constants"), nb::arg("coeffs"),
+      nb::arg("bcs"), nb::arg("restriction"),
+      nb::arg("offsets") = std::array<PetscInt, 2>{0, 0},
+      nb::arg("unrolled") = false,
+      "Assemble bilinear form into a restricted PETSc matrix, only visiting "
+      "active entities and discarding inactive rows and columns of element "
+      "matrices before insertion.");
 }
 
 void fem(nb::module_& m)
@@ -187,12 +508,139 @@ void fem(nb::module_& m)
       = m.def_submodule("petsc", "PETSc-specific finite element module");
   fem_petsc_module(petsc_mod);
 
+  // multiphenicsx::fem::RestrictedCellDofs
+  nb::class_<multiphenicsx::fem::RestrictedCellDofs>(
+      m, "RestrictedCellDofs", "RestrictedCellDofs object");
+
   // multiphenicsx::fem::DofMapRestriction
   nb::class_<multiphenicsx::fem::DofMapRestriction>(m, "DofMapRestriction",
                                                     "DofMapRestriction object")
       .def(nb::init<std::shared_ptr<const dolfinx::fem::DofMap>,
-                    const std::vector<std::int32_t>&>(),
-           nb::arg("dofmap"), nb::arg("restriction"))
+                    const std::vector<std::int32_t>&, bool, int>(),
+           nb::arg("dofmap"), nb::arg("restriction"),
+           nb::arg("compact") = false, nb::arg("num_threads") = 1)
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+             dolfinx::mesh::Topology& topology, int dim,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 entities,
+             bool compact)
+          {
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                dofmap, topology, dim, convert_ndarray_to_span(entities),
+                compact);
+          },
+          nb::arg("dofmap"), nb::arg("topology"), nb::arg("dim"),
+          nb::arg("entities"), nb::arg("compact") = false)
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+             dolfinx::mesh::Topology& topology,
+             const dolfinx::mesh::MeshTags<std::int32_t>& meshtags,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 values,
+             bool compact)
+          {
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                dofmap, topology, meshtags, convert_ndarray_to_span(values),
+                compact);
+          },
+          nb::arg("dofmap"), nb::arg("topology"), nb::arg("meshtags"),
+          nb::arg("values"), nb::arg("compact") = false)
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             const multiphenicsx::fem::DofMapRestriction& previous,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig> added,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 removed)
+          {
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                previous, convert_ndarray_to_span(added),
+                convert_ndarray_to_span(removed));
+          },
+          nb::arg("previous"), nb::arg("added"), nb::arg("removed"))
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             const multiphenicsx::fem::DofMapRestriction& parent,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 subset)
+          {
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                parent, convert_ndarray_to_span(subset));
+          },
+          nb::arg("parent"), nb::arg("subset"))
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+             std::shared_ptr<const dolfinx::common::IndexMap> index_map,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 restricted_to_unrestricted,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 dof_array,
+             nb::ndarray<const std::size_t, nb::ndim<1>, nb::c_contig>
+                 cell_bounds,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 active_cells,
+             bool compact)
+          {
+            auto to_vector = [](const auto& array)
+            {
+              auto span = convert_ndarray_to_span(array);
+              return std::vector(span.begin(), span.end());
+            };
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                dofmap, index_map, to_vector(restricted_to_unrestricted),
+                to_vector(dof_array), to_vector(cell_bounds),
+                to_vector(active_cells), compact);
+          },
+          nb::arg("dofmap"), nb::arg("index_map"),
+          nb::arg("restricted_to_unrestricted"), nb::arg("dof_array"),
+          nb::arg("cell_bounds"), nb::arg("active_cells"), nb::arg("compact"))
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+             std::shared_ptr<const dolfinx::common::IndexMap> index_map,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 restricted_to_unrestricted,
+             bool compact)
+          {
+            auto restricted_to_unrestricted_span
+                = convert_ndarray_to_span(restricted_to_unrestricted);
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                dofmap, index_map,
+                std::vector(restricted_to_unrestricted_span.begin(),
+                            restricted_to_unrestricted_span.end()),
+                compact);
+          },
+          nb::arg("dofmap"), nb::arg("index_map"),
+          nb::arg("restricted_to_unrestricted"), nb::arg("compact") = false)
+      .def(
+          "__init__",
+          [](multiphenicsx::fem::DofMapRestriction* self,
+             std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+             std::shared_ptr<const dolfinx::common::IndexMap> index_map,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 restricted_to_unrestricted,
+             multiphenicsx::fem::RestrictedCellDofs& cell_dofs, bool compact)
+          {
+            auto restricted_to_unrestricted_span
+                = convert_ndarray_to_span(restricted_to_unrestricted);
+            new (self) multiphenicsx::fem::DofMapRestriction(
+                dofmap, index_map,
+                std::vector(restricted_to_unrestricted_span.begin(),
+                            restricted_to_unrestricted_span.end()),
+                std::move(cell_dofs), compact);
+          },
+          nb::arg("dofmap"), nb::arg("index_map"),
+          nb::arg("restricted_to_unrestricted"), nb::arg("cell_dofs"),
+          nb::arg("compact"))
       .def(
           "cell_dofs",
           [](const multiphenicsx::fem::DofMapRestriction& self, int cell)
@@ -205,10 +653,47 @@ void fem(nb::module_& m)
       .def_prop_ro("dofmap", &multiphenicsx::fem::DofMapRestriction::dofmap)
       .def_prop_ro(
           "unrestricted_to_restricted",
-          &multiphenicsx::fem::DofMapRestriction::unrestricted_to_restricted)
+          [](const multiphenicsx::fem::DofMapRestriction& self)
+          {
+            auto unrestricted_to_restricted = self.unrestricted_to_restricted();
+            std::unordered_map<std::int32_t, std::int32_t> map;
+            map.reserve(self.restricted_to_unrestricted().size());
+            for (std::size_t d = 0; d < unrestricted_to_restricted.size(); ++d)
+            {
+              if (unrestricted_to_restricted[d] >= 0)
+                map[d] = unrestricted_to_restricted[d];
+            }
+            return map;
+          })
       .def_prop_ro(
           "restricted_to_unrestricted",
-          &multiphenicsx::fem::DofMapRestriction::restricted_to_unrestricted)
+          [](const multiphenicsx::fem::DofMapRestriction& self)
+          {
+            auto restricted_to_unrestricted = self.restricted_to_unrestricted();
+            std::unordered_map<std::int32_t, std::int32_t> map;
+            map.reserve(restricted_to_unrestricted.size());
+            for (std::size_t d = 0; d < restricted_to_unrestricted.size(); ++d)
+              map[d] = restricted_to_unrestricted[d];
+            return map;
+          })
+      .def_prop_ro(
+          "unrestricted_to_restricted_array",
+          [](const multiphenicsx::fem::DofMapRestriction& self)
+          {
+            auto map = self.unrestricted_to_restricted();
+            return nb::ndarray<const std::int32_t, nb::numpy>(
+                map.data(), {map.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal)
+      .def_prop_ro(
+          "restricted_to_unrestricted_array",
+          [](const multiphenicsx::fem::DofMapRestriction& self)
+          {
+            auto map = self.restricted_to_unrestricted();
+            return nb::ndarray<const std::int32_t, nb::numpy>(
+                map.data(), {map.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal)
       .def(
           "map",
           [](const multiphenicsx::fem::DofMapRestriction& self)
@@ -221,8 +706,133 @@ void fem(nb::module_& m)
                     map.second.data(), {map.second.size()}, nb::handle()));
           },
           nb::rv_policy::reference_internal)
+      .def_prop_ro("compact", &multiphenicsx::fem::DofMapRestriction::compact)
+      .def_prop_ro(
+          "active_cells",
+          [](const multiphenicsx::fem::DofMapRestriction& self)
+          {
+            auto cells = self.active_cells();
+            return nb::ndarray<const std::int32_t, nb::numpy>(
+                cells.data(), {cells.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal)
+      .def_prop_ro(
+          "active_cell_index",
+          [](const multiphenicsx::fem::DofMapRestriction& self)
+          {
+            auto cells = self.active_cell_index();
+            return nb::ndarray<const std::int32_t, nb::numpy>(
+                cells.data(), {cells.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal)
+      .def(
+          "active_facet_index",
+          [](const multiphenicsx::fem::DofMapRestriction& self,
+             std::shared_ptr<const dolfinx::mesh::Topology> topology)
+          {
+            auto facets = self.active_facet_index(topology);
+            return nb::ndarray<const std::int32_t, nb::numpy>(
+                facets.data(), {facets.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal, nb::arg("topology"))
       .def_ro("index_map", &multiphenicsx::fem::DofMapRestriction::index_map)
       .def_prop_ro("index_map_bs",
-                   &multiphenicsx::fem::DofMapRestriction::index_map_bs);
+                   &multiphenicsx::fem::DofMapRestriction::index_map_bs)
+      .def_prop_ro("id", &multiphenicsx::fem::DofMapRestriction::id);
+
+  m.def(
+      "create_restricted_index_maps",
+      [](std::vector<std::shared_ptr<const dolfinx::common::IndexMap>>
+             index_maps_,
+         std::vector<nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>>
+             restrictions_)
+      {
+        std::vector<std::reference_wrapper<const dolfinx::common::IndexMap>>
+            index_maps;
+        index_maps.reserve(index_maps_.size());
+        for (auto& index_map : index_maps_)
+          index_maps.push_back(*index_map);
+        auto restricted_index_maps
+            = multiphenicsx::fem::create_restricted_index_maps(
+                index_maps, convert_ndarray_to_span(restrictions_));
+        std::vector<std::pair<std::shared_ptr<const dolfinx::common::IndexMap>,
+                              nb::ndarray<std::int32_t, nb::numpy>>>
+            output;
+        output.reserve(restricted_index_maps.size());
+        for (auto& [index_map, restricted_to_unrestricted] :
+             restricted_index_maps)
+        {
+          output.emplace_back(
+              index_map,
+              convert_vector_to_ndarray(std::move(restricted_to_unrestricted)));
+        }
+        return output;
+      },
+      nb::arg("index_maps"), nb::arg("restrictions"),
+      "Create the restricted index maps of several restrictions at once.");
+  m.def(
+      "assemble_vector_restricted",
+      [](nb::ndarray<PetscScalar, nb::ndim<1>, nb::c_contig> b,
+         const dolfinx::fem::Form<PetscScalar, PetscReal>& L,
+         nb::ndarray<const PetscScalar, nb::ndim<1>, nb::c_contig> constants,
+         const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                        nb::ndarray<const PetscScalar, nb::ndim<2>,
+                                    nb::c_contig>>& coefficients,
+         const multiphenicsx::fem::DofMapRestriction& restriction)
+      {
+        multiphenicsx::fem::assemble_vector_restricted(
+            std::span(b.data(), b.size()), L,
+            convert_ndarray_to_span(constants),
+            convert_coefficients(coefficients), restriction.map().second,
+            restriction.compact()
+                ? std::optional(restriction.active_cells())
+                : std::nullopt);
+      },
+      nb::arg("b"), nb::arg("L"), nb::arg("constants"), nb::arg("coeffs"),
+      nb::arg("restriction"),
+      "Assemble linear form into an unrestricted array, only visiting the "
+      "entities which are active in a restriction.");
+  m.def(
+      "assemble_diagonal_restricted",
+      [](nb::ndarray<PetscScalar, nb::ndim<1>, nb::c_contig> d,
+         const dolfinx::fem::Form<PetscScalar, PetscReal>& a,
+         nb::ndarray<const PetscScalar, nb::ndim<1>, nb::c_contig> constants,
+         const std::map<std::pair<dolfinx::fem::IntegralType, int>,
+                        nb::ndarray<const PetscScalar, nb::ndim<2>,
+                                    nb::c_contig>>& coefficients,
+         std::array<nb::ndarray<const std::size_t, nb::ndim<1>, nb::c_contig>,
+                    2>
+             dofmaps_bounds,
+         std::array<std::optional<nb::ndarray<const std::int32_t, nb::ndim<1>,
+                                              nb::c_contig>>,
+                    2>
+             dofmaps_cells)
+      {
+        multiphenicsx::fem::assemble_diagonal_restricted(
+            std::span(d.data(), d.size()), a,
+            convert_ndarray_to_span(constants),
+            convert_coefficients(coefficients),
+            convert_ndarray_to_span(dofmaps_bounds),
+            convert_ndarray_to_span(dofmaps_cells));
+      },
+      nb::arg("d"), nb::arg("a"), nb::arg("constants"), nb::arg("coeffs"),
+      nb::arg("dofmaps_bounds"), nb::arg("dofmaps_cells"),
+      "Assemble the diagonal of a bilinear form into an unrestricted array, "
+      "only visiting the entities which are active in restricted dofmaps.");
+  m.def(
+      "compute_restricted_cell_dofs",
+      [](std::shared_ptr<const dolfinx::fem::DofMap> dofmap,
+         std::vector<nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>>
+             restricted_to_unrestricted,
+         bool compact, int num_threads)
+      {
+        return multiphenicsx::fem::compute_restricted_cell_dofs(
+            *dofmap, convert_ndarray_to_span(restricted_to_unrestricted),
+            compact, num_threads);
+      },
+      nb::arg("dofmap"), nb::arg("restricted_to_unrestricted"),
+      nb::arg("compact"), nb::arg("num_threads") = 1,
+      "Compute the restricted cell dofs of several restrictions of the same "
+      "dofmap with a single traversal of the dofmap.");
 }
 } // namespace multiphenicsx_wrappers
@@ -14,14 +14,25 @@
 #include <nanobind/stl/array.h>
 #include <nanobind/stl/complex.h>
 #include <nanobind/stl/pair.h>
-#include <nanobind/stl/unordered_map.h>
+#include <nanobind/stl/shared_ptr.h>
 #include <nanobind/stl/vector.h>
 #include <petsc4py/petsc4py.h>
 #include <petscis.h>
+#include <span>
 #include <vector>
 
 namespace nb = nanobind;
 
+namespace
+{
+template <class T, class... Args>
+std::span<const T>
+convert_ndarray_to_span(const nb::ndarray<const T, Args...>& input)
+{
+  return std::span(input.data(), input.size());
+}
+} // namespace
+
 namespace nanobind::detail
 {
 PETSC_CASTER_MACRO(IS, IS, is);
@@ -37,14 +48,29 @@ void la_petsc_module(nb::module_& m)
       m, "MatSubMatrixWrapper")
       .def(nb::init<Mat, std::array<IS, 2>>(), nb::arg("A"),
            nb::arg("index_sets"))
-      .def(nb::init<
-               Mat, std::array<IS, 2>, std::array<IS, 2>,
-               std::array<std::unordered_map<std::int32_t, std::int32_t>, 2>,
-               std::array<int, 2>>(),
-           nb::arg("A"), nb::arg("unrestricted_index_sets"),
-           nb::arg("restricted_index_sets"),
-           nb::arg("unrestricted_to_restricted"),
-           nb::arg("unrestricted_to_restricted_bs"))
+      .def(
+          "__init__",
+          [](multiphenicsx::la::petsc::MatSubMatrixWrapper* self, Mat A,
+             std::array<IS, 2> unrestricted_index_sets,
+             std::array<IS, 2> restricted_index_sets,
+             std::array<nb::ndarray<const std::int32_t, nb::ndim<1>,
+                                    nb::c_contig>,
+                        2>
+                 unrestricted_to_restricted,
+             std::array<int, 2> unrestricted_to_restricted_bs,
+             std::array<std::uint64_t, 2> unrestricted_to_restricted_ids)
+          {
+            new (self) multiphenicsx::la::petsc::MatSubMatrixWrapper(
+                A, unrestricted_index_sets, restricted_index_sets,
+                {convert_ndarray_to_span(unrestricted_to_restricted[0]),
+                 convert_ndarray_to_span(unrestricted_to_restricted[1])},
+                unrestricted_to_restricted_bs, unrestricted_to_restricted_ids);
+          },
+          nb::arg("A"), nb::arg("unrestricted_index_sets"),
+          nb::arg("restricted_index_sets"),
+          nb::arg("unrestricted_to_restricted"),
+          nb::arg("unrestricted_to_restricted_bs"),
+          nb::arg("unrestricted_to_restricted_ids"))
       .def("restore", &multiphenicsx::la::petsc::MatSubMatrixWrapper::restore)
       .def("mat",
            [](const multiphenicsx::la::petsc::MatSubMatrixWrapper& self)
@@ -54,39 +80,135 @@ void la_petsc_module(nb::module_& m)
              return nb::borrow(obj);
            });
 
+  nb::class_<multiphenicsx::la::petsc::VecSubVectorTransferPlan>(
+      m, "VecSubVectorTransferPlan")
+      .def(nb::init<IS>(), nb::arg("index_set"))
+      .def(
+          "__init__",
+          [](multiphenicsx::la::petsc::VecSubVectorTransferPlan* self,
+             IS unrestricted_index_set, IS restricted_index_set,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 unrestricted_to_restricted,
+             int unrestricted_to_restricted_bs)
+          {
+            new (self) multiphenicsx::la::petsc::VecSubVectorTransferPlan(
+                unrestricted_index_set, restricted_index_set,
+                convert_ndarray_to_span(unrestricted_to_restricted),
+                unrestricted_to_restricted_bs);
+          },
+          nb::arg("unrestricted_index_set"), nb::arg("restricted_index_set"),
+          nb::arg("unrestricted_to_restricted"),
+          nb::arg("unrestricted_to_restricted_bs"))
+      .def_prop_ro("size",
+                   &multiphenicsx::la::petsc::VecSubVectorTransferPlan::size)
+      .def_prop_ro(
+          "vector_indices",
+          [](const multiphenicsx::la::petsc::VecSubVectorTransferPlan& self)
+          {
+            std::span<const PetscInt> indices = self.vector_indices();
+            return nb::ndarray<const PetscInt, nb::numpy>(
+                indices.data(), {indices.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal)
+      .def_prop_ro(
+          "content_indices",
+          [](const multiphenicsx::la::petsc::VecSubVectorTransferPlan& self)
+          {
+            std::span<const std::int32_t> indices = self.content_indices();
+            return nb::ndarray<const std::int32_t, nb::numpy>(
+                indices.data(), {indices.size()}, nb::handle());
+          },
+          nb::rv_policy::reference_internal);
+
   nb::class_<multiphenicsx::la::petsc::VecSubVectorReadWrapper>(
       m, "VecSubVectorReadWrapper")
       .def(nb::init<Vec, IS, bool>(), nb::arg("x"), nb::arg("index_set"),
            nb::arg("ghosted") = true)
-      .def(nb::init<Vec, IS, IS,
-                    const std::unordered_map<std::int32_t, std::int32_t>&, int,
-                    bool>(),
-           nb::arg("x"), nb::arg("unrestricted_index_set"),
-           nb::arg("restricted_index_set"),
-           nb::arg("unrestricted_to_restricted"),
-           nb::arg("unrestricted_to_restricted_bs"), nb::arg("ghosted") = true)
+      .def(
+          "__init__",
+          [](multiphenicsx::la::petsc::VecSubVectorReadWrapper* self, Vec x,
+             std::shared_ptr<multiphenicsx::la::petsc::VecSubVectorTransferPlan>
+                 transfer_plan,
+             bool ghosted)
+          {
+            new (self) multiphenicsx::la::petsc::VecSubVectorReadWrapper(
+                x, transfer_plan, ghosted);
+          },
+          nb::arg("x"), nb::arg("transfer_plan"), nb::arg("ghosted") = true)
+      .def(
+          "__init__",
+          [](multiphenicsx::la::petsc::VecSubVectorReadWrapper* self, Vec x,
+             IS unrestricted_index_set, IS restricted_index_set,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 unrestricted_to_restricted,
+             int unrestricted_to_restricted_bs, bool ghosted)
+          {
+            new (self) multiphenicsx::la::petsc::VecSubVectorReadWrapper(
+                x, unrestricted_index_set, restricted_index_set,
+                convert_ndarray_to_span(unrestricted_to_restricted),
+                unrestricted_to_restricted_bs, ghosted);
+          },
+          nb::arg("x"), nb::arg("unrestricted_index_set"),
+          nb::arg("restricted_index_set"),
+          nb::arg("unrestricted_to_restricted"),
+          nb::arg("unrestricted_to_restricted_bs"), nb::arg("ghosted") = true)
       .def_prop_ro(
           "content",
           [](multiphenicsx::la::petsc::VecSubVectorReadWrapper& self)
           {
-            std::vector<PetscScalar>& array = self.mutable_content();
-            return nb::ndarray<PetscScalar, nb::numpy>(
-                array.data(), {array.size()}, nb::handle());
-          },
-          nb::rv_policy::reference_internal);
+            std::span<PetscScalar> array = self.mutable_content();
+            // Views provided by a read-only wrapper are exposed as read-only
+            // arrays. Arrays keep the wrapper alive.
+            nb::object owner = nb::find(&self);
+            if (self.read_only())
+            {
+              return nb::cast(nb::ndarray<const PetscScalar, nb::numpy>(
+                  array.data(), {array.size()}, owner));
+            }
+            else
+            {
+              return nb::cast(nb::ndarray<PetscScalar, nb::numpy>(
+                  array.data(), {array.size()}, owner));
+            }
+          })
+      .def_prop_ro("is_view",
+                   &multiphenicsx::la::petsc::VecSubVectorReadWrapper::is_view)
+      .def("restore",
+           &multiphenicsx::la::petsc::VecSubVectorReadWrapper::restore);
 
   nb::class_<multiphenicsx::la::petsc::VecSubVectorWrapper,
              multiphenicsx::la::petsc::VecSubVectorReadWrapper>(
       m, "VecSubVectorWrapper")
       .def(nb::init<Vec, IS, bool>(), nb::arg("x"), nb::arg("index_set"),
            nb::arg("ghosted") = true)
-      .def(nb::init<Vec, IS, IS,
-                    const std::unordered_map<std::int32_t, std::int32_t>&, int,
-                    bool>(),
-           nb::arg("x"), nb::arg("unrestricted_index_set"),
-           nb::arg("restricted_index_set"),
-           nb::arg("unrestricted_to_restricted"),
-           nb::arg("unrestricted_to_restricted_bs"), nb::arg("ghosted") = true)
+      .def(
+          "__init__",
+          [](multiphenicsx::la::petsc::VecSubVectorWrapper* self, Vec x,
+             std::shared_ptr<multiphenicsx::la::petsc::VecSubVectorTransferPlan>
+                 transfer_plan,
+             bool ghosted)
+          {
+            new (self) multiphenicsx::la::petsc::VecSubVectorWrapper(
+                x, transfer_plan, ghosted);
+          },
+          nb::arg("x"), nb::arg("transfer_plan"), nb::arg("ghosted") = true)
+      .def(
+          "__init__",
+          [](multiphenicsx::la::petsc::VecSubVectorWrapper* self, Vec x,
+             IS unrestricted_index_set, IS restricted_index_set,
+             nb::ndarray<const std::int32_t, nb::ndim<1>, nb::c_contig>
+                 unrestricted_to_restricted,
+             int unrestricted_to_restricted_bs, bool ghosted)
+          {
+            new (self) multiphenicsx::la::petsc::VecSubVectorWrapper(
+                x, unrestricted_index_set, restricted_index_set,
+                convert_ndarray_to_span(unrestricted_to_restricted),
+                unrestricted_to_restricted_bs, ghosted);
+          },
+          nb::arg("x"), nb::arg("unrestricted_index_set"),
+          nb::arg("restricted_index_set"),
+          nb::arg("unrestricted_to_restricted"),
+          nb::arg("unrestricted_to_restricted_bs"), nb::arg("ghosted") = true)
       .def("restore", &multiphenicsx::la::petsc::VecSubVectorWrapper::restore);
 
   nb::enum_<multiphenicsx::la::petsc::GhostBlockLayout>(m, "GhostBlockLayout")
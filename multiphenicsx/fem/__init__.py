@@ -6,4 +6,5 @@
 """Tools for assembling finite element forms with restrictions."""
 
 
-from multiphenicsx.fem.dofmap_restriction import DofMapRestriction
+from multiphenicsx.fem.dofmap_restriction import create_dofmap_restrictions, DofMapRestriction
+from multiphenicsx.fem.dofmap_restriction_cache import DofMapRestrictionCache
@@ -5,27 +5,370 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
 """Restriction of a DofMap to a list of active degrees of freedom."""
 
+import hashlib
+import json
+import os
+import pathlib
 import typing
 
 import dolfinx.cpp as dcpp
 import dolfinx.fem
+import dolfinx.mesh
+import mpi4py.MPI
 import numpy as np
 import numpy.typing
 
 from multiphenicsx.cpp import cpp_library as mcpp
 
 
+def _extract_cpp_object(obj: object) -> object:
+    """Extract the cpp object wrapped by a dolfinx python object, if any."""
+    return getattr(obj, "_cpp_object", obj)
+
+
+_file_format_version = 1
+
+
+def _dofmap_fingerprint(  # type: ignore[no-any-unimported]
+    dofmap: dcpp.fem.DofMap
+) -> dict[str, typing.Union[int, str]]:
+    """Compute a fingerprint of the local data of a dofmap, and of its index map."""
+    index_map = dofmap.index_map
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (dofmap.map(), index_map.ghosts, index_map.owners):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return {
+        "size_local": index_map.size_local,
+        "num_ghosts": index_map.num_ghosts,
+        "local_range_start": index_map.local_range[0],
+        "bs": dofmap.index_map_bs,
+        "digest": digest.hexdigest()
+    }
+
+
 class DofMapRestriction(mcpp.fem.DofMapRestriction):  # type: ignore[misc, no-any-unimported]
-    """Restriction of a DofMap to a list of active degrees of freedom."""
+    """
+    Restriction of a DofMap to a list of active degrees of freedom.
+
+    Parameters
+    ----------
+    dofmap
+        The dofmap to be restricted.
+    restriction
+        The sorted list of active dofs.
+    compact
+        If True, store restricted dofs only for cells which contain at least one active dof, rather than for all
+        cells. This reduces memory usage when the restriction is supported on a small portion of a large mesh,
+        at the price of a binary search in each call to cell_dofs.
+    num_threads
+        Number of threads used to compute the restricted cell dofs.
+    """
 
     def __init__(  # type: ignore[no-any-unimported]
         self,
         dofmap: typing.Union[dcpp.fem.DofMap, dolfinx.fem.DofMap],
-        restriction: np.typing.NDArray[np.int32]
+        restriction: np.typing.NDArray[np.int32],
+        compact: bool = False, num_threads: int = 1
     ) -> None:
-        # Extract cpp dofmap
+        super().__init__(_extract_cpp_object(dofmap), restriction, compact, num_threads)
+
+    @classmethod
+    def from_entities(  # type: ignore[no-any-unimported]
+        cls,
+        dofmap: typing.Union[dcpp.fem.DofMap, dolfinx.fem.DofMap],
+        topology: typing.Union[dcpp.mesh.Topology, dolfinx.mesh.Topology],
+        dim: int,
+        entities: np.typing.NDArray[np.int32],
+        compact: bool = False
+    ) -> "DofMapRestriction":
+        """
+        Restrict a DofMap to the degrees of freedom in the closure of a list of mesh entities.
+
+        Parameters
+        ----------
+        dofmap
+            The dofmap to be restricted.
+        topology
+            The topology of the mesh on which the dofmap is defined. Connectivity from entities
+            of dimension `dim` to cells is created if not already available.
+        dim
+            Topological dimension of the entities.
+        entities
+            Indices (local to the process) of the entities.
+        compact
+            If True, store restricted dofs only for cells which contain at least one active dof.
+
+        Returns
+        -------
+        :
+            The restriction of the dofmap.
+        """
+        restriction = cls.__new__(cls)
+        mcpp.fem.DofMapRestriction.__init__(
+            restriction, _extract_cpp_object(dofmap), _extract_cpp_object(topology), dim,
+            np.asarray(entities, dtype=np.int32), compact)
+        return restriction
+
+    @classmethod
+    def from_meshtags(  # type: ignore[no-any-unimported]
+        cls,
+        dofmap: typing.Union[dcpp.fem.DofMap, dolfinx.fem.DofMap],
+        meshtags: dolfinx.mesh.MeshTags,
+        values: typing.Union[int, typing.Sequence[int], np.typing.NDArray[np.int32]],
+        compact: bool = False
+    ) -> "DofMapRestriction":
+        """
+        Restrict a DofMap to the degrees of freedom in the closure of mesh entities marked by mesh tags.
+
+        Parameters
+        ----------
+        dofmap
+            The dofmap to be restricted.
+        meshtags
+            The mesh tags. Connectivity from tagged entities to cells is created on the topology
+            associated to the mesh tags if not already available.
+        values
+            Value, or values, of the tags of the entities to be included in the restriction.
+        compact
+            If True, store restricted dofs only for cells which contain at least one active dof.
+
+        Returns
+        -------
+        :
+            The restriction of the dofmap.
+        """
+        restriction = cls.__new__(cls)
+        mcpp.fem.DofMapRestriction.__init__(
+            restriction, _extract_cpp_object(dofmap), _extract_cpp_object(meshtags.topology),
+            _extract_cpp_object(meshtags), np.atleast_1d(np.asarray(values, dtype=np.int32)), compact)
+        return restriction
+
+    def update(  # type: ignore[no-any-unimported]
+        self,
+        added: np.typing.NDArray[np.int32],
+        removed: np.typing.NDArray[np.int32]
+    ) -> tuple["DofMapRestriction", np.typing.NDArray[np.int32]]:
+        """
+        Update the list of active degrees of freedom.
+
+        The current restriction is left unchanged, so that objects created from it (e.g., vectors or matrices)
+        are still valid. Restricted cell dofs are obtained by renumbering the current ones, and only cells which
+        contain an added degree of freedom are recomputed from the unrestricted dofmap. Such cells are located
+        through a map from unrestricted dofs to cells, which is computed on the first update and shared with
+        all later updates.
+
+        Parameters
+        ----------
+        added
+            Unrestricted degrees of freedom to be added to the list of active degrees of freedom.
+        removed
+            Unrestricted degrees of freedom to be removed from the list of active degrees of freedom.
+            Degrees of freedom which are both added and removed are removed.
+
+        Returns
+        -------
+        :
+            A tuple containing the updated restriction, and the map from restricted dofs of the current
+            restriction to restricted dofs of the updated restriction. Removed dofs are mapped to -1.
+
+        Raises
+        ------
+        IndexError
+            If any added or removed degree of freedom is not a valid (owned or ghost) unrestricted dof.
+        """
+        restriction = self.__class__.__new__(self.__class__)
+        mcpp.fem.DofMapRestriction.__init__(
+            restriction, self, np.asarray(added, dtype=np.int32), np.asarray(removed, dtype=np.int32))
+        old_to_new = restriction.unrestricted_to_restricted_array[self.restricted_to_unrestricted_array]
+        return restriction, old_to_new
+
+    def restrict(self, subset: np.typing.NDArray[np.int32]) -> "DofMapRestriction":
+        """
+        Further restrict the current restriction to a subset of its active degrees of freedom.
+
+        The resulting restriction is still a restriction of the original dofmap, and it is equivalent to the one
+        obtained by providing the subset in unrestricted numbering to the constructor. However, its computation only
+        traverses the data of the current restriction, so that its cost scales with the size of the current
+        restriction rather than with the size of the original dofmap.
+
+        Parameters
+        ----------
+        subset
+            Sorted list of active dofs, in the restricted numbering of the current restriction.
+
+        Returns
+        -------
+        :
+            The restriction to the subset.
+        """
+        restriction = self.__class__.__new__(self.__class__)
+        mcpp.fem.DofMapRestriction.__init__(restriction, self, np.asarray(subset, dtype=np.int32))
+        return restriction
+
+    def active_facet_index(  # type: ignore[no-any-unimported]
+        self, topology: typing.Union[dcpp.mesh.Topology, dolfinx.mesh.Topology]
+    ) -> np.typing.NDArray[np.int32]:
+        """
+        Return the facets of the cells which contain at least one active degree of freedom.
+
+        Parameters
+        ----------
+        topology
+            The topology of the mesh on which the dofmap is defined. Connectivity from cells to facets
+            must be available.
+
+        Returns
+        -------
+        :
+            The sorted list of facets on which a facet integral may contribute to the restricted tensor.
+        """
+        return super().active_facet_index(_extract_cpp_object(topology))  # type: ignore[no-any-return]
+
+    def save(self, path: typing.Union[str, os.PathLike[str]]) -> None:
+        """
+        Save the restriction to disk.
+
+        Data are stored in a directory, with a subdirectory for each process containing one numpy file per array.
+        This function is collective on the communicator of the restriction.
+
+        Parameters
+        ----------
+        path
+            Path of the directory in which the restriction will be saved.
+        """
+        comm = self.index_map.comm
+        rank_path = pathlib.Path(path) / f"rank_{comm.rank}"
+        rank_path.mkdir(parents=True, exist_ok=True)
+        (dof_array, cell_bounds) = self.map()
+        arrays = {
+            "restricted_to_unrestricted": self.restricted_to_unrestricted_array,
+            "ghosts": self.index_map.ghosts,
+            "ghost_owners": self.index_map.owners,
+            "dof_array": dof_array,
+            "cell_bounds": cell_bounds,
+            "active_cells": self.active_cells
+        }
+        for (name, array) in arrays.items():
+            np.save(rank_path / f"{name}.npy", array)
+        metadata = {
+            "version": _file_format_version,
+            "comm_size": comm.size,
+            "size_local": self.index_map.size_local,
+            "compact": self.compact,
+            "dofmap": _dofmap_fingerprint(self.dofmap)
+        }
+        with open(rank_path / "metadata.json", "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+        comm.barrier()
+
+    @classmethod
+    def load(  # type: ignore[no-any-unimported]
+        cls,
+        dofmap: typing.Union[dcpp.fem.DofMap, dolfinx.fem.DofMap],
+        path: typing.Union[str, os.PathLike[str]]
+    ) -> "DofMapRestriction":
+        """
+        Load a restriction from disk.
+
+        The restriction is not recomputed: saved arrays are read into memory and copied into the restriction. Data
+        are validated against the provided dofmap: the number of processes, and the local dofmap and index map on
+        each process must be the same as the ones used when saving the restriction. This function is collective on
+        the communicator of the dofmap.
+
+        Parameters
+        ----------
+        dofmap
+            The dofmap to be restricted.
+        path
+            Path of the directory in which the restriction was saved.
+
+        Returns
+        -------
+        :
+            The restriction of the dofmap.
+        """
+        _dofmap = _extract_cpp_object(dofmap)
+        comm = _dofmap.index_map.comm  # type: ignore[attr-defined]
+        rank_path = pathlib.Path(path) / f"rank_{comm.rank}"
         try:
-            _dofmap = dofmap._cpp_object
-        except AttributeError:  # pragma: no cover
-            _dofmap = dofmap
-        super().__init__(_dofmap, restriction)
+            with open(rank_path / "metadata.json") as metadata_file:
+                metadata = json.load(metadata_file)
+        except (OSError, ValueError):
+            valid = False
+        else:
+            valid = (
+                metadata.get("version") == _file_format_version and metadata.get("comm_size") == comm.size
+                and metadata.get("dofmap") == _dofmap_fingerprint(_dofmap))  # type: ignore[arg-type]
+        if not comm.allreduce(valid, op=mpi4py.MPI.LAND):
+            raise RuntimeError(
+                f"Restriction saved in {path} is not compatible with the provided dofmap or mesh partition")
+        arrays = {
+            name: np.load(rank_path / f"{name}.npy") for name in (
+                "restricted_to_unrestricted", "ghosts", "ghost_owners", "dof_array", "cell_bounds", "active_cells")}
+        index_map = dcpp.common.IndexMap(comm, metadata["size_local"], arrays["ghosts"], arrays["ghost_owners"])
+        restriction = cls.__new__(cls)
+        mcpp.fem.DofMapRestriction.__init__(
+            restriction, _dofmap, index_map, arrays["restricted_to_unrestricted"], arrays["dof_array"],
+            arrays["cell_bounds"], arrays["active_cells"], metadata["compact"])
+        return restriction
+
+
+def create_dofmap_restrictions(  # type: ignore[no-any-unimported]
+    pairs: typing.Sequence[
+        tuple[typing.Union[dcpp.fem.DofMap, dolfinx.fem.DofMap], np.typing.NDArray[np.int32]]],
+    compact: bool = False
+) -> list[DofMapRestriction]:
+    """
+    Restrict several dofmaps at once.
+
+    The restricted index maps of all restrictions are computed together, combining the parallel communication
+    which would otherwise be carried out separately for each restriction. Restricted cell dofs of all restrictions
+    of the same dofmap are computed with a single traversal of the dofmap. Furthermore, repeated pairs of dofmap and
+    active dofs are restricted only once, and the same restriction object is returned for each repetition.
+
+    Parameters
+    ----------
+    pairs
+        List of pairs of dofmaps and corresponding sorted list of active dofs. All dofmaps must share the same
+        communicator.
+    compact
+        If True, store restricted dofs only for cells which contain at least one active dof.
+
+    Returns
+    -------
+    :
+        The restrictions of the dofmaps, in the same order as the provided pairs. The list can be passed
+        as restriction argument to the block assembly functions.
+    """
+    unique_pairs: list[tuple[dcpp.fem.DofMap, np.typing.NDArray[np.int32]]] = []  # type: ignore[no-any-unimported]
+    pair_to_unique_pair: list[int] = []
+    for (dofmap, restriction) in pairs:
+        _dofmap = _extract_cpp_object(dofmap)
+        _restriction = np.ascontiguousarray(restriction, dtype=np.int32)
+        for (u, (unique_dofmap, unique_restriction)) in enumerate(unique_pairs):
+            if unique_dofmap is _dofmap and np.array_equal(unique_restriction, _restriction):
+                pair_to_unique_pair.append(u)
+                break
+        else:
+            pair_to_unique_pair.append(len(unique_pairs))
+            unique_pairs.append((_dofmap, _restriction))
+    restricted_index_maps = mcpp.fem.create_restricted_index_maps(
+        [dofmap.index_map for (dofmap, _) in unique_pairs], [restriction for (_, restriction) in unique_pairs])
+    dofmap_to_unique_pairs: dict[int, list[int]] = dict()
+    for (u, (dofmap, _)) in enumerate(unique_pairs):
+        dofmap_to_unique_pairs.setdefault(id(dofmap), []).append(u)
+    unique_cell_dofs: list[typing.Any] = [None] * len(unique_pairs)
+    for unique_pairs_same_dofmap in dofmap_to_unique_pairs.values():
+        cell_dofs_same_dofmap = mcpp.fem.compute_restricted_cell_dofs(
+            unique_pairs[unique_pairs_same_dofmap[0]][0],
+            [restricted_index_maps[u][1] for u in unique_pairs_same_dofmap], compact)
+        for (u, cell_dofs) in zip(unique_pairs_same_dofmap, cell_dofs_same_dofmap):
+            unique_cell_dofs[u] = cell_dofs
+    unique_dofmap_restrictions = []
+    for ((dofmap, _), (index_map, restricted_to_unrestricted), cell_dofs) in zip(
+            unique_pairs, restricted_index_maps, unique_cell_dofs):
+        dofmap_restriction = DofMapRestriction.__new__(DofMapRestriction)
+        mcpp.fem.DofMapRestriction.__init__(
+            dofmap_restriction, dofmap, index_map, restricted_to_unrestricted, cell_dofs, compact)
+        unique_dofmap_restrictions.append(dofmap_restriction)
+    return [unique_dofmap_restrictions[u] for u in pair_to_unique_pair]
@@ -0,0 +1,129 @@
+# Copyright (C) 2016-2025 by the multiphenicsx authors
+#
+# This file is part of multiphenicsx.
+#
+# SPDX-License-Identifier: LGPL-3.0-or-later
+"""Cache of DofMapRestriction objects with least recently used eviction."""
+
+import collections
+import hashlib
+import typing
+
+import dolfinx.cpp as dcpp
+import dolfinx.fem
+import mpi4py.MPI
+import numpy as np
+import numpy.typing
+
+from multiphenicsx.fem.dofmap_restriction import _extract_cpp_object, DofMapRestriction
+
+
+class DofMapRestrictionCache:
+    """
+    Cache of DofMapRestriction objects with least recently used eviction.
+
+    A restriction is returned from the cache when it was previously created from the same dofmap and from
+    the same array of active dofs, the latter being identified by a hash of its content. Cache lookups are
+    collective on the communicator of the dofmap: a cached restriction is returned only if it is available
+    on every process, and a new restriction is constructed on every process otherwise.
+
+    Parameters
+    ----------
+    max_size
+        Maximum number of restrictions stored in the cache.
+    max_bytes
+        Maximum (approximate) memory footprint, in bytes, of the restrictions stored in the cache on each process.
+        If not provided, the memory footprint is not bounded.
+    """
+
+    def __init__(self, max_size: int = 16, max_bytes: typing.Optional[int] = None) -> None:
+        assert max_size > 0
+        assert max_bytes is None or max_bytes > 0
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._entries: collections.OrderedDict[  # type: ignore[no-any-unimported]
+            tuple[int, int, bytes], tuple[dcpp.fem.DofMap, DofMapRestriction, int]] = collections.OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(  # type: ignore[no-any-unimported]
+        self,
+        dofmap: typing.Union[dcpp.fem.DofMap, dolfinx.fem.DofMap],
+        restriction: np.typing.NDArray[np.int32]
+    ) -> DofMapRestriction:
+        """
+        Get the restriction of a dofmap to a list of active dofs, constructing it if not available in the cache.
+
+        Parameters
+        ----------
+        dofmap
+            The dofmap to be restricted.
+        restriction
+            The sorted list of active dofs.
+
+        Returns
+        -------
+        :
+            The restriction of the dofmap.
+        """
+        _dofmap = _extract_cpp_object(dofmap)
+        restriction = np.ascontiguousarray(restriction, dtype=np.int32)
+        key = (id(_dofmap), restriction.shape[0], hashlib.blake2b(restriction.tobytes(), digest_size=16).digest())
+        entry = self._entries.get(key, None)
+        local_hit = entry is not None and entry[0] is _dofmap
+        comm = _dofmap.index_map.comm  # type: ignore[attr-defined]
+        if comm.allreduce(int(local_hit), op=mpi4py.MPI.MIN) == 1:
+            assert entry is not None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        else:
+            if entry is not None:
+                self._remove(key)
+            dofmap_restriction = DofMapRestriction(_dofmap, restriction)
+            self.misses += 1
+            nbytes = self._restriction_nbytes(dofmap_restriction)
+            if self._max_bytes is None or nbytes <= self._max_bytes:
+                self._entries[key] = (_dofmap, dofmap_restriction, nbytes)
+                self._nbytes += nbytes
+                self._evict()
+            return dofmap_restriction
+
+    def clear(self) -> None:
+        """Remove all restrictions from the cache, and reset statistics."""
+        self._entries.clear()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        """Return the number of restrictions stored in the cache."""
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Return the (approximate) memory footprint, in bytes, of the restrictions stored in the cache."""
+        return self._nbytes
+
+    def _remove(self, key: tuple[int, int, bytes]) -> None:
+        """Remove a restriction from the cache."""
+        (_, _, nbytes) = self._entries.pop(key)
+        self._nbytes -= nbytes
+
+    def _evict(self) -> None:
+        """Evict least recently used restrictions until the cache bounds are satisfied."""
+        while len(self._entries) > self._max_size or (
+                self._max_bytes is not None and self._nbytes > self._max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    @staticmethod
+    def _restriction_nbytes(dofmap_restriction: DofMapRestriction) -> int:
+        """Compute the (approximate) memory footprint of the arrays stored in a restriction."""
+        (dof_array, cell_bounds) = dofmap_restriction.map()
+        return (  # type: ignore[no-any-return]
+            dofmap_restriction.unrestricted_to_restricted_array.nbytes
+            + dofmap_restriction.restricted_to_unrestricted_array.nbytes + dof_array.nbytes + cell_bounds.nbytes)
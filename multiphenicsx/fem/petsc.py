@@ -5,6 +5,7 @@
 # SPDX-License-Identifier: LGPL-3.0-or-later
 """Assembly functions for variational forms."""
 
+import collections
 import contextlib
 import functools
 import types
@@ -15,9 +16,11 @@ import dolfinx.fem
 import dolfinx.fem.assemble
 import dolfinx.la
 import dolfinx.la.petsc
+import mpi4py.MPI
 import numpy as np
 import numpy.typing
 import petsc4py.PETSc
+import ufl
 
 from multiphenicsx.cpp import cpp_library as mcpp
 
@@ -26,6 +29,12 @@ DolfinxCoefficientsType = dict[  # type: ignore[no-any-unimported]
     tuple[dcpp.fem.IntegralType, int],
     np.typing.NDArray[petsc4py.PETSc.ScalarType]
 ]
+_NonzeroCountsType = tuple[np.typing.NDArray[np.int32], np.typing.NDArray[np.int32]]
+_MatrixSparsityType = typing.Union[  # type: ignore[no-any-unimported]
+    dcpp.la.SparsityPattern, _NonzeroCountsType]
+_BlockMatrixSparsityType = typing.Union[  # type: ignore[no-any-unimported]
+    dcpp.la.SparsityPattern, list[list[typing.Optional[dcpp.la.SparsityPattern]]]]
+_SparsityType = typing.TypeVar("_SparsityType", bound=typing.Union[_MatrixSparsityType, _BlockMatrixSparsityType])
 
 
 def _get_block_function_spaces(block_form: list[typing.Any]) -> list[typing.Any]:
@@ -97,6 +106,256 @@ def _same_dofmap(  # type: ignore[no-any-unimported]
     return dofmap1 == dofmap2
 
 
+class IndexSetCache:
+    """
+    Cache of the PETSc index sets which locate blocks of index maps in the local form of a PETSc tensor.
+
+    Index sets are created on first use, and then returned by any later request with the same index maps, block
+    sizes, ghosted flag and ghost block layout. Index maps are identified by the index maps themselves: since they
+    are immutable, references to them are kept in the cache. Since such references keep each cached index map
+    alive, an index map is never destroyed (and its id never reused) while index sets associated to it are
+    cached, and entries do not need to be invalidated upon destruction of their index maps. The cache stores at
+    most `max_size` lists of index sets, and evicts the least recently used one when the bound is exceeded,
+    releasing the references to its index maps. Index sets which are evicted, invalidated or cleared are not
+    destroyed explicitly, since they may still be in use (e.g. by a BlockLayout or by a wrapper), and are rather
+    destroyed by garbage collection once no longer referenced. Index sets returned by the cache must not be
+    destroyed by the caller.
+
+    Parameters
+    ----------
+    max_size
+        Maximum number of lists of index sets stored in the cache.
+    """
+
+    def __init__(self, max_size: int = 64) -> None:
+        assert max_size > 0
+        self._max_size = max_size
+        self._entries: collections.OrderedDict[  # type: ignore[no-any-unimported]
+            tuple[typing.Hashable, ...], tuple[tuple[dcpp.common.IndexMap, ...], list[petsc4py.PETSc.IS]]
+        ] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def index_sets(  # type: ignore[no-any-unimported]
+        self, index_maps: list[tuple[dcpp.common.IndexMap, int]], is_bs: list[int], ghosted: bool = True,
+        ghost_block_layout: mcpp.la.petsc.GhostBlockLayout = mcpp.la.petsc.GhostBlockLayout.intertwined
+    ) -> list[petsc4py.PETSc.IS]:
+        """
+        Return the index sets of each index map, creating and caching them if not available.
+
+        See multiphenicsx.cpp.la.petsc.create_index_sets for a description of the arguments.
+        """
+        key = (
+            tuple((id(index_map), bs) for (index_map, bs) in index_maps), tuple(is_bs), ghosted,
+            ghost_block_layout)
+        entry = self._entries.get(key, None)
+        if entry is not None:
+            self.hits += 1
+        else:
+            entry = (
+                tuple(index_map for (index_map, _) in index_maps),
+                mcpp.la.petsc.create_index_sets(
+                    index_maps, is_bs, ghosted=ghosted, ghost_block_layout=ghost_block_layout))
+            self.misses += 1
+            self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._evict()
+        return entry[1]
+
+    def invalidate(self, index_map: dcpp.common.IndexMap) -> None:  # type: ignore[no-any-unimported]
+        """Remove the index sets associated to the provided index map from the cache."""
+        for key in [
+            key for (key, (index_maps, _)) in self._entries.items()
+            if any(index_map_ is index_map for index_map_ in index_maps)
+        ]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Remove all index sets from the cache, and reset statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        """Return the number of lists of index sets stored in the cache."""
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        """Evict least recently used lists of index sets until the cache bound is satisfied."""
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+index_set_cache = IndexSetCache()
+
+
+class BlockLayout:
+    """
+    Layout of the blocks of a block PETSc Vec or of the rows (or columns) of a block PETSc Mat.
+
+    The layout provides the PETSc index sets which locate each block in the local form of the block tensor, for
+    both the unrestricted and the restricted numbering. Index sets are drawn from index_set_cache, and are thus
+    shared with any other layout or wrapper on the same index maps. The layout stores the transfer plans computed
+    from such index sets, so that a layout which is created once and passed to the block wrappers and to the block
+    assembly functions avoids recomputing them at every call, e.g. at every iteration of a Newton solver. Call
+    destroy to release the transfer plans when the layout is no longer needed.
+
+    The layout is not used when creating block tensors: it does not store the local-to-global maps of block
+    matrices, which create_matrix_block and create_matrix_nest build on every call.
+
+    If all blocks share the same block size, index sets are blocked with such block size, consistently with the
+    block size of the PETSc Mat returned by create_matrix_block. Otherwise, index sets have block size one.
+
+    Parameters
+    ----------
+    dofmaps
+        The unrestricted dofmap of each block.
+    restriction
+        The dofmap restriction of each block. If not provided, the layout of the unrestricted tensor is stored.
+    """
+
+    def __init__(  # type: ignore[no-any-unimported]
+        self, dofmaps: list[dcpp.fem.DofMap],
+        restriction: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None
+    ) -> None:
+        if restriction is not None:
+            assert len(dofmaps) == len(restriction)
+            assert all([
+                _same_dofmap(dofmap, restriction_.dofmap) for (dofmap, restriction_) in zip(dofmaps, restriction)])
+        self._dofmaps = dofmaps
+        self._restriction = restriction
+        self._transfer_plans: dict[bool, list[mcpp.la.petsc.VecSubVectorTransferPlan]] = dict()
+
+    def __len__(self) -> int:
+        """Return the number of blocks."""
+        return len(self._dofmaps)
+
+    @property
+    def restricted(self) -> bool:
+        """Return True if the layout is associated to a restricted tensor."""
+        return self._restriction is not None
+
+    @property
+    def bs(self) -> int:
+        """Return the block size shared by all blocks, or one if blocks have different block sizes."""
+        bs = [dofmap.index_map_bs for dofmap in self._dofmaps]
+        if len(bs) > 0 and all(bs_ == bs[0] for bs_ in bs):
+            return bs[0]  # type: ignore[no-any-return]
+        else:
+            return 1
+
+    def index_sets(  # type: ignore[no-any-unimported]
+        self, restricted: bool, ghosted: bool = True,
+        ghost_block_layout: mcpp.la.petsc.GhostBlockLayout = mcpp.la.petsc.GhostBlockLayout.intertwined
+    ) -> list[petsc4py.PETSc.IS]:
+        """
+        Return the index sets of each block.
+
+        Parameters
+        ----------
+        restricted
+            If True, return index sets in the restricted numbering, otherwise in the unrestricted one.
+        ghosted
+            Include ghost indices in the index sets.
+        ghost_block_layout
+            Ghost block layout type: GhostBlockLayout.intertwined for block matrices,
+            GhostBlockLayout.trailing for block vectors.
+
+        Returns
+        -------
+        :
+            The index sets of each block. Index sets are owned by index_set_cache, and must not be destroyed.
+        """
+        assert not restricted or self._restriction is not None
+        if restricted:
+            assert self._restriction is not None
+            index_maps = [(restriction_.index_map, restriction_.index_map_bs) for restriction_ in self._restriction]
+        else:
+            index_maps = [(dofmap.index_map, dofmap.index_map_bs) for dofmap in self._dofmaps]
+        return index_set_cache.index_sets(
+            index_maps, [self.bs] * len(index_maps), ghosted=ghosted, ghost_block_layout=ghost_block_layout)
+
+    @property
+    def unrestricted_to_restricted(self) -> typing.Optional[list[np.typing.NDArray[np.int32]]]:
+        """Return the map from unrestricted to restricted dofs of each block, or None if not restricted."""
+        if self._restriction is None:
+            return None
+        else:
+            return [restriction_.unrestricted_to_restricted_array for restriction_ in self._restriction]
+
+    @property
+    def unrestricted_to_restricted_bs(self) -> typing.Optional[list[int]]:
+        """Return the block size of the restricted index map of each block, or None if not restricted."""
+        if self._restriction is None:
+            return None
+        else:
+            return [restriction_.index_map_bs for restriction_ in self._restriction]
+
+    def offsets(self, restricted: bool) -> list[int]:
+        """
+        Return the offset of each block in the local form of a block matrix.
+
+        Parameters
+        ----------
+        restricted
+            If True, return offsets in the restricted numbering, otherwise in the unrestricted one.
+
+        Returns
+        -------
+        :
+            The (unrolled) local index of the first entry of each block, with ghost entries of each block following
+            its owned entries, i.e. as for GhostBlockLayout.intertwined.
+        """
+        assert not restricted or self._restriction is not None
+        if restricted:
+            assert self._restriction is not None
+            index_maps = [(restriction_.index_map, restriction_.index_map_bs) for restriction_ in self._restriction]
+        else:
+            index_maps = [(dofmap.index_map, dofmap.index_map_bs) for dofmap in self._dofmaps]
+        sizes = [bs * (index_map.size_local + index_map.num_ghosts) for (index_map, bs) in index_maps]
+        return [int(offset) for offset in np.cumsum([0, *sizes[:-1]])] if len(sizes) > 0 else []
+
+    def transfer_plans(self, ghosted: bool = True) -> list[mcpp.la.petsc.VecSubVectorTransferPlan]:
+        """
+        Return the plans to transfer entries between each block of a restricted block vector and its content.
+
+        Parameters
+        ----------
+        ghosted
+            Include ghost entries of the restricted block vector in the transfer.
+
+        Returns
+        -------
+        :
+            The transfer plans of each block, computed on first use, and then reused.
+        """
+        assert self._restriction is not None
+        if ghosted not in self._transfer_plans:
+            unrestricted_index_sets = self.index_sets(
+                False, ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
+            restricted_index_sets = self.index_sets(
+                True, ghosted=ghosted, ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
+            self._transfer_plans[ghosted] = [
+                mcpp.la.petsc.VecSubVectorTransferPlan(
+                    unrestricted_index_set, restricted_index_set, restriction_.unrestricted_to_restricted_array,
+                    restriction_.index_map_bs)
+                for (unrestricted_index_set, restricted_index_set, restriction_) in zip(
+                    unrestricted_index_sets, restricted_index_sets, self._restriction)]
+        return self._transfer_plans[ghosted]
+
+    def destroy(self) -> None:
+        """
+        Release the transfer plans stored in the layout.
+
+        Index sets are owned by index_set_cache, and are left untouched. Transfer plans are computed again if the
+        layout is used after this call.
+        """
+        self._transfer_plans.clear()
+
+
 # -- Vector instantiation ----------------------------------------------------
 
 def create_vector(  # type: ignore[no-any-unimported]
@@ -193,7 +452,7 @@ def create_vector_nest(  # type: ignore[no-any-unimported]
 def create_matrix(  # type: ignore[no-any-unimported]
     a: dolfinx.fem.Form,
     restriction: typing.Optional[tuple[mcpp.fem.DofMapRestriction, mcpp.fem.DofMapRestriction]] = None,
-    mat_type: typing.Optional[str] = None
+    mat_type: typing.Optional[str] = None, num_threads: int = 1, preallocation: str = "pattern"
 ) -> petsc4py.PETSc.Mat:
     """
     Create a PETSc matrix which can be used to assemble the bilinear form `a` with restriction `restriction`.
@@ -206,12 +465,29 @@ def create_matrix(  # type: ignore[no-any-unimported]
         A dofmap restriction. If not provided, the unrestricted tensor will be created.
     mat_type
         The PETSc matrix type (``MatType``).
+    num_threads
+        The number of threads used to build the sparsity pattern.
+    preallocation
+        Either "pattern", to preallocate the matrix from its sparsity pattern, or "counts", to preallocate
+        the matrix from the number of nonzeros in each row, computed directly from the (restricted) dofmaps
+        without storing the sparsity pattern. Counts are exact also in parallel, since the columns of rows
+        at process interfaces are merged on the owning process. num_threads is unused in the latter case.
 
     Returns
     -------
     :
         A PETSc matrix with a layout that is compatible with `a` and restriction `restriction`.
     """
+    assert preallocation in ("pattern", "counts")
+    return _create_matrix_from_sparsity(
+        a, restriction, mat_type, _create_matrix_sparsity(a, restriction, num_threads, preallocation))
+
+
+def _get_matrix_dofmaps(  # type: ignore[no-any-unimported]
+    a: dolfinx.fem.Form,
+    restriction: typing.Optional[tuple[mcpp.fem.DofMapRestriction, mcpp.fem.DofMapRestriction]]
+) -> tuple[list[typing.Any], ...]:
+    """Get index maps, block sizes and (restricted) dofmaps of the arguments of a bilinear form."""
     assert a.rank == 2
     function_spaces = a.function_spaces
     assert all(function_space.mesh == a.mesh for function_space in function_spaces)
@@ -221,27 +497,54 @@ def create_matrix(  # type: ignore[no-any-unimported]
         dofmaps_list = [function_space.dofmap.map() for function_space in function_spaces]  # type: ignore[attr-defined]
         dofmaps_bounds = [
             np.arange(dofmap_list.shape[0] + 1, dtype=np.uint64) * dofmap_list.shape[1] for dofmap_list in dofmaps_list]
+        dofmaps_cells = [None for _ in function_spaces]
     else:
         assert len(restriction) == 2
         index_maps = [restriction_.index_map for restriction_ in restriction]
         index_maps_bs = [restriction_.index_map_bs for restriction_ in restriction]
         dofmaps_list = [restriction_.map()[0] for restriction_ in restriction]
         dofmaps_bounds = [restriction_.map()[1] for restriction_ in restriction]
-    if mat_type is not None:
-        return mcpp.fem.petsc.create_matrix(
-            a._cpp_object, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, mat_type)
+        dofmaps_cells = [
+            restriction_.active_cells if restriction_.compact else None for restriction_ in restriction]
+    return index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, dofmaps_cells
+
+
+def _create_matrix_sparsity(  # type: ignore[no-any-unimported]
+    a: dolfinx.fem.Form,
+    restriction: typing.Optional[tuple[mcpp.fem.DofMapRestriction, mcpp.fem.DofMapRestriction]],
+    num_threads: int, preallocation: str
+) -> _MatrixSparsityType:
+    """Build either the finalised sparsity pattern of a bilinear form, or its nonzero counts."""
+    index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, dofmaps_cells = _get_matrix_dofmaps(a, restriction)
+    if preallocation == "counts":
+        return mcpp.fem.petsc.count_nonzeros(
+            a._cpp_object, index_maps, dofmaps_list, dofmaps_bounds, dofmaps_cells)
     else:
-        return mcpp.fem.petsc.create_matrix(
-            a._cpp_object, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds)
+        return mcpp.fem.petsc.create_sparsity_pattern(
+            a._cpp_object, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, dofmaps_cells,
+            num_threads=num_threads)
 
 
-def _create_matrix_block_or_nest(  # type: ignore[no-any-unimported]
+def _create_matrix_from_sparsity(  # type: ignore[no-any-unimported]
+    a: dolfinx.fem.Form,
+    restriction: typing.Optional[tuple[mcpp.fem.DofMapRestriction, mcpp.fem.DofMapRestriction]],
+    mat_type: typing.Optional[str], sparsity: _MatrixSparsityType
+) -> petsc4py.PETSc.Mat:
+    """Create a PETSc matrix from the output of _create_matrix_sparsity."""
+    mat_type = mat_type if mat_type is not None else ""
+    if isinstance(sparsity, tuple):
+        index_maps, index_maps_bs, _, _, _ = _get_matrix_dofmaps(a, restriction)
+        return mcpp.fem.petsc.create_matrix_from_nonzero_counts(index_maps, index_maps_bs, *sparsity, mat_type)
+    else:
+        return mcpp.fem.petsc.create_matrix_from_sparsity_pattern(sparsity, mat_type)
+
+
+def _get_block_matrix_dofmaps(  # type: ignore[no-any-unimported]
     a: list[list[dolfinx.fem.Form]],
     restriction: typing.Optional[
-        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
-    mat_type: typing.Optional[typing.Union[str, list[str]]],
-    cpp_create_function: typing.Callable  # type: ignore[type-arg]
-) -> petsc4py.PETSc.Mat:
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]]
+) -> tuple[tuple[list[typing.Any], list[typing.Any]], ...]:
+    """Get index maps, block sizes and (restricted) dofmaps of the arguments of a block bilinear form."""
     function_spaces = _get_block_function_spaces(a)
     rows, cols = len(function_spaces[0]), len(function_spaces[1])
     mesh = None
@@ -269,6 +572,9 @@ def _create_matrix_block_or_nest(  # type: ignore[no-any-unimported]
              for i in range(rows)],
             [np.arange(dofmaps_list[1][j].shape[0] + 1, dtype=np.uint64) * dofmaps_list[1][j].shape[1]
              for j in range(cols)])
+        dofmaps_cells = (
+            [None for i in range(rows)],
+            [None for j in range(cols)])
     else:
         assert len(restriction) == 2
         assert len(restriction[0]) == rows
@@ -285,18 +591,74 @@ def _create_matrix_block_or_nest(  # type: ignore[no-any-unimported]
         dofmaps_bounds = (
             [restriction[0][i].map()[1] for i in range(rows)],
             [restriction[1][j].map()[1] for j in range(cols)])
-    a_cpp = [[None if form is None else form._cpp_object for form in forms] for forms in a]
-    if mat_type is not None:
-        return cpp_create_function(a_cpp, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, mat_type)
+        dofmaps_cells = (
+            [restriction[0][i].active_cells if restriction[0][i].compact else None for i in range(rows)],
+            [restriction[1][j].active_cells if restriction[1][j].compact else None for j in range(cols)])
+    return index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, dofmaps_cells
+
+
+def _create_block_matrix_sparsity(  # type: ignore[no-any-unimported]
+    a: list[list[dolfinx.fem.Form]],
+    restriction: typing.Optional[
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
+    num_threads: int, nest: bool, skip_blocks: typing.Container[tuple[int, int]] = (),
+    transposed_blocks: typing.Container[tuple[int, int]] = ()
+) -> _BlockMatrixSparsityType:
+    """
+    Build the finalised sparsity pattern of a block bilinear form.
+
+    The merged sparsity pattern is returned for block matrices, and the sparsity pattern of each block
+    (or None, for empty and skipped blocks) for nest matrices. The pattern of each block (i, j) in
+    `transposed_blocks` is built from the integration domains of form (j, i), so that form (i, j) is not used.
+    """
+    index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, dofmaps_cells = _get_block_matrix_dofmaps(
+        a, restriction)
+    a_cpp = [[
+        None if form is None or (i, j) in skip_blocks
+        else a[j][i]._cpp_object if (i, j) in transposed_blocks else form._cpp_object
+        for (j, form) in enumerate(forms)] for (i, forms) in enumerate(a)]
+    if nest:
+        return [[
+            None if form is None else mcpp.fem.petsc.create_sparsity_pattern(
+                form, (index_maps[0][i], index_maps[1][j]), (index_maps_bs[0][i], index_maps_bs[1][j]),
+                (dofmaps_list[0][i], dofmaps_list[1][j]), (dofmaps_bounds[0][i], dofmaps_bounds[1][j]),
+                (dofmaps_cells[0][i], dofmaps_cells[1][j]), num_threads=num_threads)
+            for (j, form) in enumerate(forms)] for (i, forms) in enumerate(a_cpp)]
+    else:
+        return mcpp.fem.petsc.create_block_sparsity_pattern(
+            a_cpp, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds, dofmaps_cells, num_threads=num_threads)
+
+
+def _create_block_matrix_from_sparsity(  # type: ignore[no-any-unimported]
+    a: list[list[dolfinx.fem.Form]],
+    restriction: typing.Optional[
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
+    mat_type: typing.Optional[typing.Union[str, list[str]]], sparsity: _BlockMatrixSparsityType,
+    symmetric: bool = False
+) -> petsc4py.PETSc.Mat:
+    """
+    Create a block or nest PETSc matrix from the output of _create_block_matrix_sparsity.
+
+    If `symmetric` is True, the block matrix is flagged as symmetric.
+    """
+    if isinstance(sparsity, list):
+        return mcpp.fem.petsc.create_matrix_nest_from_sparsity_patterns(
+            sparsity, mat_type if mat_type is not None else [])
     else:
-        return cpp_create_function(a_cpp, index_maps, index_maps_bs, dofmaps_list, dofmaps_bounds)
+        index_maps, index_maps_bs, _, _, _ = _get_block_matrix_dofmaps(a, restriction)
+        A = mcpp.fem.petsc.create_matrix_block_from_sparsity_pattern(
+            sparsity, index_maps, index_maps_bs, mat_type if mat_type is not None else "")
+        if symmetric:
+            A.setOption(petsc4py.PETSc.Mat.Option.SYMMETRIC, True)
+            A.setOption(petsc4py.PETSc.Mat.Option.SYMMETRY_ETERNAL, True)
+        return A
 
 
 def create_matrix_block(  # type: ignore[no-any-unimported]
     a: list[list[dolfinx.fem.Form]],
     restriction: typing.Optional[
         tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
-    mat_type: typing.Optional[str] = None
+    mat_type: typing.Optional[str] = None, num_threads: int = 1, symmetric: bool = False
 ) -> petsc4py.PETSc.Mat:
     """
     Create a block PETSc matrix which can be used to assemble the bilinear forms `a` with restriction `restriction`.
@@ -309,20 +671,112 @@ def create_matrix_block(  # type: ignore[no-any-unimported]
         A dofmap restriction. If not provided, the unrestricted tensor will be created.
     mat_type
         The PETSc matrix type (``MatType``).
+    num_threads
+        The number of threads used to build the sparsity pattern of each block.
+    symmetric
+        Declare that the block bilinear form is symmetric. If so, the matrix type defaults to SBAIJ, which only
+        stores the upper triangular part of the matrix, and the matrix is flagged as symmetric.
 
     Returns
     -------
     :
         A PETSc matrix with a blocked layout that is compatible with `a` and restriction `restriction`.
+
+    Notes
+    -----
+    If all row (respectively, column) blocks share the same block size, the returned matrix has such row
+    (respectively, column) block size, so that BAIJ storage and blocked insertion can be employed.
+    Otherwise, the row (respectively, column) block size of the matrix is one.
+
+    Forms below the diagonal of a SBAIJ matrix are never used, and each of them is required to be the transpose
+    of the corresponding form above the diagonal. In serial, blocks below the diagonal only contribute to the
+    lower triangular part of the matrix, and therefore their sparsity pattern is neither computed nor stored. In
+    parallel, the lower triangular part of the block matrix does not coincide with the blocks below the diagonal,
+    because dofs are numbered process by process, and a dof of a later block owned by one process may precede a
+    dof of an earlier block owned by another process: the entries of such blocks which belong to the upper
+    triangular part are then obtained by transposing the corresponding blocks above the diagonal.
+    """
+    mat_type, skip_blocks, transposed_blocks = _get_matrix_block_options(a, restriction, mat_type, symmetric)
+    return _create_block_matrix_from_sparsity(
+        a, restriction, mat_type,
+        _create_block_matrix_sparsity(a, restriction, num_threads, False, skip_blocks, transposed_blocks),
+        symmetric)
+
+
+def _get_matrix_block_options(  # type: ignore[no-any-unimported]
+    a: list[list[dolfinx.fem.Form]],
+    restriction: typing.Optional[
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
+    mat_type: typing.Optional[str], symmetric: bool
+) -> tuple[typing.Optional[str], list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Get the matrix type of a block matrix, and the blocks whose forms do not contribute to its sparsity pattern.
+
+    Blocks of the latter kind are either skipped, or replaced by the transpose of their counterpart above the
+    diagonal, see _get_lower_blocks.
+    """
+    if symmetric:
+        assert len(a) == len(a[0])
+        assert restriction is None or all(
+            restriction_0 is restriction_1 for (restriction_0, restriction_1) in zip(*restriction))
+        if mat_type is None:
+            mat_type = petsc4py.PETSc.Mat.Type.SBAIJ
+    return (mat_type, *_get_lower_blocks(a, mat_type, _get_block_comm(a)))
+
+
+def _get_block_comm(a: list[list[dolfinx.fem.Form]]) -> mpi4py.MPI.Comm:
+    """Get the communicator of the first available form in a rectangular array of bilinear forms."""
+    return next(form for forms in a for form in forms if form is not None).mesh.comm
+
+
+def _get_lower_blocks(
+    a: list[list[dolfinx.fem.Form]], mat_type: typing.Optional[str], comm: mpi4py.MPI.Comm
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """
+    Get the blocks below the diagonal whose forms are not used, because the matrix only stores its upper part.
+
+    In serial, such blocks only contribute to the lower triangular part, and are returned as first output to
+    be skipped altogether. In parallel, they are returned as second output, to be replaced by the transpose
+    of their counterpart above the diagonal. Both outputs are empty for matrices which store both parts.
     """
-    return _create_matrix_block_or_nest(a, restriction, mat_type, mcpp.fem.petsc.create_matrix_block)
+    if mat_type is None or "sbaij" not in mat_type:
+        return [], []
+    _check_symmetric_blocks(a)
+    lower_blocks = [(i, j) for i in range(len(a)) for j in range(i) if a[i][j] is not None]
+    if comm.size == 1:
+        return lower_blocks, []
+    else:
+        return [], lower_blocks
+
+
+def _check_symmetric_blocks(a: list[list[dolfinx.fem.Form]]) -> None:
+    """Check that each block below the diagonal is the transpose of its counterpart above the diagonal."""
+    if len(a) != len(a[0]):
+        raise RuntimeError("A block bilinear form with symmetric storage must have as many row as column blocks.")
+    for i in range(len(a)):
+        for j in range(i):
+            a_ij, a_ji = a[i][j], a[j][i]
+            if a_ij is None and a_ji is None:
+                continue
+            transposed = (
+                a_ij is not None and a_ji is not None
+                and _same_dofmap(a_ij.function_spaces[0].dofmap, a_ji.function_spaces[1].dofmap)
+                and _same_dofmap(a_ij.function_spaces[1].dofmap, a_ji.function_spaces[0].dofmap)
+                and a_ij._cpp_object.integral_types == a_ji._cpp_object.integral_types
+                and all(
+                    a_ij._cpp_object.integral_ids(integral_type) == a_ji._cpp_object.integral_ids(integral_type)
+                    for integral_type in a_ij._cpp_object.integral_types))
+            if not transposed:
+                raise RuntimeError(
+                    f"Block ({i}, {j}) is not the transpose of block ({j}, {i}), as required by symmetric storage.")
 
 
 def create_matrix_nest(  # type: ignore[no-any-unimported]
     a: list[list[dolfinx.fem.Form]],
     restriction: typing.Optional[
         tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
-    mat_types: typing.Optional[list[str]] = None
+    mat_types: typing.Optional[list[str]] = None, num_threads: int = 1,
+    transposed_blocks: list[tuple[int, int]] = []
 ) -> petsc4py.PETSc.Mat:
     """
     Create a nest PETSc matrix which can be used to assemble the bilinear forms `a` with restriction `restriction`.
@@ -335,13 +789,167 @@ def create_matrix_nest(  # type: ignore[no-any-unimported]
         A dofmap restriction. If not provided, the unrestricted tensor will be created.
     mat_types
         The PETSc matrix types (``MatType``).
+    num_threads
+        The number of threads used to build the sparsity pattern of each block.
+    transposed_blocks
+        Pairs (i, j) of indices of blocks which are the transpose of block (j, i). Such blocks are not allocated,
+        but are rather stored as an implicit transpose of block (j, i).
 
     Returns
     -------
     :
         A PETSc matrix with a nest layout that is compatible with `a` and restriction `restriction`.
     """
-    return _create_matrix_block_or_nest(a, restriction, mat_types, mcpp.fem.petsc.create_matrix_nest)
+    _check_transposed_blocks(a, transposed_blocks)
+    A = _create_block_matrix_from_sparsity(
+        a, restriction, mat_types,
+        _create_block_matrix_sparsity(a, restriction, num_threads, True, transposed_blocks))
+    if len(transposed_blocks) > 0:
+        A_sub = [[
+            None if form is None or (i, j) in transposed_blocks else A.getNestSubMatrix(i, j)
+            for (j, form) in enumerate(forms)] for (i, forms) in enumerate(a)]
+        for (i, j) in transposed_blocks:
+            A_sub[i][j] = petsc4py.PETSc.Mat().createTranspose(A_sub[j][i])
+        A_transposed = petsc4py.PETSc.Mat().createNest(A_sub, comm=A.comm)
+        for A_sub_i in A_sub:
+            for A_sub_ij in A_sub_i:
+                if A_sub_ij is not None:
+                    A_sub_ij.destroy()
+        A.destroy()
+        A = A_transposed
+    return A
+
+
+def _check_transposed_blocks(a: list[list[dolfinx.fem.Form]], transposed_blocks: list[tuple[int, int]]) -> None:
+    """Check that blocks marked as transposed have an off-diagonal counterpart which is not marked as such."""
+    for (i, j) in transposed_blocks:
+        assert i != j
+        assert (j, i) not in transposed_blocks
+        assert a[i][j] is not None and a[j][i] is not None
+
+
+class SparsityPatternCache:
+    """
+    Cache of the nonzero structure of PETSc matrices with least recently used eviction.
+
+    Matrix creation requires building, finalising and communicating a sparsity pattern. The cache stores the
+    finalised sparsity pattern (or, for matrices preallocated from nonzero counts, the counts) of each matrix it
+    creates, and creates every further matrix from the same forms, restrictions and options from the stored
+    pattern, skipping its build. A new PETSc matrix is created on every call, and the caller is responsible for
+    destroying it. Integral structure and index maps are identified by the forms and restrictions themselves:
+    since both are immutable, references to them are kept in the cache. Options which change the nonzero
+    structure or the storage of the matrix are part of the key. Cache lookups are collective on the communicator
+    of the forms: a cached pattern is used only if it is available on every process, and a new pattern is built
+    on every process otherwise.
+
+    Parameters
+    ----------
+    max_size
+        Maximum number of sparsity patterns stored in the cache.
+    """
+
+    def __init__(self, max_size: int = 16) -> None:
+        assert max_size > 0
+        self._max_size = max_size
+        self._entries: collections.OrderedDict[
+            tuple[typing.Hashable, ...], tuple[tuple[typing.Any, ...], typing.Any]
+        ] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def create_matrix(  # type: ignore[no-any-unimported]
+        self, a: dolfinx.fem.Form,
+        restriction: typing.Optional[tuple[mcpp.fem.DofMapRestriction, mcpp.fem.DofMapRestriction]] = None,
+        mat_type: typing.Optional[str] = None, num_threads: int = 1, preallocation: str = "pattern"
+    ) -> petsc4py.PETSc.Mat:
+        """
+        Create a PETSc matrix, reusing a cached sparsity pattern if available.
+
+        See create_matrix for a description of the arguments.
+        """
+        assert preallocation in ("pattern", "counts")
+        sparsity = self._get(
+            ("matrix", preallocation), (a, ), restriction, a.mesh.comm,
+            lambda: _create_matrix_sparsity(a, restriction, num_threads, preallocation))
+        return _create_matrix_from_sparsity(a, restriction, mat_type, sparsity)
+
+    def create_matrix_block(  # type: ignore[no-any-unimported]
+        self, a: list[list[dolfinx.fem.Form]],
+        restriction: typing.Optional[
+            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+        mat_type: typing.Optional[str] = None, num_threads: int = 1, symmetric: bool = False
+    ) -> petsc4py.PETSc.Mat:
+        """
+        Create a block PETSc matrix, reusing a cached sparsity pattern if available.
+
+        See create_matrix_block for a description of the arguments.
+        """
+        mat_type, skip_blocks, transposed_blocks = _get_matrix_block_options(a, restriction, mat_type, symmetric)
+        sparsity = self._get(
+            ("block", len(a), tuple(skip_blocks), tuple(transposed_blocks)),
+            tuple(form for forms in a for form in forms),
+            None if restriction is None else (*restriction[0], *restriction[1]), _get_block_comm(a),
+            lambda: _create_block_matrix_sparsity(
+                a, restriction, num_threads, False, skip_blocks, transposed_blocks))
+        return _create_block_matrix_from_sparsity(a, restriction, mat_type, sparsity, symmetric)
+
+    def create_matrix_nest(  # type: ignore[no-any-unimported]
+        self, a: list[list[dolfinx.fem.Form]],
+        restriction: typing.Optional[
+            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+        mat_types: typing.Optional[list[str]] = None, num_threads: int = 1
+    ) -> petsc4py.PETSc.Mat:
+        """
+        Create a nest PETSc matrix, reusing cached sparsity patterns if available.
+
+        See create_matrix_nest for a description of the arguments.
+        """
+        sparsity = self._get(
+            ("nest", len(a)), tuple(form for forms in a for form in forms),
+            None if restriction is None else (*restriction[0], *restriction[1]), _get_block_comm(a),
+            lambda: _create_block_matrix_sparsity(a, restriction, num_threads, True))
+        return _create_block_matrix_from_sparsity(a, restriction, mat_types, sparsity)
+
+    def clear(self) -> None:
+        """Remove all sparsity patterns from the cache, and reset statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        """Return the number of sparsity patterns stored in the cache."""
+        return len(self._entries)
+
+    def _get(  # type: ignore[no-any-unimported]
+        self, kind: tuple[typing.Hashable, ...], forms: tuple[typing.Optional[dolfinx.fem.Form], ...],
+        restrictions: typing.Optional[tuple[mcpp.fem.DofMapRestriction, ...]], comm: mpi4py.MPI.Comm,
+        create: typing.Callable[[], _SparsityType]
+    ) -> _SparsityType:
+        """Get the cached sparsity pattern associated to the provided key, building and caching it if needed."""
+        key = (
+            *kind, tuple(id(form) for form in forms),
+            None if restrictions is None else tuple(id(restriction) for restriction in restrictions))
+        entry = self._entries.get(key, None)
+        local_hit = entry is not None
+        if comm.allreduce(int(local_hit), op=mpi4py.MPI.MIN) == 1:
+            assert entry is not None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            entry = ((forms, restrictions), create())
+            self.misses += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry[1]
+
+    def _evict(self) -> None:
+        """Evict least recently used sparsity patterns until the cache bound is satisfied."""
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
 
 
 # -- Vector assembly ---------------------------------------------------------
@@ -352,12 +960,18 @@ def _VecSubVectorWrapperBase(CppWrapperClass: type) -> type:
         """Wrap a PETSc Vec object."""
 
         def __init__(  # type: ignore[no-any-unimported]
-            self, b: petsc4py.PETSc.Vec, unrestricted_index_set: petsc4py.PETSc.IS,
+            self, b: petsc4py.PETSc.Vec,
+            unrestricted_index_set: typing.Union[petsc4py.PETSc.IS, mcpp.la.petsc.VecSubVectorTransferPlan],
             restricted_index_set: typing.Optional[petsc4py.PETSc.IS] = None,
-            unrestricted_to_restricted: typing.Optional[dict[int, int]] = None,
+            unrestricted_to_restricted: typing.Optional[np.typing.NDArray[np.int32]] = None,
             unrestricted_to_restricted_bs: typing.Optional[int] = None
         ) -> None:
-            if restricted_index_set is None:
+            if isinstance(unrestricted_index_set, mcpp.la.petsc.VecSubVectorTransferPlan):
+                assert restricted_index_set is None
+                assert unrestricted_to_restricted is None
+                assert unrestricted_to_restricted_bs is None
+                self._cpp_object = CppWrapperClass(b, unrestricted_index_set)
+            elif restricted_index_set is None:
                 assert unrestricted_to_restricted is None
                 assert unrestricted_to_restricted_bs is None
                 self._cpp_object = CppWrapperClass(b, unrestricted_index_set)
@@ -374,8 +988,8 @@ def _VecSubVectorWrapperBase(CppWrapperClass: type) -> type:
             self, exception_type: type[BaseException], exception_value: BaseException,
             traceback: types.TracebackType
         ) -> None:
-            """Do nothing when leaving the context."""
-            pass
+            """Restore the Vec content when leaving the context, or release the view of it."""
+            self._cpp_object.restore()
 
     return _VecSubVectorWrapperBase_Class
 
@@ -383,13 +997,7 @@ def _VecSubVectorWrapperBase(CppWrapperClass: type) -> type:
 _VecSubVectorReadWrapper = _VecSubVectorWrapperBase(mcpp.la.petsc.VecSubVectorReadWrapper)
 
 
-class _VecSubVectorWrapper(_VecSubVectorWrapperBase(mcpp.la.petsc.VecSubVectorWrapper)):  # type: ignore[misc]
-    def __exit__(
-        self, exception_type: type[BaseException], exception_value: BaseException,
-        traceback: types.TracebackType
-    ) -> None:
-        """Restore the Vec content when leaving the context."""
-        self._cpp_object.restore()
+_VecSubVectorWrapper = _VecSubVectorWrapperBase(mcpp.la.petsc.VecSubVectorWrapper)
 
 
 def VecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
@@ -408,7 +1016,7 @@ def VecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
             else:
                 if restriction is None:  # pragma: no cover
                     index_map = (dofmap.index_map, dofmap.index_map_bs)
-                    index_set = mcpp.la.petsc.create_index_sets(
+                    index_set = index_set_cache.index_sets(
                         [index_map], [dofmap.index_map_bs], ghosted=ghosted,
                         ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)[0]
                     self._wrapper = _VecSubVectorWrapperClass(b, index_set)
@@ -419,14 +1027,14 @@ def VecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
                 else:
                     assert _same_dofmap(dofmap, restriction.dofmap)
                     unrestricted_index_map = (dofmap.index_map, dofmap.index_map_bs)
-                    unrestricted_index_set = mcpp.la.petsc.create_index_sets(
+                    unrestricted_index_set = index_set_cache.index_sets(
                         [unrestricted_index_map], [dofmap.index_map_bs], ghosted=ghosted,
                         ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)[0]
                     restricted_index_map = (restriction.index_map, restriction.index_map_bs)
-                    restricted_index_set = mcpp.la.petsc.create_index_sets(
+                    restricted_index_set = index_set_cache.index_sets(
                         [restricted_index_map], [restriction.index_map_bs], ghosted=ghosted,
                         ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)[0]
-                    unrestricted_to_restricted = restriction.unrestricted_to_restricted
+                    unrestricted_to_restricted = restriction.unrestricted_to_restricted_array
                     unrestricted_to_restricted_bs = restriction.index_map_bs
                     self._wrapper = _VecSubVectorWrapperClass(
                         b, unrestricted_index_set, restricted_index_set,
@@ -451,9 +1059,6 @@ def VecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
             """Restore the Vec content when leaving the context."""
             if self._wrapper is not None:
                 self._wrapper.__exit__(exception_type, exception_value, traceback)
-                self._unrestricted_index_set.destroy()
-                if self._restricted_index_set is not None:
-                    self._restricted_index_set.destroy()
 
     return VecSubVectorWrapperBase_Class
 
@@ -474,43 +1079,25 @@ def BlockVecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
             self, b: typing.Union[petsc4py.PETSc.Vec, None],
             dofmaps: list[dcpp.fem.DofMap],
             restriction: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None,
-            ghosted: bool = True
+            ghosted: bool = True, layout: typing.Optional[BlockLayout] = None
         ) -> None:
             self._b = b
             self._len = len(dofmaps)
             if b is not None:
-                if restriction is None:
-                    index_maps = [(dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps]
-                    index_sets = mcpp.la.petsc.create_index_sets(
-                        index_maps, [1] * len(index_maps), ghosted=ghosted,
-                        ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
-                    self._unrestricted_index_sets = index_sets
-                    self._restricted_index_sets = None
-                    self._unrestricted_to_restricted = None
-                    self._unrestricted_to_restricted_bs = None
+                if layout is None:
+                    layout = BlockLayout(dofmaps, restriction)
+                    self._owned_layout: typing.Optional[BlockLayout] = layout
                 else:
-                    assert len(dofmaps) == len(restriction)
-                    assert all([
-                        _same_dofmap(dofmap, restriction_.dofmap)
-                        for (dofmap, restriction_) in zip(dofmaps, restriction)])
-                    unrestricted_index_maps = [
-                        (dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps]
-                    unrestricted_index_sets = mcpp.la.petsc.create_index_sets(
-                        unrestricted_index_maps, [1] * len(unrestricted_index_maps),
-                        ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
-                    restricted_index_maps = [
-                        (restriction_.index_map, restriction_.index_map_bs) for restriction_ in restriction]
-                    restricted_index_sets = mcpp.la.petsc.create_index_sets(
-                        restricted_index_maps, [1] * len(restricted_index_maps),
-                        ghosted=ghosted, ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
-                    unrestricted_to_restricted = [
-                        restriction_.unrestricted_to_restricted for restriction_ in restriction]
-                    unrestricted_to_restricted_bs = [
-                        restriction_.index_map_bs for restriction_ in restriction]
-                    self._unrestricted_index_sets = unrestricted_index_sets
-                    self._restricted_index_sets = restricted_index_sets
-                    self._unrestricted_to_restricted = unrestricted_to_restricted
-                    self._unrestricted_to_restricted_bs = unrestricted_to_restricted_bs
+                    assert len(layout) == len(dofmaps)
+                    assert layout.restricted == (restriction is not None)
+                    self._owned_layout = None
+                if not layout.restricted:
+                    self._unrestricted_index_sets = layout.index_sets(
+                        False, ghosted=ghosted, ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
+                    self._transfer_plans = None
+                else:
+                    self._unrestricted_index_sets = None
+                    self._transfer_plans = layout.transfer_plans(ghosted)
 
         def __iter__(self) -> typing.Optional[  # type: ignore[no-any-unimported, return]
                 typing.Iterator[np.typing.NDArray[petsc4py.PETSc.ScalarType]]]:
@@ -520,18 +1107,12 @@ def BlockVecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
                     if self._b is None:
                         yield None
                     else:
-                        if self._restricted_index_sets is None:
-                            assert self._unrestricted_to_restricted is None
-                            assert self._unrestricted_to_restricted_bs is None
+                        if self._transfer_plans is None:
+                            assert self._unrestricted_index_sets is not None
                             wrapper = _VecSubVectorWrapperClass(
                                 self._b, self._unrestricted_index_sets[index])
                         else:
-                            assert self._unrestricted_to_restricted is not None
-                            assert self._unrestricted_to_restricted_bs is not None
-                            wrapper = _VecSubVectorWrapperClass(
-                                self._b, self._unrestricted_index_sets[index],
-                                self._restricted_index_sets[index], self._unrestricted_to_restricted[index],
-                                self._unrestricted_to_restricted_bs[index])
+                            wrapper = _VecSubVectorWrapperClass(self._b, self._transfer_plans[index])
                         yield wrapper_stack.enter_context(wrapper)
 
         def __enter__(self) -> "BlockVecSubVectorWrapperBase_Class":
@@ -543,12 +1124,8 @@ def BlockVecSubVectorWrapperBase(_VecSubVectorWrapperClass: type) -> type:
             traceback: types.TracebackType
         ) -> None:
             """Clean up when leaving the context."""
-            if self._b is not None:
-                for index_set in self._unrestricted_index_sets:
-                    index_set.destroy()
-                if self._restricted_index_sets is not None:
-                    for index_set in self._restricted_index_sets:
-                        index_set.destroy()
+            if self._b is not None and self._owned_layout is not None:
+                self._owned_layout.destroy()
 
     return BlockVecSubVectorWrapperBase_Class
 
@@ -626,6 +1203,105 @@ NestVecSubVectorReadWrapper = NestVecSubVectorWrapperBase(VecSubVectorReadWrappe
 NestVecSubVectorWrapper = NestVecSubVectorWrapperBase(VecSubVectorWrapper)
 
 
+def _get_vec_scatter(  # type: ignore[no-any-unimported]
+    restriction: mcpp.fem.DofMapRestriction, x_full_local: petsc4py.PETSc.Vec,
+    x_restricted_local: petsc4py.PETSc.Vec, ghosted: bool
+) -> petsc4py.PETSc.Scatter:
+    """Get the scatter from the local form of an unrestricted vector to the local form of a restricted vector."""
+    try:
+        vec_scatters = restriction._vec_scatters
+    except AttributeError:
+        vec_scatters = dict()
+        try:
+            restriction._vec_scatters = vec_scatters
+        except AttributeError:  # pragma: no cover
+            pass  # the scatter cannot be attached to the restriction, and will be recomputed on the next call
+
+    if ghosted not in vec_scatters:
+        index_map = restriction.index_map
+        bs = restriction.index_map_bs
+        num_dofs = index_map.size_local + (index_map.num_ghosts if ghosted else 0)
+        unrestricted_index_set = petsc4py.PETSc.IS().createBlock(
+            bs, restriction.restricted_to_unrestricted_array[:num_dofs], comm=petsc4py.PETSc.COMM_SELF)
+        restricted_index_set = petsc4py.PETSc.IS().createStride(
+            num_dofs * bs, first=0, step=1, comm=petsc4py.PETSc.COMM_SELF)
+        vec_scatters[ghosted] = petsc4py.PETSc.Scatter().create(
+            x_full_local, unrestricted_index_set, x_restricted_local, restricted_index_set)
+        unrestricted_index_set.destroy()
+        restricted_index_set.destroy()
+    return vec_scatters[ghosted]
+
+
+def restrict(  # type: ignore[no-any-unimported]
+    x_full: petsc4py.PETSc.Vec, x_restricted: petsc4py.PETSc.Vec, restriction: mcpp.fem.DofMapRestriction,
+    ghosted: bool = True
+) -> None:
+    """
+    Copy the active entries of an unrestricted vector into a restricted vector.
+
+    The scatter between the two vectors is computed on the first call, and attached to the restriction, so that
+    subsequent calls only perform an indexed copy between the local forms of the two vectors, without any
+    communication.
+
+    Parameters
+    ----------
+    x_full
+        A ghosted vector with the layout of the unrestricted dofmap, e.g. the vector of a dolfinx.fem.Function.
+    x_restricted
+        A ghosted vector with the layout of the restriction, e.g. as returned by create_vector.
+    restriction
+        A dofmap restriction.
+    ghosted
+        If True, ghost entries are copied as well. Otherwise, only owned entries are copied, and ghost
+        entries of `x_restricted` are left unchanged.
+    """
+    with x_full.localForm() as x_full_local, x_restricted.localForm() as x_restricted_local:
+        scatter = _get_vec_scatter(restriction, x_full_local, x_restricted_local, ghosted)
+        scatter.scatter(
+            x_full_local, x_restricted_local, addv=petsc4py.PETSc.InsertMode.INSERT_VALUES,
+            mode=petsc4py.PETSc.ScatterMode.FORWARD)
+
+
+def extend(  # type: ignore[no-any-unimported]
+    x_restricted: petsc4py.PETSc.Vec, x_full: petsc4py.PETSc.Vec, restriction: mcpp.fem.DofMapRestriction,
+    ghosted: bool = True
+) -> None:
+    """
+    Copy the entries of a restricted vector into the active entries of an unrestricted vector.
+
+    Entries of `x_full` corresponding to inactive dofs are left unchanged. The scatter between the two vectors
+    is shared with restrict.
+
+    Parameters
+    ----------
+    x_restricted
+        A ghosted vector with the layout of the restriction, e.g. as returned by create_vector.
+    x_full
+        A ghosted vector with the layout of the unrestricted dofmap, e.g. the vector of a dolfinx.fem.Function.
+    restriction
+        A dofmap restriction.
+    ghosted
+        If True, ghost entries are copied as well. Otherwise, only owned entries are copied, and ghost
+        entries of `x_full` are left unchanged.
+    """
+    with x_full.localForm() as x_full_local, x_restricted.localForm() as x_restricted_local:
+        scatter = _get_vec_scatter(restriction, x_full_local, x_restricted_local, ghosted)
+        scatter.scatter(
+            x_restricted_local, x_full_local, addv=petsc4py.PETSc.InsertMode.INSERT_VALUES,
+            mode=petsc4py.PETSc.ScatterMode.REVERSE)
+
+
+def _assemble_vector_restricted(  # type: ignore[no-any-unimported]
+    b: np.typing.NDArray[petsc4py.PETSc.ScalarType], L: dolfinx.fem.Form,
+    constants: typing.Optional[DolfinxConstantsType], coeffs: typing.Optional[DolfinxCoefficientsType],
+    restriction: mcpp.fem.DofMapRestriction
+) -> None:
+    """Assemble a linear form into an unrestricted array, only running kernels on active entities."""
+    constants = dcpp.fem.pack_constants(L._cpp_object) if constants is None else constants
+    coeffs = dcpp.fem.pack_coefficients(L._cpp_object) if coeffs is None else coeffs
+    mcpp.fem.assemble_vector_restricted(b, L._cpp_object, constants, coeffs, restriction)
+
+
 @functools.singledispatch
 def assemble_vector(  # type: ignore[no-any-unimported]
     L: dolfinx.fem.Form,
@@ -698,7 +1374,7 @@ def _(  # type: ignore[no-any-unimported]
             dolfinx.fem.assemble.assemble_vector(b_local.array_w, L, constants, coeffs)  # type: ignore[call-arg]
     else:
         with VecSubVectorWrapper(b, L.function_spaces[0].dofmap, restriction) as b_sub:
-            dolfinx.fem.assemble.assemble_vector(b_sub, L, constants, coeffs)  # type: ignore[call-arg]
+            _assemble_vector_restricted(b_sub, L, constants, coeffs, restriction)
     return b
 
 
@@ -778,8 +1454,11 @@ def _(  # type: ignore[no-any-unimported]
     function_spaces = _get_block_function_spaces(L)
     dofmaps = [function_space.dofmap for function_space in function_spaces]
     with NestVecSubVectorWrapper(b, dofmaps, restriction) as nest_b:
-        for b_sub, L_sub, constant, coeff in zip(nest_b, L, constants, coeffs):
-            dolfinx.fem.assemble.assemble_vector(b_sub, L_sub, constant, coeff)  # type: ignore[call-arg]
+        for i, (b_sub, L_sub, constant, coeff) in enumerate(zip(nest_b, L, constants, coeffs)):
+            if restriction is None:
+                dolfinx.fem.assemble.assemble_vector(b_sub, L_sub, constant, coeff)  # type: ignore[call-arg]
+            else:
+                _assemble_vector_restricted(b_sub, L_sub, constant, coeff, restriction[i])
     return b
 
 
@@ -794,7 +1473,8 @@ def assemble_vector_block(  # type: ignore[no-any-unimported]
     constants_a: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxConstantsType]]]] = None,
     coeffs_a: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxCoefficientsType]]]] = None,
     restriction: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None,
-    restriction_x0: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None
+    restriction_x0: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None,
+    layout: typing.Optional[BlockLayout] = None, layout_x0: typing.Optional[BlockLayout] = None
 ) -> petsc4py.PETSc.Vec:
     """
     Assemble linear forms into a new block PETSc vector.
@@ -818,6 +1498,9 @@ def assemble_vector_block(  # type: ignore[no-any-unimported]
         Coefficients that appear in the form. If not provided, any required coefficients will be computed.
     restriction, restriction_x0
         A dofmap restriction. If not provided, the unrestricted tensor will be assembled.
+    layout, layout_x0
+        The block layout associated to `restriction` and `restriction_x0`. If not provided, it will be
+        computed and destroyed within this call.
 
     Returns
     -------
@@ -833,7 +1516,7 @@ def assemble_vector_block(  # type: ignore[no-any-unimported]
         b_local.set(0.0)
     return assemble_vector_block(  # type: ignore[call-arg]
         b, L, a, bcs, x0, alpha, constants_L, coeffs_L, constants_a, coeffs_a,  # type: ignore[arg-type]
-        restriction, restriction_x0)
+        restriction, restriction_x0, layout, layout_x0)
 
 
 @assemble_vector_block.register
@@ -848,7 +1531,8 @@ def _(  # type: ignore[no-any-unimported]
     constants_a: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxConstantsType]]]] = None,
     coeffs_a: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxCoefficientsType]]]] = None,
     restriction: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None,
-    restriction_x0: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None
+    restriction_x0: typing.Optional[list[mcpp.fem.DofMapRestriction]] = None,
+    layout: typing.Optional[BlockLayout] = None, layout_x0: typing.Optional[BlockLayout] = None
 ) -> petsc4py.PETSc.Vec:
     """
     Assemble linear forms into an existing block PETSc vector.
@@ -874,6 +1558,9 @@ def _(  # type: ignore[no-any-unimported]
         Coefficients that appear in the form. If not provided, any required coefficients will be computed.
     restriction, restriction_x0
         A dofmap restriction. If not provided, the unrestricted tensor will be assembled.
+    layout, layout_x0
+        The block layout associated to `restriction` and `restriction_x0`. If not provided, it will be
+        computed and destroyed within this call.
 
     Returns
     -------
@@ -902,27 +1589,42 @@ def _(  # type: ignore[no-any-unimported]
     dofmaps = [function_space.dofmap for function_space in function_spaces[0]]
     dofmaps_x0 = [function_space.dofmap for function_space in function_spaces[1]]
 
+    owned_layouts = list()
+    if layout is None:
+        layout = BlockLayout(dofmaps, restriction)
+        owned_layouts.append(layout)
+    if layout_x0 is None:
+        layout_x0 = BlockLayout(dofmaps_x0, restriction_x0)
+        owned_layouts.append(layout_x0)
+
     bcs_cpp = [bc._cpp_object for bc in bcs]
     bcs1 = dolfinx.fem.bcs_by_block(function_spaces[1], bcs_cpp)
-    with BlockVecSubVectorWrapper(b, dofmaps, restriction) as block_b, \
-            BlockVecSubVectorReadWrapper(x0, dofmaps_x0, restriction_x0) as block_x0:
+    with BlockVecSubVectorWrapper(b, dofmaps, restriction, layout=layout) as block_b, \
+            BlockVecSubVectorReadWrapper(x0, dofmaps_x0, restriction_x0, layout=layout_x0) as block_x0:
         if x0 is not None:
             block_x0_as_list = [x0_sub.copy() for x0_sub in block_x0]
         else:
             block_x0_as_list = []
-        for b_sub, L_sub, a_sub, constant_L, coeff_L, constant_a, coeff_a in zip(
-                block_b, L, a, constants_L, coeffs_L, constants_a, coeffs_a):
-            dcpp.fem.assemble_vector(b_sub, L_sub._cpp_object, constant_L, coeff_L)
+        for i, (b_sub, L_sub, a_sub, constant_L, coeff_L, constant_a, coeff_a) in enumerate(zip(
+                block_b, L, a, constants_L, coeffs_L, constants_a, coeffs_a)):
+            if restriction is None:
+                dcpp.fem.assemble_vector(b_sub, L_sub._cpp_object, constant_L, coeff_L)
+            else:
+                mcpp.fem.assemble_vector_restricted(
+                    b_sub, L_sub._cpp_object, constant_L, coeff_L, restriction[i])
             a_sub_cpp = [None if form is None else form._cpp_object for form in a_sub]
             dcpp.fem.apply_lifting(b_sub, a_sub_cpp, constant_a, coeff_a, bcs1, block_x0_as_list, alpha)
     b.ghostUpdate(addv=petsc4py.PETSc.InsertMode.ADD, mode=petsc4py.PETSc.ScatterMode.REVERSE)
 
     bcs0 = dolfinx.fem.bcs_by_block(function_spaces[0], bcs_cpp)
-    with BlockVecSubVectorWrapper(b, dofmaps, restriction) as block_b, \
-            BlockVecSubVectorReadWrapper(x0, dofmaps_x0, restriction_x0) as block_x0:
+    with BlockVecSubVectorWrapper(b, dofmaps, restriction, layout=layout) as block_b, \
+            BlockVecSubVectorReadWrapper(x0, dofmaps_x0, restriction_x0, layout=layout_x0) as block_x0:
         for b_sub, bcs0_sub, x0_sub in zip(block_b, bcs0, block_x0):
             for bc0_sub in bcs0_sub:
                 bc0_sub.set(b_sub, x0_sub, alpha)
+
+    for owned_layout in owned_layouts:
+        owned_layout.destroy()
     return b
 
 
@@ -935,19 +1637,23 @@ class _MatSubMatrixWrapper:
     def __init__(  # type: ignore[no-any-unimported]
         self, A: petsc4py.PETSc.Mat, unrestricted_index_sets: tuple[petsc4py.PETSc.IS, petsc4py.PETSc.IS],
         restricted_index_sets: typing.Optional[tuple[petsc4py.PETSc.IS, petsc4py.PETSc.IS]] = None,
-        unrestricted_to_restricted: typing.Optional[tuple[dict[int, int], dict[int, int]]] = None,
-        unrestricted_to_restricted_bs: typing.Optional[tuple[int, int]] = None
+        unrestricted_to_restricted: typing.Optional[
+            tuple[np.typing.NDArray[np.int32], np.typing.NDArray[np.int32]]] = None,
+        unrestricted_to_restricted_bs: typing.Optional[tuple[int, int]] = None,
+        unrestricted_to_restricted_ids: typing.Optional[tuple[int, int]] = None
     ) -> None:
         if restricted_index_sets is None:
             assert unrestricted_to_restricted is None
             assert unrestricted_to_restricted_bs is None
+            assert unrestricted_to_restricted_ids is None
             self._cpp_object = mcpp.la.petsc.MatSubMatrixWrapper(A, unrestricted_index_sets)
         else:
             self._cpp_object = mcpp.la.petsc.MatSubMatrixWrapper(
                 A, unrestricted_index_sets,
                 restricted_index_sets,
                 unrestricted_to_restricted,
-                unrestricted_to_restricted_bs)
+                unrestricted_to_restricted_bs,
+                unrestricted_to_restricted_ids)
         self._cpp_object_mat: typing.Optional[petsc4py.PETSc.Mat] = None  # type: ignore[no-any-unimported]
 
     def __enter__(self) -> petsc4py.PETSc.Mat:  # type: ignore[no-any-unimported]
@@ -978,8 +1684,8 @@ class MatSubMatrixWrapper:
                 (dofmaps[0].index_map, dofmaps[0].index_map_bs),
                 (dofmaps[1].index_map, dofmaps[1].index_map_bs))
             index_sets = (
-                mcpp.la.petsc.create_index_sets([index_maps[0]], [dofmaps[0].index_map_bs])[0],
-                mcpp.la.petsc.create_index_sets([index_maps[1]], [dofmaps[1].index_map_bs])[0])
+                index_set_cache.index_sets([index_maps[0]], [dofmaps[0].index_map_bs])[0],
+                index_set_cache.index_sets([index_maps[1]], [dofmaps[1].index_map_bs])[0])
             self._wrapper = _MatSubMatrixWrapper(A, index_sets)
             self._unrestricted_index_sets = index_sets
             self._restricted_index_sets = None
@@ -992,27 +1698,27 @@ class MatSubMatrixWrapper:
                 (dofmaps[0].index_map, dofmaps[0].index_map_bs),
                 (dofmaps[1].index_map, dofmaps[1].index_map_bs))
             unrestricted_index_sets = (
-                mcpp.la.petsc.create_index_sets(
+                index_set_cache.index_sets(
                     [unrestricted_index_maps[0]], [dofmaps[0].index_map_bs])[0],
-                mcpp.la.petsc.create_index_sets(
+                index_set_cache.index_sets(
                     [unrestricted_index_maps[1]], [dofmaps[1].index_map_bs])[0])
             restricted_index_maps = (
                 (restriction[0].index_map, restriction[0].index_map_bs),
                 (restriction[1].index_map, restriction[1].index_map_bs))
             restricted_index_sets = (
-                mcpp.la.petsc.create_index_sets(
+                index_set_cache.index_sets(
                     [restricted_index_maps[0]], [restriction[0].index_map_bs])[0],
-                mcpp.la.petsc.create_index_sets(
+                index_set_cache.index_sets(
                     [restricted_index_maps[1]], [restriction[1].index_map_bs])[0])
             unrestricted_to_restricted = (
-                restriction[0].unrestricted_to_restricted,
-                restriction[1].unrestricted_to_restricted)
+                restriction[0].unrestricted_to_restricted_array,
+                restriction[1].unrestricted_to_restricted_array)
             unrestricted_to_restricted_bs = (
                 restriction[0].index_map_bs,
                 restriction[1].index_map_bs)
             self._wrapper = _MatSubMatrixWrapper(
                 A, unrestricted_index_sets, restricted_index_sets, unrestricted_to_restricted,
-                unrestricted_to_restricted_bs)
+                unrestricted_to_restricted_bs, (restriction[0].id, restriction[1].id))
             self._unrestricted_index_sets = unrestricted_index_sets
             self._restricted_index_sets = restricted_index_sets
             self._unrestricted_to_restricted = unrestricted_to_restricted
@@ -1028,11 +1734,6 @@ class MatSubMatrixWrapper:
     ) -> None:
         """Restore submatrix content."""
         self._wrapper.__exit__(exception_type, exception_value, traceback)
-        self._unrestricted_index_sets[0].destroy()
-        self._unrestricted_index_sets[1].destroy()
-        if self._restricted_index_sets is not None:
-            self._restricted_index_sets[0].destroy()
-            self._restricted_index_sets[1].destroy()
 
 
 class BlockMatSubMatrixWrapper:
@@ -1042,54 +1743,41 @@ class BlockMatSubMatrixWrapper:
         self, A: petsc4py.PETSc.Mat,
         dofmaps: tuple[list[dcpp.fem.DofMap], list[dcpp.fem.DofMap]],
         restriction: typing.Optional[
-            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None
+            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+        layout: typing.Optional[tuple[BlockLayout, BlockLayout]] = None
     ) -> None:
         self._A = A
         assert len(dofmaps) == 2
+        if layout is None:
+            if restriction is None:
+                layout = (BlockLayout(dofmaps[0]), BlockLayout(dofmaps[1]))
+            else:
+                assert len(restriction) == 2
+                layout = (BlockLayout(dofmaps[0], restriction[0]), BlockLayout(dofmaps[1], restriction[1]))
+            self._owned_layout: typing.Optional[tuple[BlockLayout, BlockLayout]] = layout
+        else:
+            assert len(layout) == 2
+            for i in range(2):
+                assert len(layout[i]) == len(dofmaps[i])
+                assert layout[i].restricted == (restriction is not None)
+            self._owned_layout = None
+        self._unrestricted_index_sets = (layout[0].index_sets(False), layout[1].index_sets(False))
         if restriction is None:
-            index_maps = (
-                [(dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps[0]],
-                [(dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps[1]])
-            index_sets = (
-                mcpp.la.petsc.create_index_sets(index_maps[0], [1] * len(index_maps[0])),
-                mcpp.la.petsc.create_index_sets(index_maps[1], [1] * len(index_maps[1])))
-            self._unrestricted_index_sets = index_sets
             self._restricted_index_sets = None
             self._unrestricted_to_restricted = None
             self._unrestricted_to_restricted_bs = None
+            self._unrestricted_to_restricted_ids = None
         else:
-            assert len(restriction) == 2
-            for i in range(2):
-                assert len(dofmaps[i]) == len(restriction[i])
-                assert all(
-                    [_same_dofmap(dofmap, restriction_.dofmap)
-                     for (dofmap, restriction_) in zip(dofmaps[i], restriction[i])])
-            unrestricted_index_maps = (
-                [(dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps[0]],
-                [(dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps[1]])
-            unrestricted_index_sets = (
-                mcpp.la.petsc.create_index_sets(
-                    unrestricted_index_maps[0], [1] * len(unrestricted_index_maps[0])),
-                mcpp.la.petsc.create_index_sets(
-                    unrestricted_index_maps[1], [1] * len(unrestricted_index_maps[1])))
-            restricted_index_maps = (
-                [(restriction_.index_map, restriction_.index_map_bs) for restriction_ in restriction[0]],
-                [(restriction_.index_map, restriction_.index_map_bs) for restriction_ in restriction[1]])
-            restricted_index_sets = (
-                mcpp.la.petsc.create_index_sets(
-                    restricted_index_maps[0], [1] * len(restricted_index_maps[0])),
-                mcpp.la.petsc.create_index_sets(
-                    restricted_index_maps[1], [1] * len(restricted_index_maps[1])))
-            unrestricted_to_restricted = (
-                [restriction_.unrestricted_to_restricted for restriction_ in restriction[0]],
-                [restriction_.unrestricted_to_restricted for restriction_ in restriction[1]])
-            unrestricted_to_restricted_bs = (
+            self._restricted_index_sets = (layout[0].index_sets(True), layout[1].index_sets(True))
+            self._unrestricted_to_restricted = (
+                [restriction_.unrestricted_to_restricted_array for restriction_ in restriction[0]],
+                [restriction_.unrestricted_to_restricted_array for restriction_ in restriction[1]])
+            self._unrestricted_to_restricted_bs = (
                 [restriction_.index_map_bs for restriction_ in restriction[0]],
                 [restriction_.index_map_bs for restriction_ in restriction[1]])
-            self._unrestricted_index_sets = unrestricted_index_sets
-            self._restricted_index_sets = restricted_index_sets
-            self._unrestricted_to_restricted = unrestricted_to_restricted
-            self._unrestricted_to_restricted_bs = unrestricted_to_restricted_bs
+            self._unrestricted_to_restricted_ids = (
+                [restriction_.id for restriction_ in restriction[0]],
+                [restriction_.id for restriction_ in restriction[1]])
 
     def __iter__(self) -> typing.Iterator[  # type: ignore[no-any-unimported]
             tuple[int, int, petsc4py.PETSc.Mat]]:
@@ -1104,13 +1792,16 @@ class BlockMatSubMatrixWrapper:
                     else:
                         assert self._unrestricted_to_restricted is not None
                         assert self._unrestricted_to_restricted_bs is not None
+                        assert self._unrestricted_to_restricted_ids is not None
                         wrapper = _MatSubMatrixWrapper(
                             self._A,
                             (self._unrestricted_index_sets[0][index0], self._unrestricted_index_sets[1][index1]),
                             (self._restricted_index_sets[0][index0], self._restricted_index_sets[1][index1]),
                             (self._unrestricted_to_restricted[0][index0], self._unrestricted_to_restricted[1][index1]),
                             (self._unrestricted_to_restricted_bs[0][index0],
-                             self._unrestricted_to_restricted_bs[1][index1]))
+                             self._unrestricted_to_restricted_bs[1][index1]),
+                            (self._unrestricted_to_restricted_ids[0][index0],
+                             self._unrestricted_to_restricted_ids[1][index1]))
                     yield (index0, index1, wrapper_stack.enter_context(wrapper))  # type: ignore[arg-type]
 
     def __enter__(self) -> "BlockMatSubMatrixWrapper":
@@ -1122,13 +1813,9 @@ class BlockMatSubMatrixWrapper:
         traceback: types.TracebackType
     ) -> None:
         """Clean up."""
-        for i in range(2):
-            for index_set in self._unrestricted_index_sets[i]:
-                index_set.destroy()
-        if self._restricted_index_sets is not None:
+        if self._owned_layout is not None:
             for i in range(2):
-                for index_set in self._restricted_index_sets[i]:
-                    index_set.destroy()
+                self._owned_layout[i].destroy()
 
 
 class NestMatSubMatrixWrapper:
@@ -1137,11 +1824,13 @@ class NestMatSubMatrixWrapper:
     def __init__(  # type: ignore[no-any-unimported]
         self, A: petsc4py.PETSc.Mat, dofmaps: tuple[list[dcpp.fem.DofMap], list[dcpp.fem.DofMap]],
         restriction: typing.Optional[
-            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None
+            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+        transposed_blocks: list[tuple[int, int]] = []
     ) -> None:
         self._A = A
         self._dofmaps = dofmaps
         self._restriction = restriction
+        self._transposed_blocks = transposed_blocks
 
     def __iter__(self) -> typing.Iterator[  # type: ignore[no-any-unimported]
             tuple[int, int, petsc4py.PETSc.Mat]]:
@@ -1149,6 +1838,9 @@ class NestMatSubMatrixWrapper:
         with contextlib.ExitStack() as wrapper_stack:
             for index0, _ in enumerate(self._dofmaps[0]):
                 for index1, _ in enumerate(self._dofmaps[1]):
+                    if (index0, index1) in self._transposed_blocks:
+                        # Implicit transposes are updated together with their counterpart
+                        continue
                     A_sub = self._A.getNestSubMatrix(index0, index1)
                     if self._restriction is None:
                         wrapper_content = A_sub
@@ -1267,9 +1959,10 @@ def _(  # type: ignore[no-any-unimported]
     else:
         dofmaps = (function_spaces[0].dofmap, function_spaces[1].dofmap)
 
-        # Assemble form
-        with MatSubMatrixWrapper(A, dofmaps, restriction) as A_sub:
-            dcpp.fem.petsc.assemble_matrix(A_sub, a._cpp_object, constants, coeffs, bcs_cpp)
+        # Assemble form on active entities, discarding inactive rows and columns of element matrices
+        # before insertion
+        mcpp.fem.petsc.assemble_matrix_restricted(
+            A, a._cpp_object, constants, coeffs, bcs_cpp, restriction)
 
         if function_spaces[0] is function_spaces[1]:
             # Flush to enable switch from add to set in the matrix
@@ -1289,7 +1982,8 @@ def assemble_matrix_nest(  # type: ignore[no-any-unimported]
     constants: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxConstantsType]]]] = None,
     coeffs: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxCoefficientsType]]]] = None,
     restriction: typing.Optional[
-        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+    transposed_blocks: list[tuple[int, int]] = []
 ) -> petsc4py.PETSc.Mat:
     """
     Assemble bilinear forms into a new nest PETSc matrix.
@@ -1310,14 +2004,17 @@ def assemble_matrix_nest(  # type: ignore[no-any-unimported]
         Coefficients that appear in the form. If not provided, any required coefficients will be computed.
     restriction
         A dofmap restriction. If not provided, the unrestricted tensor will be assembled.
+    transposed_blocks
+        Pairs (i, j) of indices of blocks which are the transpose of block (j, i), see create_matrix_nest.
 
     Returns
     -------
     :
         The assembled nest PETSc matrix.
     """
-    A = create_matrix_nest(a, restriction, mat_types)
-    return assemble_matrix_nest(A, a, bcs, diagonal, constants, coeffs, restriction)  # type: ignore[arg-type]
+    A = create_matrix_nest(a, restriction, mat_types, transposed_blocks=transposed_blocks)
+    return assemble_matrix_nest(  # type: ignore[arg-type]
+        A, a, bcs, diagonal, constants, coeffs, restriction, transposed_blocks)
 
 
 @assemble_matrix_nest.register
@@ -1329,7 +2026,8 @@ def _(  # type: ignore[no-any-unimported]
     constants: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxConstantsType]]]] = None,
     coeffs: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxCoefficientsType]]]] = None,
     restriction: typing.Optional[
-        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+    transposed_blocks: list[tuple[int, int]] = []
 ) -> petsc4py.PETSc.Mat:
     """
     Assemble bilinear forms into an existing nest PETSc matrix.
@@ -1350,12 +2048,16 @@ def _(  # type: ignore[no-any-unimported]
         Coefficients that appear in the form. If not provided, any required coefficients will be computed.
     restriction
         A dofmap restriction. If not provided, the unrestricted tensor will be assembled.
+    transposed_blocks
+        Pairs (i, j) of indices of blocks which are the transpose of block (j, i). Such blocks must be stored as
+        an implicit transpose, see create_matrix_nest, and are not assembled.
 
     Returns
     -------
     :
         The assembled nest PETSc matrix.
     """
+    _check_transposed_blocks(a, transposed_blocks)
     function_spaces = _get_block_function_spaces(a)
     dofmaps = (
         [function_space.dofmap for function_space in function_spaces[0]],
@@ -1369,13 +2071,22 @@ def _(  # type: ignore[no-any-unimported]
         {} if form is None else dcpp.fem.pack_coefficients(form._cpp_object)
         for form in forms] for forms in a] if coeffs is None else coeffs
     bcs_cpp = [bc._cpp_object for bc in bcs]
-    with NestMatSubMatrixWrapper(A, dofmaps, restriction) as nest_A:
-        for i, j, A_sub in nest_A:
+    for i in range(len(dofmaps[0])):
+        for j in range(len(dofmaps[1])):
             a_sub = a[i][j]
-            if a_sub is not None:
+            if (i, j) in transposed_blocks:
+                continue
+            elif a_sub is not None:
                 const_sub = constants[i][j]
                 coeff_sub = coeffs[i][j]
-                dcpp.fem.petsc.assemble_matrix(A_sub, a_sub._cpp_object, const_sub, coeff_sub, bcs_cpp)
+                A_sub = A.getNestSubMatrix(i, j)
+                if restriction is None:
+                    dcpp.fem.petsc.assemble_matrix(A_sub, a_sub._cpp_object, const_sub, coeff_sub, bcs_cpp)
+                else:
+                    mcpp.fem.petsc.assemble_matrix_restricted(
+                        A_sub, a_sub._cpp_object, const_sub, coeff_sub, bcs_cpp,
+                        (restriction[0][i], restriction[1][j]))
+                A_sub.destroy()
             elif i == j:  # pragma: no cover
                 for bc in bcs:
                     if function_spaces[0][i].contains(bc.function_space):
@@ -1387,7 +2098,7 @@ def _(  # type: ignore[no-any-unimported]
     A.assemble(petsc4py.PETSc.Mat.AssemblyType.FLUSH)
 
     # Set diagonal
-    with NestMatSubMatrixWrapper(A, dofmaps, restriction) as nest_A:
+    with NestMatSubMatrixWrapper(A, dofmaps, restriction, transposed_blocks) as nest_A:
         for i, j, A_sub in nest_A:
             if function_spaces[0][i] is function_spaces[1][j]:
                 a_sub = a[i][j]
@@ -1405,7 +2116,9 @@ def assemble_matrix_block(  # type: ignore[no-any-unimported]
     constants: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxConstantsType]]]] = None,
     coeffs: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxCoefficientsType]]]] = None,
     restriction: typing.Optional[
-        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+    layout: typing.Optional[tuple[BlockLayout, BlockLayout]] = None, symmetric: bool = False,
+    transposed_blocks: list[tuple[int, int]] = []
 ) -> petsc4py.PETSc.Mat:
     """
     Assemble bilinear forms into a new block PETSc matrix.
@@ -1426,14 +2139,23 @@ def assemble_matrix_block(  # type: ignore[no-any-unimported]
         Coefficients that appear in the form. If not provided, any required coefficients will be computed.
     restriction
         A dofmap restriction. If not provided, the unrestricted tensor will be assembled.
+    layout
+        The block layouts of rows and columns associated to `restriction`. If not provided, they will be
+        computed and destroyed within this call.
+    symmetric
+        Declare that the block bilinear form is symmetric, see create_matrix_block.
+    transposed_blocks
+        Pairs (i, j) of indices of blocks which are the transpose of block (j, i), see the assembly into an
+        existing block PETSc matrix.
 
     Returns
     -------
     :
         The assembled block PETSc matrix.
     """
-    A = create_matrix_block(a, restriction, mat_type)
-    return assemble_matrix_block(A, a, bcs, diagonal, constants, coeffs, restriction)  # type: ignore[arg-type]
+    A = create_matrix_block(a, restriction, mat_type, symmetric=symmetric)
+    return assemble_matrix_block(  # type: ignore[arg-type]
+        A, a, bcs, diagonal, constants, coeffs, restriction, layout, transposed_blocks)
 
 
 @assemble_matrix_block.register
@@ -1445,7 +2167,9 @@ def _(  # type: ignore[no-any-unimported]
     constants: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxConstantsType]]]] = None,
     coeffs: typing.Optional[typing.Sequence[typing.Sequence[typing.Optional[DolfinxCoefficientsType]]]] = None,
     restriction: typing.Optional[
-        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+    layout: typing.Optional[tuple[BlockLayout, BlockLayout]] = None,
+    transposed_blocks: list[tuple[int, int]] = []
 ) -> petsc4py.PETSc.Mat:
     """
     Assemble bilinear forms into an existing block PETSc matrix.
@@ -1466,12 +2190,19 @@ def _(  # type: ignore[no-any-unimported]
         Coefficients that appear in the form. If not provided, any required coefficients will be computed.
     restriction
         A dofmap restriction. If not provided, the unrestricted tensor will be assembled.
+    layout
+        The block layouts of rows and columns associated to `restriction`. If not provided, they will be
+        computed and destroyed within this call.
+    transposed_blocks
+        Pairs (i, j) of indices of blocks which are the transpose of block (j, i). The element matrices of
+        block (j, i) are computed once, and inserted in both blocks. The form `a[i][j]` must still be provided.
 
     Returns
     -------
     :
         The assembled block PETSc matrix.
     """
+    _check_transposed_blocks(a, transposed_blocks)
     constants = [[
         np.array([], dtype=petsc4py.PETSc.ScalarType) if form is None else dcpp.fem.pack_constants(form._cpp_object)
         for form in forms] for forms in a] if constants is None else constants
@@ -1483,33 +2214,263 @@ def _(  # type: ignore[no-any-unimported]
         [function_space.dofmap for function_space in function_spaces[0]],
         [function_space.dofmap for function_space in function_spaces[1]])
 
-    # Assemble form
+    if layout is None:
+        owned_layout: typing.Optional[tuple[BlockLayout, BlockLayout]] = (
+            BlockLayout(dofmaps[0], None if restriction is None else restriction[0]),
+            BlockLayout(dofmaps[1], None if restriction is None else restriction[1]))
+        layout = owned_layout
+    else:
+        owned_layout = None
+
+    # Assemble form. Insert by block when the block size of the submatrix agrees with the one of the dofmaps
     bcs_cpp = [bc._cpp_object for bc in bcs]
-    with BlockMatSubMatrixWrapper(A, dofmaps, restriction) as block_A:
-        for i, j, A_sub in block_A:
-            a_sub = a[i][j]
-            if a_sub is not None:
-                const_sub = constants[i][j]
-                coeff_sub = coeffs[i][j]
-                dcpp.fem.petsc.assemble_matrix(A_sub, a_sub._cpp_object, const_sub, coeff_sub, bcs_cpp, True)
-            elif i == j:  # pragma: no cover
+    skip_blocks, lower_transposed_blocks = _get_lower_blocks(a, A.getType(), A.comm.tompi4py())
+    if len(skip_blocks) > 0 or len(lower_transposed_blocks) > 0:
+        # Forms below the diagonal are never used with symmetric storage
+        transposed_blocks = lower_transposed_blocks
+    transposed_pairs = {(i, j): (j, i) for (i, j) in transposed_blocks}
+    transposed_pairs.update({(j, i): (i, j) for (i, j) in transposed_blocks})
+    unrolled = [[
+        not (layout[0].bs == dofmaps[0][i].index_map_bs and layout[1].bs == dofmaps[1][j].index_map_bs)
+        for j in range(len(dofmaps[1]))] for i in range(len(dofmaps[0]))]
+    for i in range(len(dofmaps[0])):
+        for j in range(len(dofmaps[1])):
+            if i == j and a[i][j] is None:  # pragma: no cover
                 for bc in bcs:
                     if function_spaces[0][i].contains(bc.function_space):
                         raise RuntimeError(
                             f"Diagonal sub-block ({i}, {j}) cannot be 'None' and have DirichletBC applied."
                             " Consider assembling a zero block.")
+    if restriction is not None:
+        # Insert element matrices directly in A, discarding inactive rows and columns before insertion
+        offsets = (layout[0].offsets(True), layout[1].offsets(True))
+        for i in range(len(dofmaps[0])):
+            for j in range(len(dofmaps[1])):
+                a_sub = a[i][j]
+                if (i, j) in skip_blocks or (i, j) in transposed_pairs or a_sub is None:
+                    continue
+                mcpp.fem.petsc.assemble_matrix_restricted(
+                    A, a_sub._cpp_object, constants[i][j], coeffs[i][j], bcs_cpp,
+                    (restriction[0][i], restriction[1][j]), (offsets[0][i], offsets[1][j]), unrolled[i][j])
+    if restriction is None or len(transposed_pairs) > 0:
+        with BlockMatSubMatrixWrapper(A, dofmaps, restriction, layout) as block_A:
+            pending_A_sub: dict[tuple[int, int], petsc4py.PETSc.Mat] = {}  # type: ignore[no-any-unimported]
+            for i, j, A_sub in block_A:
+                a_sub = a[i][j]
+                if (i, j) in skip_blocks:
+                    continue
+                elif (i, j) in transposed_pairs:
+                    # Wait until both submatrices are available: the wrapper only restores them at the end
+                    ji = transposed_pairs[(i, j)]
+                    if ji not in pending_A_sub:
+                        pending_A_sub[(i, j)] = A_sub
+                        continue
+                    A_pair = {(i, j): A_sub, ji: pending_A_sub.pop(ji)}
+                    (s, t) = (ji, (i, j)) if (i, j) in transposed_blocks else ((i, j), ji)
+                    mcpp.fem.petsc.assemble_matrix_and_transpose(
+                        A_pair[s], A_pair[t], a[s[0]][s[1]]._cpp_object, constants[s[0]][s[1]],
+                        coeffs[s[0]][s[1]], bcs_cpp, unrolled[s[0]][s[1]] or unrolled[t[0]][t[1]])
+                elif restriction is None and a_sub is not None:
+                    dcpp.fem.petsc.assemble_matrix(
+                        A_sub, a_sub._cpp_object, constants[i][j], coeffs[i][j], bcs_cpp, unrolled[i][j])
 
     # Flush to enable switch from add to set in the matrix
     A.assemble(petsc4py.PETSc.Mat.AssemblyType.FLUSH)
 
     # Set diagonal
-    with BlockMatSubMatrixWrapper(A, dofmaps, restriction) as block_A:
+    with BlockMatSubMatrixWrapper(A, dofmaps, restriction, layout) as block_A:
         for i, j, A_sub in block_A:
             if function_spaces[0][i] is function_spaces[1][j]:
                 a_sub = a[i][j]
                 if a_sub is not None:
                     dcpp.fem.petsc.insert_diagonal(A_sub, function_spaces[0][i], bcs_cpp, diagonal)
 
+    if owned_layout is not None:
+        for i in range(2):
+            owned_layout[i].destroy()
+    return A
+
+
+# -- Matrix-free operators ---------------------------------------------------
+
+class _MatrixFreeBlockContext:
+    """PETSc python context of a matrix-free block operator, see create_matrix_free_block."""
+
+    def __init__(  # type: ignore[no-any-unimported]
+        self, a: list[list[typing.Optional[ufl.Form]]],
+        restriction: typing.Optional[
+            tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]],
+        bcs: list[dolfinx.fem.DirichletBC], diagonal: float,
+        form_compiler_options: typing.Optional[dict[str, typing.Any]],
+        jit_options: typing.Optional[dict[str, typing.Any]]
+    ) -> None:
+        rows, cols = len(a), len(a[0])
+        assert all(len(a_i) == cols for a_i in a)
+        self._function_spaces = (
+            [next(a_ij for a_ij in a[i] if a_ij is not None).arguments()[0].ufl_function_space()
+             for i in range(rows)],
+            [next(a[i][j] for i in range(rows) if a[i][j] is not None).arguments()[1].ufl_function_space()
+             for j in range(cols)])
+        self._dofmaps = (
+            [function_space.dofmap for function_space in self._function_spaces[0]],
+            [function_space.dofmap for function_space in self._function_spaces[1]])
+        self._restriction = restriction
+        self._layout = (
+            BlockLayout(self._dofmaps[0], None if restriction is None else restriction[0]),
+            BlockLayout(self._dofmaps[1], None if restriction is None else restriction[1]))
+        self._diagonal = diagonal
+
+        # Compile the action of each row of bilinear forms on the (zero extension of the) input vector
+        self._u = [dolfinx.fem.Function(function_space) for function_space in self._function_spaces[1]]
+        self._action = dolfinx.fem.form(
+            [sum(ufl.action(a_ij, u_j) for (a_ij, u_j) in zip(a_i, self._u) if a_ij is not None) for a_i in a],
+            form_compiler_options=form_compiler_options, jit_options=jit_options)
+
+        # Compile the diagonal blocks whose row and column spaces coincide, and store their (restricted) dofmaps
+        self._square = [
+            i < cols and self._function_spaces[0][i] is self._function_spaces[1][i] for i in range(rows)]
+        self._diagonal_blocks = [
+            dolfinx.fem.form(a[i][i], form_compiler_options=form_compiler_options, jit_options=jit_options)
+            if self._square[i] and a[i][i] is not None else None for i in range(rows)]
+        self._diagonal_dofmaps = [
+            None if a_ii is None else _get_matrix_dofmaps(
+                a_ii, None if restriction is None else (restriction[0][i], restriction[1][i]))[3:]
+            for (i, a_ii) in enumerate(self._diagonal_blocks)]
+        self._diagonal_vec = dcpp.fem.petsc.create_vector_block(self._index_maps(0))
+
+        # Dirichlet dofs of each block, in the unrestricted local numbering, and the owned ones among them
+        self._bc_dofs = tuple(
+            [np.unique(np.concatenate(
+                [bc.dof_indices()[0] for bc in bcs if function_space.contains(bc.function_space)]
+                + [np.zeros(0, dtype=np.int32)])) for function_space in self._function_spaces[d]]
+            for d in range(2))
+        self._owned_bc_dofs = tuple(
+            [bc_dofs[bc_dofs < dofmap.index_map.size_local * dofmap.index_map_bs]
+             for (bc_dofs, dofmap) in zip(self._bc_dofs[d], self._dofmaps[d])]
+            for d in range(2))
+
+    def _index_maps(self, d: int) -> list[tuple[dcpp.common.IndexMap, int]]:  # type: ignore[no-any-unimported]
+        """Return the index maps of the rows (d = 0) or columns (d = 1) of the operator."""
+        if self._restriction is None:
+            return [(dofmap.index_map, dofmap.index_map_bs) for dofmap in self._dofmaps[d]]
+        else:
+            return [(restriction_.index_map, restriction_.index_map_bs) for restriction_ in self._restriction[d]]
+
+    def sizes(self) -> tuple[tuple[int, int], tuple[int, int]]:
+        """Return local and global sizes of rows and columns."""
+        return tuple(  # type: ignore[return-value]
+            (sum(bs * index_map.size_local for (index_map, bs) in self._index_maps(d)),
+             sum(bs * index_map.size_global for (index_map, bs) in self._index_maps(d)))
+            for d in range(2))
+
+    def createVecs(  # type: ignore[no-any-unimported]
+        self, mat: petsc4py.PETSc.Mat
+    ) -> tuple[petsc4py.PETSc.Vec, petsc4py.PETSc.Vec]:
+        """Create ghosted block vectors compatible with the columns and the rows of the operator."""
+        return (dcpp.fem.petsc.create_vector_block(self._index_maps(1)),
+                dcpp.fem.petsc.create_vector_block(self._index_maps(0)))
+
+    def mult(  # type: ignore[no-any-unimported]
+        self, mat: petsc4py.PETSc.Mat, x: petsc4py.PETSc.Vec, y: petsc4py.PETSc.Vec
+    ) -> None:
+        """Compute the action of the operator on x, and store it in y."""
+        x.ghostUpdate(addv=petsc4py.PETSc.InsertMode.INSERT, mode=petsc4py.PETSc.ScatterMode.FORWARD)
+        x_bc = list()
+        with BlockVecSubVectorReadWrapper(
+                x, self._dofmaps[1], None if self._restriction is None else self._restriction[1],
+                layout=self._layout[1]) as block_x:
+            for (u_j, x_j, bc_dofs_j, owned_bc_dofs_j) in zip(
+                    self._u, block_x, self._bc_dofs[1], self._owned_bc_dofs[1]):
+                u_j.x.array[:] = x_j
+                x_bc.append(x_j[owned_bc_dofs_j].copy())
+                u_j.x.array[bc_dofs_j] = 0.0
+
+        # Rows of Dirichlet dofs are set on the owning process and zeroed on ghosts, so that they are
+        # left untouched by the reverse scatter
+        with y.localForm() as y_local:
+            y_local.set(0.0)
+        with BlockVecSubVectorWrapper(
+                y, self._dofmaps[0], None if self._restriction is None else self._restriction[0],
+                layout=self._layout[0]) as block_y:
+            for (i, (y_i, action_i)) in enumerate(zip(block_y, self._action)):
+                if self._restriction is None:
+                    dolfinx.fem.assemble.assemble_vector(y_i, action_i)  # type: ignore[call-arg]
+                else:
+                    _assemble_vector_restricted(y_i, action_i, None, None, self._restriction[0][i])
+                y_i[self._bc_dofs[0][i]] = 0.0
+                if self._square[i]:
+                    y_i[self._owned_bc_dofs[0][i]] = self._diagonal * x_bc[i]
+        y.ghostUpdate(addv=petsc4py.PETSc.InsertMode.ADD, mode=petsc4py.PETSc.ScatterMode.REVERSE)
+
+    def getDiagonal(  # type: ignore[no-any-unimported]
+        self, mat: petsc4py.PETSc.Mat, d: petsc4py.PETSc.Vec
+    ) -> None:
+        """Compute the diagonal of the operator, and store it in d."""
+        with self._diagonal_vec.localForm() as diagonal_local:
+            diagonal_local.set(0.0)
+        with BlockVecSubVectorWrapper(
+                self._diagonal_vec, self._dofmaps[0], None if self._restriction is None else self._restriction[0],
+                layout=self._layout[0]) as block_diagonal:
+            for (i, (diagonal_i, a_ii)) in enumerate(zip(block_diagonal, self._diagonal_blocks)):
+                if a_ii is not None:
+                    mcpp.fem.assemble_diagonal_restricted(
+                        diagonal_i, a_ii._cpp_object, dcpp.fem.pack_constants(a_ii._cpp_object),
+                        dcpp.fem.pack_coefficients(a_ii._cpp_object), *self._diagonal_dofmaps[i])
+                    diagonal_i[self._bc_dofs[0][i]] = 0.0
+                    diagonal_i[self._owned_bc_dofs[0][i]] = self._diagonal
+        self._diagonal_vec.ghostUpdate(
+            addv=petsc4py.PETSc.InsertMode.ADD, mode=petsc4py.PETSc.ScatterMode.REVERSE)
+        self._diagonal_vec.copy(d)
+
+    def destroy(self, mat: petsc4py.PETSc.Mat) -> None:  # type: ignore[no-any-unimported]
+        """Destroy the block layouts and the work vector stored in the context."""
+        for layout in self._layout:
+            layout.destroy()
+        self._diagonal_vec.destroy()
+
+
+def create_matrix_free_block(  # type: ignore[no-any-unimported]
+    a: list[list[typing.Optional[ufl.Form]]],
+    restriction: typing.Optional[
+        tuple[list[mcpp.fem.DofMapRestriction], list[mcpp.fem.DofMapRestriction]]] = None,
+    bcs: list[dolfinx.fem.DirichletBC] = [], diagonal: float = 1.0,
+    form_compiler_options: typing.Optional[dict[str, typing.Any]] = None,
+    jit_options: typing.Optional[dict[str, typing.Any]] = None
+) -> petsc4py.PETSc.Mat:
+    """
+    Create a matrix-free (shell) block PETSc matrix representing the bilinear forms `a` with restriction `restriction`.
+
+    The matrix is never assembled: its product with a vector assembles the action of the bilinear forms,
+    and its diagonal is computed by accumulating the diagonal entries of the element matrices of the diagonal
+    blocks. The matrix has the same parallel layout as the block matrices returned by create_matrix_block, and
+    its product can be applied to (and stored in) the block vectors returned by create_vector_block, so that it
+    can be used as operator of a Krylov solver, e.g. with Jacobi or Chebyshev preconditioners which only require
+    the diagonal.
+
+    Parameters
+    ----------
+    a
+        A rectangular array of UFL bilinear forms. The UFL forms are required to compute their action.
+    restriction
+        A dofmap restriction. If not provided, the unrestricted operator will be created.
+    bcs
+        Optional list of boundary conditions. Rows and columns associated to constrained dofs are zeroed, and
+        `diagonal` is placed on the diagonal of the blocks whose row and column spaces coincide, as in
+        assemble_matrix_block.
+    diagonal
+        Optional diagonal value for boundary conditions application. Assumes 1 by default.
+    form_compiler_options, jit_options
+        Options passed to dolfinx.fem.form when compiling the action and the diagonal blocks.
+
+    Returns
+    -------
+    :
+        A PETSc matrix of python type. Its product reads the coefficients of the forms at the time of the call.
+    """
+    context = _MatrixFreeBlockContext(a, restriction, bcs, diagonal, form_compiler_options, jit_options)
+    A = petsc4py.PETSc.Mat().createPython(
+        context.sizes(), context, comm=context._function_spaces[0][0].mesh.comm)
+    A.setUp()
     return A
 
 
@@ -25,6 +25,7 @@ import ufl
 
 import multiphenicsx.fem
 import multiphenicsx.fem.petsc
+from multiphenicsx.cpp import cpp_library as mcpp
 
 import common  # isort: skip
 
@@ -775,6 +776,30 @@ def test_matrix_assembly_with_restriction(
     restricted_matrix.destroy()
 
 
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+@pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions())
+def test_matrix_assembly_with_compact_restriction(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType, dirichlet_bcs: DirichletBCsGeneratorType
+) -> None:
+    """Test assembly of a bilinear form with restrictions in compact storage mode."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=True)
+    assert dofmap_restriction.compact
+    form = get_bilinear_form(V)
+    bcs = dirichlet_bcs(V)
+    unrestricted_matrix = multiphenicsx.fem.petsc.assemble_matrix(form, bcs=bcs)
+    unrestricted_matrix.assemble()
+    restricted_matrix = multiphenicsx.fem.petsc.assemble_matrix(
+        form, bcs=bcs, restriction=(dofmap_restriction, dofmap_restriction))
+    restricted_matrix.assemble()
+    assert_matrix_equal(unrestricted_matrix, restricted_matrix, (dofmap_restriction, dofmap_restriction))
+    unrestricted_matrix.destroy()
+    restricted_matrix.destroy()
+
+
 @pytest.mark.parametrize("subdomains", get_subdomains_pairs())
 @pytest.mark.parametrize("FunctionSpaces", get_function_spaces_pairs())
 @pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions_pairs())
@@ -852,3 +877,629 @@ def test_nest_matrix_assembly_with_restriction(
                                 (dofmap_restriction[i], dofmap_restriction[j]))
     unrestricted_matrix.destroy()
     restricted_matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+@pytest.mark.parametrize("ghosted", (True, False))
+def test_vector_restrict_and_extend(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType, ghosted: bool
+) -> None:
+    """Test transfer of vectors between unrestricted and restricted layouts."""
+    V = FunctionSpace(mesh)
+    restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, common.ActiveDofs(V, subdomain))
+    bs = V.dofmap.index_map_bs
+    u = dolfinx.fem.Function(V)
+    with u.x.petsc_vec.localForm() as u_local:
+        u_local.array[:] = np.arange(u_local.getSize())
+    u_restricted = multiphenicsx.fem.petsc.create_vector(get_linear_form(V), restriction)
+    with u_restricted.localForm() as u_restricted_local:
+        u_restricted_local.set(-1.0)
+    num_dofs = restriction.index_map.size_local + (restriction.index_map.num_ghosts if ghosted else 0)
+    restricted_to_unrestricted = restriction.restricted_to_unrestricted_array
+    expected = bs * np.repeat(restricted_to_unrestricted, bs) + np.tile(np.arange(bs), len(restricted_to_unrestricted))
+    # Restrict twice to exercise the cached scatter
+    for _ in range(2):
+        multiphenicsx.fem.petsc.restrict(u.x.petsc_vec, u_restricted, restriction, ghosted=ghosted)
+        with u_restricted.localForm() as u_restricted_local:
+            assert np.allclose(u_restricted_local.array[:num_dofs * bs], expected[:num_dofs * bs])
+            assert np.allclose(u_restricted_local.array[num_dofs * bs:], -1.0)
+    # Extend back to a different function
+    v = dolfinx.fem.Function(V)
+    with v.x.petsc_vec.localForm() as v_local:
+        v_local.set(-2.0)
+    multiphenicsx.fem.petsc.extend(u_restricted, v.x.petsc_vec, restriction, ghosted=ghosted)
+    with v.x.petsc_vec.localForm() as v_local:
+        active = np.zeros(v_local.getSize(), dtype=bool)
+        active[expected[:num_dofs * bs]] = True
+        assert np.allclose(v_local.array[active], np.flatnonzero(active))
+        assert np.allclose(v_local.array[~active], -2.0)
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+@pytest.mark.parametrize("num_threads", (2, 3))
+def test_block_matrix_creation_with_threads(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]],
+    num_threads: int
+) -> None:
+    """Test that building the sparsity pattern with several threads does not change the assembled matrix."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    u = [ufl.TrialFunction(V_) for V_ in V]
+    v = [ufl.TestFunction(V_) for V_ in V]
+    block_bilinear_form = dolfinx.fem.form([
+        [ufl.inner(u[j], v[i]) * ufl.dx + ufl.inner(ufl.avg(u[j]), ufl.avg(v[i])) * ufl.dS for j in range(2)]
+        for i in range(2)])
+    matrices = list()
+    for num_threads_ in (1, num_threads):
+        matrix = multiphenicsx.fem.petsc.create_matrix_block(
+            block_bilinear_form, (dofmap_restriction, dofmap_restriction), num_threads=num_threads_)
+        multiphenicsx.fem.petsc.assemble_matrix_block(
+            matrix, block_bilinear_form, restriction=(dofmap_restriction, dofmap_restriction))
+        matrix.assemble()
+        matrices.append(matrix)
+    serial_csr = matrices[0].getValuesCSR()
+    threaded_csr = matrices[1].getValuesCSR()
+    assert np.array_equal(serial_csr[0], threaded_csr[0])
+    assert np.array_equal(serial_csr[1], threaded_csr[1])
+    assert np.allclose(serial_csr[2], threaded_csr[2])
+    for matrix in matrices:
+        matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+def test_sparsity_pattern_cache(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]]
+) -> None:
+    """Test that matrices created through the sparsity pattern cache have the same structure and values."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    block_form = get_block_bilinear_form(*V)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    cache = multiphenicsx.fem.petsc.SparsityPatternCache()
+    expected_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(block_form, restriction=restriction)
+    expected_matrix.assemble()
+    expected_csr = expected_matrix.getValuesCSR()
+    for it in range(3):
+        matrix = cache.create_matrix_block(block_form, restriction)
+        assert (cache.hits, cache.misses) == (it, 1)
+        multiphenicsx.fem.petsc.assemble_matrix_block(matrix, block_form, restriction=restriction)
+        matrix.assemble()
+        csr = matrix.getValuesCSR()
+        assert np.array_equal(expected_csr[0], csr[0])
+        assert np.array_equal(expected_csr[1], csr[1])
+        assert np.allclose(expected_csr[2], csr[2])
+        matrix.destroy()
+    # A different restriction must not hit the cache
+    other_restriction = (
+        [multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)],
+        dofmap_restriction)
+    cache.create_matrix_block(block_form, other_restriction).destroy()
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses, cache.evictions) == (0, 0, 0)
+    expected_matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+def test_sparsity_pattern_cache_options(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType]
+) -> None:
+    """Test that options changing the preallocation or the storage of a matrix are part of the cache key."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    form = get_bilinear_form(V)
+    cache = multiphenicsx.fem.petsc.SparsityPatternCache()
+    expected_matrix = multiphenicsx.fem.petsc.assemble_matrix(form, restriction=restriction)
+    expected_matrix.assemble()
+    for (it, preallocation) in enumerate(("pattern", "counts", "pattern")):
+        matrix = cache.create_matrix(form, restriction, preallocation=preallocation)
+        assert (cache.hits, cache.misses) == (max(it - 1, 0), min(it + 1, 2))
+        multiphenicsx.fem.petsc.assemble_matrix(matrix, form, restriction=restriction)
+        matrix.assemble()
+        assert np.allclose(expected_matrix.getValuesCSR()[2], matrix.getValuesCSR()[2])
+        matrix.destroy()
+    block_form = [[form, None], [None, form]]
+    block_restriction = ([dofmap_restriction, dofmap_restriction], [dofmap_restriction, dofmap_restriction])
+    symmetric_matrix = cache.create_matrix_block(block_form, block_restriction, symmetric=True)
+    assert "sbaij" in symmetric_matrix.getType()
+    assert symmetric_matrix.isSymmetricKnown() == (True, True)
+    matrix = cache.create_matrix_block(block_form, block_restriction)
+    assert "sbaij" not in matrix.getType()
+    assert not matrix.isSymmetricKnown()[0]
+    for matrix_ in (symmetric_matrix, matrix, expected_matrix):
+        matrix_.destroy()
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+def test_block_assembly_with_layout(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]]
+) -> None:
+    """Test that block assembly with a precomputed BlockLayout gives the same result as without it."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    dofmaps = [V_.dofmap for V_ in V]
+    block_linear_form = get_block_linear_form(*V)
+    block_bilinear_form = get_block_bilinear_form(*V)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    layout = multiphenicsx.fem.petsc.BlockLayout(dofmaps, dofmap_restriction)
+    assert len(layout) == 2
+    assert layout.restricted
+    expected_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(block_bilinear_form, restriction=restriction)
+    expected_matrix.assemble()
+    expected_vector = multiphenicsx.fem.petsc.assemble_vector_block(
+        block_linear_form, block_bilinear_form, restriction=dofmap_restriction)
+    for _ in range(2):
+        matrix = multiphenicsx.fem.petsc.assemble_matrix_block(
+            block_bilinear_form, restriction=restriction, layout=(layout, layout))
+        matrix.assemble()
+        assert np.allclose(expected_matrix.getValuesCSR()[2], matrix.getValuesCSR()[2])
+        vector = multiphenicsx.fem.petsc.assemble_vector_block(
+            block_linear_form, block_bilinear_form, restriction=dofmap_restriction, layout=layout)
+        assert np.allclose(expected_vector.array, vector.array)
+        with multiphenicsx.fem.petsc.BlockVecSubVectorWrapper(
+                vector, dofmaps, dofmap_restriction, layout=layout) as vector_wrapper, \
+                multiphenicsx.fem.petsc.BlockVecSubVectorWrapper(
+                    expected_vector, dofmaps, dofmap_restriction) as expected_vector_wrapper:
+            for (vector_sub, expected_vector_sub) in zip(vector_wrapper, expected_vector_wrapper):
+                assert np.allclose(expected_vector_sub, vector_sub)
+        matrix.destroy()
+        vector.destroy()
+    layout.destroy()
+    expected_matrix.destroy()
+    expected_vector.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("compact", (False, True))
+def test_matrix_assembly_with_restriction_interior_facets(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType], compact: bool
+) -> None:
+    """Test assembly of a discontinuous Galerkin jump term with restrictions."""
+    V = dolfinx.fem.functionspace(mesh, ("Discontinuous Lagrange", 1))
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    u = ufl.TrialFunction(V)
+    v = ufl.TestFunction(V)
+    form = dolfinx.fem.form(ufl.inner(ufl.jump(u), ufl.jump(v)) * ufl.dS)
+    unrestricted_matrix = multiphenicsx.fem.petsc.assemble_matrix(form)
+    unrestricted_matrix.assemble()
+    restricted_matrix = multiphenicsx.fem.petsc.assemble_matrix(
+        form, restriction=(dofmap_restriction, dofmap_restriction))
+    restricted_matrix.assemble()
+    assert_matrix_equal(unrestricted_matrix, restricted_matrix, (dofmap_restriction, dofmap_restriction))
+    unrestricted_matrix.destroy()
+    restricted_matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+@pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions_pairs())
+def test_matrix_free_block_operator(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]],
+    dirichlet_bcs: DirichletBCsPairGeneratorType
+) -> None:
+    """Test that a matrix-free block operator has the same action and diagonal of the assembled block matrix."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    restriction = (dofmap_restriction, dofmap_restriction)
+    u = [ufl.TrialFunction(V_) for V_ in V]
+    v = [ufl.TestFunction(V_) for V_ in V]
+    block_bilinear_form = [
+        [ufl.inner(ufl.grad(u[0]), ufl.grad(v[0])) * ufl.dx, ufl.inner(u[1], v[0]) * ufl.dx],
+        [ufl.inner(u[0], v[1]) * ufl.dx, ufl.inner(u[1], v[1]) * ufl.dx + ufl.inner(u[1], v[1]) * ufl.ds]]
+    bcs = [bc for bcs in dirichlet_bcs(*V) for bc in bcs]
+    assembled_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(
+        dolfinx.fem.form(block_bilinear_form), bcs=bcs, restriction=restriction)
+    assembled_matrix.assemble()
+    matrix_free = multiphenicsx.fem.petsc.create_matrix_free_block(block_bilinear_form, restriction, bcs=bcs)
+    assert matrix_free.getSizes() == assembled_matrix.getSizes()
+    x, y = matrix_free.createVecs()
+    expected_y = y.duplicate()
+    x.setArray(np.arange(x.getLocalSize()) + x.getOwnershipRange()[0])
+    assembled_matrix.mult(x, expected_y)
+    matrix_free.mult(x, y)
+    assert np.allclose(expected_y.array, y.array)
+    expected_diagonal = assembled_matrix.getDiagonal()
+    diagonal = matrix_free.getDiagonal()
+    assert np.allclose(expected_diagonal.array, diagonal.array)
+    for tensor in (assembled_matrix, matrix_free, x, y, expected_y, expected_diagonal, diagonal):
+        tensor.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+@pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions())
+@pytest.mark.parametrize("compact", (False, True))
+def test_matrix_assembly_with_restriction_and_nonzero_counts(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType, dirichlet_bcs: DirichletBCsGeneratorType, compact: bool
+) -> None:
+    """Test that a matrix preallocated from nonzero counts is assembled as a matrix preallocated from a pattern."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    form = get_bilinear_form(V)
+    bcs = dirichlet_bcs(V)
+    matrices = []
+    for preallocation in ("pattern", "counts"):
+        matrix = multiphenicsx.fem.petsc.create_matrix(form, restriction, preallocation=preallocation)
+        multiphenicsx.fem.petsc.assemble_matrix(matrix, form, bcs=bcs, restriction=restriction)
+        matrix.assemble()
+        matrices.append(matrix)
+    assert matrices[0].getSizes() == matrices[1].getSizes()
+    expected_csr = matrices[0].getValuesCSR()
+    csr = matrices[1].getValuesCSR()
+    assert np.array_equal(expected_csr[0], csr[0])
+    assert np.array_equal(expected_csr[1], csr[1])
+    assert np.allclose(expected_csr[2], csr[2])
+    for matrix in matrices:
+        matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+@pytest.mark.parametrize("compact", (False, True))
+def test_matrix_nonzero_counts_are_exact(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType, compact: bool
+) -> None:
+    """Test that nonzero counts preallocate exactly the entries of the sparsity pattern on each process."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    form = get_bilinear_form(V)
+    matrices = [
+        multiphenicsx.fem.petsc.create_matrix(form, restriction, preallocation=preallocation)
+        for preallocation in ("pattern", "counts")]
+    infos = [matrix.getInfo(petsc4py.PETSc.Mat.InfoType.LOCAL) for matrix in matrices]
+    assert infos[0]["nz_allocated"] == infos[1]["nz_allocated"]
+    # Allocation of new nonzeros is an error, hence assembly would fail if counts were underestimated
+    multiphenicsx.fem.petsc.assemble_matrix(matrices[1], form, restriction=restriction)
+    matrices[1].assemble()
+    for matrix in matrices:
+        matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+@pytest.mark.parametrize("vector_valued", ((True, True), (True, False)))
+def test_block_matrix_block_size(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]],
+    vector_valued: tuple[bool, bool]
+) -> None:
+    """Test that restricted block matrices keep the block size shared by all blocks."""
+    V = [
+        dolfinx.fem.functionspace(mesh, ("Lagrange", 1, (mesh.geometry.dim, ) if vector_valued_ else ()))
+        for vector_valued_ in vector_valued]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    restriction = (dofmap_restriction, dofmap_restriction)
+    block_form = get_block_bilinear_form(*V)
+    expected_bs = mesh.geometry.dim if all(vector_valued) else 1
+    layout = multiphenicsx.fem.petsc.BlockLayout([V_.dofmap for V_ in V], dofmap_restriction)
+    assert layout.bs == expected_bs
+    layout.destroy()
+    matrix = multiphenicsx.fem.petsc.assemble_matrix_block(block_form, restriction=restriction)
+    matrix.assemble()
+    assert matrix.getBlockSizes() == (expected_bs, expected_bs)
+    nest_matrix = multiphenicsx.fem.petsc.assemble_matrix_nest(block_form, restriction=restriction)
+    nest_matrix.assemble()
+    nest_norm = np.sqrt(sum(
+        nest_matrix.getNestSubMatrix(i, j).norm(petsc4py.PETSc.NormType.FROBENIUS)**2
+        for i in range(2) for j in range(2)))
+    assert np.isclose(matrix.norm(petsc4py.PETSc.NormType.FROBENIUS), nest_norm)
+    matrix.destroy()
+    nest_matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+@pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions_pairs())
+def test_symmetric_block_matrix_assembly_with_restriction(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]],
+    dirichlet_bcs: DirichletBCsPairGeneratorType
+) -> None:
+    """Test that a symmetric block matrix stored in SBAIJ format matches the one stored in AIJ format."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    restriction = (dofmap_restriction, dofmap_restriction)
+    u = [ufl.TrialFunction(V_) for V_ in V]
+    v = [ufl.TestFunction(V_) for V_ in V]
+    block_bilinear_form = dolfinx.fem.form([
+        [ufl.inner(ufl.grad(u[0]), ufl.grad(v[0])) * ufl.dx, ufl.inner(u[1], v[0]) * ufl.dx],
+        [ufl.inner(u[0], v[1]) * ufl.dx, ufl.inner(u[1], v[1]) * ufl.dx]])
+    bcs = [bc for bcs in dirichlet_bcs(*V) for bc in bcs]
+    expected_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(
+        block_bilinear_form, bcs=bcs, restriction=restriction)
+    expected_matrix.assemble()
+    symmetric_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(
+        block_bilinear_form, bcs=bcs, restriction=restriction, symmetric=True)
+    symmetric_matrix.assemble()
+    assert "sbaij" in symmetric_matrix.getType()
+    assert symmetric_matrix.isSymmetricKnown() == (True, True)
+    full_matrix = symmetric_matrix.convert(petsc4py.PETSc.Mat.Type.AIJ)
+    assert np.allclose(to_numpy_matrix(expected_matrix), to_numpy_matrix(full_matrix))
+    expected_matrix.destroy()
+    symmetric_matrix.destroy()
+    full_matrix.destroy()
+
+
+def test_symmetric_block_matrix_requires_transposed_blocks(mesh: dolfinx.mesh.Mesh) -> None:
+    """Test that symmetric storage is rejected if a block below the diagonal is not the transpose of its pair."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    u = [ufl.TrialFunction(V_) for V_ in V]
+    v = [ufl.TestFunction(V_) for V_ in V]
+    block_bilinear_form = dolfinx.fem.form([
+        [ufl.inner(u[0], v[0]) * ufl.dx, ufl.inner(u[1], v[0]) * ufl.dx],
+        [None, ufl.inner(u[1], v[1]) * ufl.dx]])
+    with pytest.raises(RuntimeError, match="is not the transpose of block"):
+        multiphenicsx.fem.petsc.create_matrix_block(block_bilinear_form, None, symmetric=True)
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+@pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions_pairs())
+def test_transposed_blocks_assembly_with_restriction(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]],
+    dirichlet_bcs: DirichletBCsPairGeneratorType
+) -> None:
+    """Test that assembly of transposed pairs of blocks matches the assembly of each block."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    restriction = (dofmap_restriction, dofmap_restriction)
+    u = [ufl.TrialFunction(V_) for V_ in V]
+    v = [ufl.TestFunction(V_) for V_ in V]
+    block_bilinear_form = dolfinx.fem.form([
+        [ufl.inner(ufl.grad(u[0]), ufl.grad(v[0])) * ufl.dx, ufl.inner(u[1], v[0].dx(0)) * ufl.dx],
+        [ufl.inner(u[0].dx(0), v[1]) * ufl.dx, ufl.inner(u[1], v[1]) * ufl.dx]])
+    bcs = [bc for bcs in dirichlet_bcs(*V) for bc in bcs]
+    # Block matrix
+    expected_block_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(
+        block_bilinear_form, bcs=bcs, restriction=restriction)
+    expected_block_matrix.assemble()
+    for transposed_blocks in ([(0, 1)], [(1, 0)]):
+        block_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(
+            block_bilinear_form, bcs=bcs, restriction=restriction, transposed_blocks=transposed_blocks)
+        block_matrix.assemble()
+        assert np.allclose(to_numpy_matrix(expected_block_matrix), to_numpy_matrix(block_matrix))
+        block_matrix.destroy()
+    expected_block_matrix.destroy()
+    # Nest matrix
+    expected_nest_matrix = multiphenicsx.fem.petsc.assemble_matrix_nest(
+        block_bilinear_form, bcs=bcs, restriction=restriction)
+    expected_nest_matrix.assemble()
+    nest_matrix = multiphenicsx.fem.petsc.assemble_matrix_nest(
+        block_bilinear_form, bcs=bcs, restriction=restriction, transposed_blocks=[(1, 0)])
+    nest_matrix.assemble()
+    for i in range(2):
+        for j in range(2):
+            expected_block = expected_nest_matrix.getNestSubMatrix(i, j)
+            block = nest_matrix.getNestSubMatrix(i, j)
+            if (i, j) == (1, 0):
+                assert block.getType() == petsc4py.PETSc.Mat.Type.TRANSPOSEVIRTUAL
+            x, y = expected_block.createVecs()
+            expected_y = y.duplicate()
+            x.setArray(np.arange(x.getLocalSize()) + x.getOwnershipRange()[0])
+            expected_block.mult(x, expected_y)
+            block.mult(x, y)
+            assert np.allclose(expected_y.array, y.array)
+            for tensor in (expected_block, block, x, y, expected_y):
+                tensor.destroy()
+    expected_nest_matrix.destroy()
+    nest_matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomains", get_subdomains_pairs())
+def test_block_matrix_reassembly_with_restriction(
+    mesh: dolfinx.mesh.Mesh,
+    subdomains: tuple[typing.Optional[common.SubdomainType], typing.Optional[common.SubdomainType]]
+) -> None:
+    """Test that assembly into an existing matrix, which reuses local-to-global maps cached on it, is repeatable."""
+    V = [dolfinx.fem.functionspace(mesh, ("Lagrange", 1)), dolfinx.fem.functionspace(mesh, ("Lagrange", 2))]
+    active_dofs = [common.ActiveDofs(V_, subdomain) for (V_, subdomain) in zip(V, subdomains)]
+    dofmap_restriction = [
+        multiphenicsx.fem.DofMapRestriction(V_.dofmap, active_dofs_) for (V_, active_dofs_) in zip(V, active_dofs)]
+    block_bilinear_form = get_block_bilinear_form(*V)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    expected_matrix = multiphenicsx.fem.petsc.assemble_matrix_block(block_bilinear_form, restriction=restriction)
+    expected_matrix.assemble()
+    matrix = multiphenicsx.fem.petsc.create_matrix_block(block_bilinear_form, restriction)
+    for _ in range(3):
+        matrix.zeroEntries()
+        multiphenicsx.fem.petsc.assemble_matrix_block(matrix, block_bilinear_form, restriction=restriction)
+        matrix.assemble()
+        assert np.allclose(expected_matrix.getValuesCSR()[2], matrix.getValuesCSR()[2])
+    expected_matrix.destroy()
+    matrix.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+@pytest.mark.parametrize("dirichlet_bcs", get_boundary_conditions())
+def test_matrix_assembly_with_restriction_direct_insertion(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType, dirichlet_bcs: DirichletBCsGeneratorType
+) -> None:
+    """Test that direct insertion of restricted element matrices matches insertion into a local submatrix."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    restriction = (dofmap_restriction, dofmap_restriction)
+    form = get_bilinear_form(V)
+    bcs = dirichlet_bcs(V)
+    bcs_cpp = [bc._cpp_object for bc in bcs]
+    constants = dolfinx.cpp.fem.pack_constants(form._cpp_object)
+    coeffs = dolfinx.cpp.fem.pack_coefficients(form._cpp_object)
+    expected_matrix = multiphenicsx.fem.petsc.create_matrix(form, restriction)
+    with multiphenicsx.fem.petsc.MatSubMatrixWrapper(
+            expected_matrix, (V.dofmap, V.dofmap), restriction) as expected_matrix_sub:
+        dolfinx.cpp.fem.petsc.assemble_matrix(expected_matrix_sub, form._cpp_object, constants, coeffs, bcs_cpp)
+    expected_matrix.assemble()
+    matrix = multiphenicsx.fem.petsc.create_matrix(form, restriction)
+    mcpp.fem.petsc.assemble_matrix_restricted(
+        matrix, form._cpp_object, constants, coeffs, bcs_cpp,
+        (dofmap_restriction.unrestricted_to_restricted_array, dofmap_restriction.unrestricted_to_restricted_array))
+    matrix.assemble()
+    assert np.allclose(to_numpy_matrix(expected_matrix), to_numpy_matrix(matrix))
+    expected_matrix.destroy()
+    matrix.destroy()
+
+
+def test_assembly_with_restriction_unsupported_integral_type(mesh: dolfinx.mesh.Mesh) -> None:
+    """Test that assembly with a restriction rejects integrals which are not on cells or facets."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    active_dofs = common.ActiveDofs(V, common.CellsAll())
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    u = ufl.TrialFunction(V)
+    v = ufl.TestFunction(V)
+    linear_form = dolfinx.fem.form(v * ufl.dx + v * ufl.dP)
+    with pytest.raises(RuntimeError, match="Unsupported integral type"):
+        multiphenicsx.fem.petsc.assemble_vector(linear_form, restriction=dofmap_restriction)
+    bilinear_form = dolfinx.fem.form(ufl.inner(u, v) * ufl.dP)
+    matrix = multiphenicsx.fem.petsc.create_matrix(
+        dolfinx.fem.form(ufl.inner(u, v) * ufl.dx), (dofmap_restriction, dofmap_restriction))
+    with pytest.raises(RuntimeError, match="Unsupported integral type"):
+        mcpp.fem.petsc.assemble_matrix_restricted(
+            matrix, bilinear_form._cpp_object, dolfinx.cpp.fem.pack_constants(bilinear_form._cpp_object),
+            dolfinx.cpp.fem.pack_coefficients(bilinear_form._cpp_object), [],
+            (dofmap_restriction.unrestricted_to_restricted_array, dofmap_restriction.unrestricted_to_restricted_array))
+    matrix.destroy()
+
+
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_block_vector_wrapper_views(mesh: dolfinx.mesh.Mesh, FunctionSpace: common.FunctionSpaceGeneratorType) -> None:
+    """Test that unrestricted wrappers of contiguous blocks are views of the vector, rather than copies."""
+    V = [FunctionSpace(mesh), FunctionSpace(mesh)]
+    dofmaps = [V_.dofmap for V_ in V]
+    vector = dolfinx.cpp.fem.petsc.create_vector_block([(dofmap.index_map, dofmap.index_map_bs) for dofmap in dofmaps])
+    vector.setArray(np.arange(vector.getLocalSize(), dtype=petsc4py.PETSc.ScalarType))
+    offset = 0
+    with multiphenicsx.fem.petsc.BlockVecSubVectorReadWrapper(vector, dofmaps, ghosted=False) as vector_wrapper:
+        for vector_sub in vector_wrapper:
+            assert not vector_sub.flags.writeable
+            assert np.allclose(vector_sub, np.arange(offset, offset + vector_sub.shape[0]))
+            offset += vector_sub.shape[0]
+    assert offset == vector.getLocalSize()
+    with multiphenicsx.fem.petsc.BlockVecSubVectorWrapper(vector, dofmaps, ghosted=False) as vector_wrapper:
+        for vector_sub in vector_wrapper:
+            vector_sub[:] *= -1.0
+        # Changes are already visible in the vector, before leaving the context
+        assert np.allclose(vector.array, -np.arange(vector.getLocalSize()))
+    assert np.allclose(vector.array, -np.arange(vector.getLocalSize()))
+    vector.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+@pytest.mark.parametrize("ghosted", (True, False))
+def test_vector_transfer_plan(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType, ghosted: bool
+) -> None:
+    """Test the plan to transfer entries between a restricted vector and the content of its wrappers."""
+    V = FunctionSpace(mesh)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, common.ActiveDofs(V, subdomain))
+    bs = V.dofmap.index_map_bs
+    layout = multiphenicsx.fem.petsc.BlockLayout([V.dofmap], [dofmap_restriction])
+    transfer_plan = layout.transfer_plans(ghosted)[0]
+    assert transfer_plan is layout.transfer_plans(ghosted)[0]
+    assert transfer_plan.size == bs * (V.dofmap.index_map.size_local + V.dofmap.index_map.num_ghosts)
+    num_dofs = dofmap_restriction.index_map.size_local + (
+        dofmap_restriction.index_map.num_ghosts if ghosted else 0)
+    restricted_to_unrestricted = dofmap_restriction.restricted_to_unrestricted_array[:num_dofs]
+    expected_content_indices = (
+        bs * np.repeat(restricted_to_unrestricted, bs) + np.tile(np.arange(bs), len(restricted_to_unrestricted)))
+    expected_vector_indices = np.arange(bs * num_dofs)
+    order = np.argsort(transfer_plan.vector_indices)
+    assert np.array_equal(transfer_plan.vector_indices[order], expected_vector_indices)
+    assert np.array_equal(transfer_plan.content_indices[order], expected_content_indices)
+    layout.destroy()
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_index_set_cache(
+    mesh: dolfinx.mesh.Mesh, subdomain: typing.Optional[common.SubdomainType],
+    FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test that index sets are shared between block layouts, and remain usable after being invalidated."""
+    V = [FunctionSpace(mesh), FunctionSpace(mesh)]
+    dofmaps = [V_.dofmap for V_ in V]
+    dofmap_restriction = [multiphenicsx.fem.DofMapRestriction(V_.dofmap, common.ActiveDofs(V_, subdomain)) for V_ in V]
+    index_set_cache = multiphenicsx.fem.petsc.index_set_cache
+    index_set_cache.clear()
+    first_layout = multiphenicsx.fem.petsc.BlockLayout(dofmaps, dofmap_restriction)
+    second_layout = multiphenicsx.fem.petsc.BlockLayout(dofmaps, dofmap_restriction)
+    for restricted in (False, True):
+        first_index_sets = first_layout.index_sets(restricted)
+        second_index_sets = second_layout.index_sets(restricted)
+        assert all(
+            first_index_set is second_index_set
+            for (first_index_set, second_index_set) in zip(first_index_sets, second_index_sets))
+    assert len(index_set_cache) == 2
+    assert index_set_cache.misses == 2
+    assert index_set_cache.hits == 2
+    # Different ghosted flags and ghost block layouts are cached separately
+    first_layout.index_sets(False, ghosted=False)
+    first_layout.index_sets(False, ghost_block_layout=mcpp.la.petsc.GhostBlockLayout.trailing)
+    assert len(index_set_cache) == 4
+    first_layout.destroy()
+    second_layout.destroy()
+    assert len(index_set_cache) == 4
+    # Invalidating a restricted index map does not affect index sets of unrestricted index maps
+    restricted_index_sets = first_layout.index_sets(True)
+    expected_indices = [index_set.indices.copy() for index_set in restricted_index_sets]
+    index_set_cache.invalidate(dofmap_restriction[0].index_map)
+    assert len(index_set_cache) == 3
+    index_set_cache.invalidate(dofmaps[1].index_map)
+    assert len(index_set_cache) == 0
+    # Index sets which were handed out before invalidation are still usable by their holders
+    for (index_set, indices) in zip(restricted_index_sets, expected_indices):
+        assert np.array_equal(index_set.indices, indices)
+    index_set_cache.clear()
+    assert index_set_cache.hits == 0
+    assert index_set_cache.misses == 0
+
+
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_index_set_cache_eviction(mesh: dolfinx.mesh.Mesh, FunctionSpace: common.FunctionSpaceGeneratorType) -> None:
+    """Test that the index set cache is bounded, and that evicted index sets remain usable by their holders."""
+    V = [FunctionSpace(mesh) for _ in range(3)]
+    index_set_cache = multiphenicsx.fem.petsc.IndexSetCache(max_size=2)
+    index_sets = [
+        index_set_cache.index_sets([(V_.dofmap.index_map, V_.dofmap.index_map_bs)], [V_.dofmap.index_map_bs])[0]
+        for V_ in V]
+    assert len(index_set_cache) == 2
+    assert index_set_cache.evictions == 1
+    # The least recently used entry was evicted: requesting it again creates new index sets
+    evicted_index_set = index_set_cache.index_sets(
+        [(V[0].dofmap.index_map, V[0].dofmap.index_map_bs)], [V[0].dofmap.index_map_bs])[0]
+    assert evicted_index_set is not index_sets[0]
+    assert index_set_cache.misses == 4
+    assert index_set_cache.evictions == 2
+    assert np.array_equal(evicted_index_set.indices, index_sets[0].indices)
+    index_set_cache.clear()
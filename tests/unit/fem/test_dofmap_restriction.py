@@ -6,6 +6,10 @@
 """Tests for multiphenicsx.fem.dofmap_restriction module."""
 
 
+import os
+import pathlib
+import time
+
 import dolfinx.fem
 import dolfinx.mesh
 import mpi4py.MPI
@@ -140,3 +144,378 @@ def test_dofmap_restriction_is_subset_of_dofmap(
     active_dofs = common.ActiveDofs(V, subdomain)
     dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
     assert_dofmap_restriction_is_subset_of_dofmap(mesh, V.dofmap, dofmap_restriction)
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_arrays(
+    mesh: dolfinx.mesh.Mesh, subdomain: common.SubdomainType, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test that array views of the maps between unrestricted and restricted dofs are consistent with dictionaries."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    unrestricted_to_restricted = dofmap_restriction.unrestricted_to_restricted_array
+    restricted_to_unrestricted = dofmap_restriction.restricted_to_unrestricted_array
+    # Check shapes and types
+    assert unrestricted_to_restricted.dtype == np.int32
+    assert restricted_to_unrestricted.dtype == np.int32
+    assert unrestricted_to_restricted.shape == (V.dofmap.index_map.size_local + V.dofmap.index_map.num_ghosts, )
+    assert restricted_to_unrestricted.shape == (
+        dofmap_restriction.index_map.size_local + dofmap_restriction.index_map.num_ghosts, )
+    # Arrays are read-only views
+    assert not unrestricted_to_restricted.flags.writeable
+    assert not restricted_to_unrestricted.flags.writeable
+    # Inactive dofs are marked with -1
+    assert np.array_equal(np.sort(active_dofs), np.sort(restricted_to_unrestricted))
+    inactive = np.setdiff1d(np.arange(unrestricted_to_restricted.shape[0]), active_dofs)
+    assert np.all(unrestricted_to_restricted[inactive] == -1)
+    # The two arrays are inverse of each other on active dofs
+    assert np.array_equal(
+        unrestricted_to_restricted[restricted_to_unrestricted], np.arange(restricted_to_unrestricted.shape[0]))
+    # Arrays are consistent with the dictionaries
+    assert dofmap_restriction.unrestricted_to_restricted == {
+        d: r for (d, r) in enumerate(unrestricted_to_restricted) if r >= 0}
+    assert dofmap_restriction.restricted_to_unrestricted == dict(enumerate(restricted_to_unrestricted))
+
+
+def assert_dofmap_restrictions_are_equal(
+    mesh: dolfinx.mesh.Mesh, first: multiphenicsx.fem.DofMapRestriction,
+    second: multiphenicsx.fem.DofMapRestriction
+) -> None:
+    """Check that two DofMapRestriction objects have the same dofs and the same cell dofs."""
+    assert first.index_map.size_local == second.index_map.size_local
+    assert first.index_map.size_global == second.index_map.size_global
+    assert np.array_equal(first.index_map.ghosts, second.index_map.ghosts)
+    assert np.array_equal(first.restricted_to_unrestricted_array, second.restricted_to_unrestricted_array)
+    cells_map = mesh.topology.index_map(mesh.topology.dim)
+    num_cells = cells_map.size_local + cells_map.num_ghosts
+    for c in range(num_cells):
+        assert np.array_equal(first.cell_dofs(c), second.cell_dofs(c))
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_from_entities(
+    mesh: dolfinx.mesh.Mesh, subdomain: common.SubdomainType, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test construction of a DofMapRestriction from a list of mesh entities."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    entities_dim = mesh.topology.dim - subdomain.codimension  # type: ignore[attr-defined]
+    entities = dolfinx.mesh.locate_entities(mesh, entities_dim, subdomain)
+    dofmap_restriction_from_entities = multiphenicsx.fem.DofMapRestriction.from_entities(
+        V.dofmap, mesh.topology, entities_dim, entities)
+    assert isinstance(dofmap_restriction_from_entities, multiphenicsx.fem.DofMapRestriction)
+    assert_dofmap_restrictions_are_equal(mesh, dofmap_restriction, dofmap_restriction_from_entities)
+
+
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_from_meshtags(
+    mesh: dolfinx.mesh.Mesh, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test construction of a DofMapRestriction from mesh tags."""
+    V = FunctionSpace(mesh)
+    subdomains = (common.FacetsSubDomain(X=1.0), common.FacetsSubDomain(Y=0.0), common.FacetsSubDomain(X=0.75))
+    entities_dim = mesh.topology.dim - 1
+    mesh.topology.create_entities(entities_dim)
+    entities = [dolfinx.mesh.locate_entities(mesh, entities_dim, subdomain) for subdomain in subdomains]
+    values = [np.full_like(entities_, v + 1) for (v, entities_) in enumerate(entities)]
+    # Subdomains do not overlap, hence entities can be tagged after sorting them
+    all_entities = np.concatenate(entities)
+    all_values = np.concatenate(values)
+    sorting = np.argsort(all_entities)
+    meshtags = dolfinx.mesh.meshtags(mesh, entities_dim, all_entities[sorting], all_values[sorting])
+    for tags in ((1, ), (1, 3), (1, 2, 3)):
+        active_entities = np.sort(all_entities[np.isin(all_values, tags)])
+        mesh.topology.create_connectivity(entities_dim, mesh.topology.dim)
+        active_dofs = dolfinx.fem.locate_dofs_topological(V, entities_dim, active_entities)
+        dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+        dofmap_restriction_from_meshtags = multiphenicsx.fem.DofMapRestriction.from_meshtags(
+            V.dofmap, meshtags, np.array(tags, dtype=np.int32))
+        assert_dofmap_restrictions_are_equal(mesh, dofmap_restriction, dofmap_restriction_from_meshtags)
+
+
+@pytest.mark.parametrize("old_subdomain,new_subdomain", [
+    (common.CellsSubDomain(0.5, 0.5), common.CellsAll()),
+    (common.CellsAll(), common.CellsSubDomain(0.5, 0.5)),
+    (common.FacetsSubDomain(X=1.0), common.FacetsSubDomain(X=0.75)),
+    (common.FacetsSubDomain(on_boundary=True), common.FacetsSubDomain(Y=0.0))
+])
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_update(
+    mesh: dolfinx.mesh.Mesh, old_subdomain: common.SubdomainType, new_subdomain: common.SubdomainType,
+    FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test update of the list of active dofs of a DofMapRestriction."""
+    V = FunctionSpace(mesh)
+    old_active_dofs = common.ActiveDofs(V, old_subdomain)
+    new_active_dofs = common.ActiveDofs(V, new_subdomain)
+    old_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, old_active_dofs)
+    new_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, new_active_dofs)
+    added = np.setdiff1d(new_active_dofs, old_active_dofs).astype(np.int32)
+    removed = np.setdiff1d(old_active_dofs, new_active_dofs).astype(np.int32)
+    updated_dofmap_restriction, old_to_new = old_dofmap_restriction.update(added, removed)
+    assert isinstance(updated_dofmap_restriction, multiphenicsx.fem.DofMapRestriction)
+    assert_dofmap_restrictions_are_equal(mesh, new_dofmap_restriction, updated_dofmap_restriction)
+    # The previous restriction must be left unchanged
+    assert np.array_equal(np.sort(old_dofmap_restriction.restricted_to_unrestricted_array), np.sort(old_active_dofs))
+    # Check the map from old to new restricted numbering
+    old_restricted_to_unrestricted = old_dofmap_restriction.restricted_to_unrestricted_array
+    new_unrestricted_to_restricted = updated_dofmap_restriction.unrestricted_to_restricted_array
+    assert old_to_new.shape == old_restricted_to_unrestricted.shape
+    for (old_restricted, unrestricted) in enumerate(old_restricted_to_unrestricted):
+        assert old_to_new[old_restricted] == new_unrestricted_to_restricted[unrestricted]
+        assert (old_to_new[old_restricted] == -1) == (unrestricted in removed)
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_successive_updates(
+    mesh: dolfinx.mesh.Mesh, compact: bool, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test successive updates of the list of active dofs of a DofMapRestriction."""
+    V = FunctionSpace(mesh)
+    subdomains = (
+        common.FacetsSubDomain(X=1.0), common.FacetsSubDomain(X=0.75), common.CellsSubDomain(0.5, 0.5),
+        common.FacetsSubDomain(Y=0.25))
+    active_dofs = [common.ActiveDofs(V, subdomain) for subdomain in subdomains]
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs[0], compact=compact)
+    for (old_active_dofs, new_active_dofs) in zip(active_dofs[:-1], active_dofs[1:]):
+        added = np.setdiff1d(new_active_dofs, old_active_dofs).astype(np.int32)
+        removed = np.setdiff1d(old_active_dofs, new_active_dofs).astype(np.int32)
+        dofmap_restriction, _ = dofmap_restriction.update(added, removed)
+        assert dofmap_restriction.compact == compact
+        new_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, new_active_dofs, compact=compact)
+        assert_dofmap_restrictions_are_equal(mesh, new_dofmap_restriction, dofmap_restriction)
+        for (array, updated_array) in zip(new_dofmap_restriction.map(), dofmap_restriction.map()):
+            assert np.array_equal(array, updated_array)
+        assert np.array_equal(new_dofmap_restriction.active_cells, dofmap_restriction.active_cells)
+
+
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_update_out_of_range(
+    mesh: dolfinx.mesh.Mesh, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test that updating a DofMapRestriction with invalid dofs raises an error."""
+    V = FunctionSpace(mesh)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, common.ActiveDofs(V, common.CellsAll()))
+    num_dofs = V.dofmap.index_map.size_local + V.dofmap.index_map.num_ghosts
+    empty = np.zeros(0, dtype=np.int32)
+    for invalid in (np.array([num_dofs], dtype=np.int32), np.array([-1], dtype=np.int32)):
+        with pytest.raises(IndexError):
+            dofmap_restriction.update(invalid, empty)
+        with pytest.raises(IndexError):
+            dofmap_restriction.update(empty, invalid)
+
+
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_compact(
+    mesh: dolfinx.mesh.Mesh, subdomain: common.SubdomainType, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test for DofMapRestriction in compact storage mode."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    assert not dofmap_restriction.compact
+    assert dofmap_restriction.active_cells.shape == (0, )
+    compact_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=True)
+    assert compact_dofmap_restriction.compact
+    assert_dofmap_restrictions_are_equal(mesh, dofmap_restriction, compact_dofmap_restriction)
+    # Only cells with at least one active dof are stored
+    cells_map = mesh.topology.index_map(mesh.topology.dim)
+    num_cells = cells_map.size_local + cells_map.num_ghosts
+    expected_active_cells = [c for c in range(num_cells) if dofmap_restriction.cell_dofs(c).shape[0] > 0]
+    assert np.array_equal(compact_dofmap_restriction.active_cells, expected_active_cells)
+    (dof_array, cell_bounds) = dofmap_restriction.map()
+    (compact_dof_array, compact_cell_bounds) = compact_dofmap_restriction.map()
+    assert np.array_equal(dof_array, compact_dof_array)
+    assert compact_cell_bounds.shape == (len(expected_active_cells) + 1, )
+    assert np.array_equal(compact_cell_bounds, np.unique(cell_bounds))
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("num_threads", (2, 3))
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_threads(
+    mesh: dolfinx.mesh.Mesh, compact: bool, num_threads: int, subdomain: common.SubdomainType,
+    FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test that restricted cell dofs computed with several threads are the same as the serial ones."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    threaded_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(
+        V.dofmap, active_dofs, compact=compact, num_threads=num_threads)
+    for (array, threaded_array) in zip(dofmap_restriction.map(), threaded_dofmap_restriction.map()):
+        assert np.array_equal(array, threaded_array)
+    assert np.array_equal(dofmap_restriction.active_cells, threaded_dofmap_restriction.active_cells)
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_active_cell_and_facet_index(
+    mesh: dolfinx.mesh.Mesh, subdomain: common.SubdomainType, FunctionSpace: common.FunctionSpaceGeneratorType,
+    compact: bool
+) -> None:
+    """Test the active cell and facet index of a DofMapRestriction, and that they are only computed once."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    tdim = mesh.topology.dim
+    cells_map = mesh.topology.index_map(tdim)
+    num_cells = cells_map.size_local + cells_map.num_ghosts
+    expected_active_cells = [c for c in range(num_cells) if dofmap_restriction.cell_dofs(c).shape[0] > 0]
+    assert np.array_equal(dofmap_restriction.active_cell_index, expected_active_cells)
+    assert len(expected_active_cells) == 0 or np.shares_memory(
+        dofmap_restriction.active_cell_index, dofmap_restriction.active_cell_index)
+    mesh.topology.create_connectivity(tdim, tdim - 1)
+    cells_to_facets = mesh.topology.connectivity(tdim, tdim - 1)
+    expected_active_facets = np.unique(np.concatenate(
+        [cells_to_facets.links(c) for c in expected_active_cells] + [np.zeros(0, dtype=np.int32)]))
+    assert np.array_equal(
+        dofmap_restriction.active_facet_index(mesh.topology), expected_active_facets)
+    assert len(expected_active_facets) == 0 or np.shares_memory(
+        dofmap_restriction.active_facet_index(mesh.topology), dofmap_restriction.active_facet_index(mesh.topology))
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("subdomain", get_subdomains())
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_save_load(
+    mesh: dolfinx.mesh.Mesh, subdomain: common.SubdomainType, FunctionSpace: common.FunctionSpaceGeneratorType,
+    compact: bool, tmp_path: pathlib.Path
+) -> None:
+    """Test saving a DofMapRestriction to disk and loading it back."""
+    V = FunctionSpace(mesh)
+    active_dofs = common.ActiveDofs(V, subdomain)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    dofmap_restriction.save(tmp_path / "restriction")
+    loaded_dofmap_restriction = multiphenicsx.fem.DofMapRestriction.load(V.dofmap, tmp_path / "restriction")
+    assert isinstance(loaded_dofmap_restriction, multiphenicsx.fem.DofMapRestriction)
+    assert loaded_dofmap_restriction.compact == compact
+    assert_dofmap_restrictions_are_equal(mesh, dofmap_restriction, loaded_dofmap_restriction)
+    assert np.array_equal(
+        dofmap_restriction.unrestricted_to_restricted_array, loaded_dofmap_restriction.unrestricted_to_restricted_array)
+    assert np.array_equal(dofmap_restriction.index_map.owners, loaded_dofmap_restriction.index_map.owners)
+    assert np.array_equal(dofmap_restriction.active_cells, loaded_dofmap_restriction.active_cells)
+
+
+def test_dofmap_restriction_load_incompatible_dofmap(mesh: dolfinx.mesh.Mesh, tmp_path: pathlib.Path) -> None:
+    """Test that loading a DofMapRestriction with a different dofmap raises an error."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    W = dolfinx.fem.functionspace(mesh, ("Lagrange", 2))
+    active_dofs = common.ActiveDofs(V, common.CellsSubDomain(0.5, 0.5))
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+    dofmap_restriction.save(tmp_path / "restriction")
+    with pytest.raises(RuntimeError, match="not compatible"):
+        multiphenicsx.fem.DofMapRestriction.load(W.dofmap, tmp_path / "restriction")
+    with pytest.raises(RuntimeError, match="not compatible"):
+        multiphenicsx.fem.DofMapRestriction.load(V.dofmap, tmp_path / "non_existing")
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_create_dofmap_restrictions(
+    mesh: dolfinx.mesh.Mesh, compact: bool, FunctionSpace: common.FunctionSpaceGeneratorType
+) -> None:
+    """Test construction of several DofMapRestriction objects at once."""
+    V = FunctionSpace(mesh)
+    W = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    pairs = [
+        (V.dofmap, common.ActiveDofs(V, common.CellsSubDomain(0.5, 0.5))),
+        (V.dofmap, common.ActiveDofs(V, common.FacetsSubDomain(on_boundary=True))),
+        (W.dofmap, common.ActiveDofs(W, common.CellsSubDomain(0.5, 0.5))),
+        (V.dofmap, common.ActiveDofs(V, None))
+    ]
+    pairs.append((V.dofmap, pairs[0][1].copy()))
+    dofmap_restrictions = multiphenicsx.fem.create_dofmap_restrictions(pairs, compact)
+    assert len(dofmap_restrictions) == len(pairs)
+    assert dofmap_restrictions[-1] is dofmap_restrictions[0]
+    for ((dofmap, active_dofs), dofmap_restriction) in zip(pairs, dofmap_restrictions):
+        assert isinstance(dofmap_restriction, multiphenicsx.fem.DofMapRestriction)
+        assert dofmap_restriction.compact == compact
+        expected_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(dofmap, active_dofs, compact)
+        assert_dofmap_restrictions_are_equal(mesh, expected_dofmap_restriction, dofmap_restriction)
+        for (array, batched_array) in zip(expected_dofmap_restriction.map(), dofmap_restriction.map()):
+            assert np.array_equal(array, batched_array)
+        assert np.array_equal(expected_dofmap_restriction.active_cells, dofmap_restriction.active_cells)
+        assert np.array_equal(expected_dofmap_restriction.index_map.owners, dofmap_restriction.index_map.owners)
+        assert np.array_equal(
+            expected_dofmap_restriction.unrestricted_to_restricted_array,
+            dofmap_restriction.unrestricted_to_restricted_array)
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("parent_subdomain,subdomain", [
+    (common.CellsAll(), common.CellsSubDomain(0.5, 0.5)),
+    (common.CellsAll(), common.FacetsSubDomain(on_boundary=True)),
+    (common.CellsSubDomain(0.5, 0.5), common.FacetsSubDomain(X=0.5)),
+    (common.FacetsSubDomain(on_boundary=True), common.FacetsSubDomain(Y=0.0))
+])
+@pytest.mark.parametrize("FunctionSpace", get_function_spaces())
+def test_dofmap_restriction_restrict(
+    mesh: dolfinx.mesh.Mesh, parent_subdomain: common.SubdomainType, subdomain: common.SubdomainType,
+    FunctionSpace: common.FunctionSpaceGeneratorType, compact: bool
+) -> None:
+    """Test further restriction of a DofMapRestriction to a subset of its active dofs."""
+    V = FunctionSpace(mesh)
+    parent_active_dofs = common.ActiveDofs(V, parent_subdomain)
+    active_dofs = np.intersect1d(common.ActiveDofs(V, subdomain), parent_active_dofs).astype(np.int32)
+    parent_dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, parent_active_dofs, compact=compact)
+    dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs, compact=compact)
+    subset = np.sort(parent_dofmap_restriction.unrestricted_to_restricted_array[active_dofs])
+    restricted_dofmap_restriction = parent_dofmap_restriction.restrict(subset)
+    assert isinstance(restricted_dofmap_restriction, multiphenicsx.fem.DofMapRestriction)
+    assert restricted_dofmap_restriction.compact == compact
+    assert_dofmap_restrictions_are_equal(mesh, dofmap_restriction, restricted_dofmap_restriction)
+    assert np.array_equal(dofmap_restriction.index_map.owners, restricted_dofmap_restriction.index_map.owners)
+    assert np.array_equal(
+        dofmap_restriction.unrestricted_to_restricted_array,
+        restricted_dofmap_restriction.unrestricted_to_restricted_array)
+    assert np.array_equal(dofmap_restriction.active_cells, restricted_dofmap_restriction.active_cells)
+
+
+def test_dofmap_restriction_id(mesh: dolfinx.mesh.Mesh) -> None:
+    """Test that identifiers of restrictions are never reused, even after a restriction is destroyed."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    active_dofs = common.ActiveDofs(V, common.CellsAll())
+    ids = set()
+    for _ in range(3):
+        dofmap_restriction = multiphenicsx.fem.DofMapRestriction(V.dofmap, active_dofs)
+        assert dofmap_restriction.id not in ids
+        ids.add(dofmap_restriction.id)
+        del dofmap_restriction
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(
+    "MULTIPHENICSX_BENCHMARK" not in os.environ, reason="benchmarks only run when MULTIPHENICSX_BENCHMARK is set")
+@pytest.mark.parametrize("num_cells", (1_000_000, 5_000_000, 20_000_000))
+@pytest.mark.parametrize("compact", (False, True))
+def test_dofmap_restriction_construction_benchmark(num_cells: int, compact: bool) -> None:
+    """Time the construction of a DofMapRestriction on a large mesh, with one thread and with several threads."""
+    n = int(np.ceil(np.sqrt(num_cells / 2)))
+    large_mesh = dolfinx.mesh.create_unit_square(mpi4py.MPI.COMM_WORLD, n, n)
+    V = dolfinx.fem.functionspace(large_mesh, ("Lagrange", 2))
+    active_dofs = common.ActiveDofs(V, common.CellsSubDomain(0.5, 0.5))
+    num_threads = max(os.cpu_count() or 1, 2)
+    timings = dict()
+    dofmap_restrictions = dict()
+    for threads in (1, num_threads):
+        large_mesh.comm.Barrier()
+        start = time.perf_counter()
+        dofmap_restrictions[threads] = multiphenicsx.fem.DofMapRestriction(
+            V.dofmap, active_dofs, compact=compact, num_threads=threads)
+        timings[threads] = large_mesh.comm.allreduce(time.perf_counter() - start, op=mpi4py.MPI.MAX)
+    if large_mesh.comm.rank == 0:
+        print(
+            f"{2 * n * n} cells, compact={compact}: {timings[1]:.3f}s with 1 thread, "
+            f"{timings[num_threads]:.3f}s with {num_threads} threads, "
+            f"speed-up {timings[1] / timings[num_threads]:.2f}")
+    for (array, threaded_array) in zip(dofmap_restrictions[1].map(), dofmap_restrictions[num_threads].map()):
+        assert np.array_equal(array, threaded_array)
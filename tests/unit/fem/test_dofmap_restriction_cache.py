@@ -0,0 +1,78 @@
+# Copyright (C) 2016-2025 by the multiphenicsx authors
+#
+# This file is part of multiphenicsx.
+#
+# SPDX-License-Identifier: LGPL-3.0-or-later
+"""Tests for multiphenicsx.fem.dofmap_restriction_cache module."""
+
+
+import dolfinx.fem
+import dolfinx.mesh
+import mpi4py.MPI
+import pytest
+
+import multiphenicsx.fem
+
+import common  # isort: skip
+
+
+@pytest.fixture
+def mesh() -> dolfinx.mesh.Mesh:
+    """Generate a unit square mesh for use in tests in this file."""
+    return dolfinx.mesh.create_unit_square(mpi4py.MPI.COMM_WORLD, 4, 4)
+
+
+def test_dofmap_restriction_cache_hits_and_misses(mesh: dolfinx.mesh.Mesh) -> None:
+    """Test that the cache returns existing restrictions for the same dofmap and active dofs."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    W = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    active_dofs_left = common.ActiveDofs(V, common.CellsSubDomain(0.5, 0.5))
+    active_dofs_all = common.ActiveDofs(V, None)
+    cache = multiphenicsx.fem.DofMapRestrictionCache()
+    restriction_left = cache.get(V.dofmap, active_dofs_left)
+    assert isinstance(restriction_left, multiphenicsx.fem.DofMapRestriction)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.get(V.dofmap, active_dofs_left.copy()) is restriction_left
+    assert (cache.hits, cache.misses) == (1, 1)
+    restriction_all = cache.get(V.dofmap, active_dofs_all)
+    assert restriction_all is not restriction_left
+    assert (cache.hits, cache.misses) == (1, 2)
+    # A different dofmap with the same active dofs must not hit the cache
+    restriction_other_dofmap = cache.get(W.dofmap, active_dofs_left)
+    assert restriction_other_dofmap is not restriction_left
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert len(cache) == 3
+    assert cache.nbytes > 0
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+    assert (cache.hits, cache.misses, cache.evictions) == (0, 0, 0)
+
+
+def test_dofmap_restriction_cache_eviction(mesh: dolfinx.mesh.Mesh) -> None:
+    """Test least recently used eviction of the cache."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    active_dofs = [
+        common.ActiveDofs(V, subdomain) for subdomain in (
+            common.CellsSubDomain(0.5, 0.5), common.FacetsSubDomain(on_boundary=True), common.FacetsSubDomain(X=1.0))]
+    cache = multiphenicsx.fem.DofMapRestrictionCache(max_size=2)
+    restriction_0 = cache.get(V.dofmap, active_dofs[0])
+    restriction_1 = cache.get(V.dofmap, active_dofs[1])
+    # Access the first restriction, so that the second one becomes the least recently used
+    assert cache.get(V.dofmap, active_dofs[0]) is restriction_0
+    cache.get(V.dofmap, active_dofs[2])
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get(V.dofmap, active_dofs[0]) is restriction_0
+    assert cache.get(V.dofmap, active_dofs[1]) is not restriction_1
+
+
+def test_dofmap_restriction_cache_memory_bound(mesh: dolfinx.mesh.Mesh) -> None:
+    """Test that the cache does not store restrictions exceeding the memory bound."""
+    V = dolfinx.fem.functionspace(mesh, ("Lagrange", 1))
+    active_dofs = common.ActiveDofs(V, None)
+    cache = multiphenicsx.fem.DofMapRestrictionCache(max_bytes=1)
+    restriction = cache.get(V.dofmap, active_dofs)
+    assert len(cache) == 0
+    assert cache.get(V.dofmap, active_dofs) is not restriction
+    assert (cache.hits, cache.misses) == (0, 2)